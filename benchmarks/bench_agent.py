@@ -0,0 +1,241 @@
+"""Offline benchmark of the agent loop using a recorded (or scripted) session.
+
+The model is replaced by a ReplayBackend, so the numbers measure only the
+agent's own work per iteration: message bookkeeping, tool dispatch and the
+tools themselves. Model latency can be emulated with --latency.
+
+Usage:
+    python benchmarks/bench_agent.py                      # built-in scenario
+    python benchmarks/bench_agent.py --replay session.jsonl --loop interactive
+    python benchmarks/bench_agent.py --output agent.json
+    python benchmarks/bench_agent.py --compare agent.json
+    python benchmarks/bench_agent.py --server --fail-every 3   # real client, fake API
+
+With --server the session is served over HTTP by benchmarks/fake_server.py
+and the loops use the real client stack (connection pool, retries, rate
+limiter), so injected failures and their retry cost show up in the numbers.
+
+Record a real session for --replay with ``AGENT_RECORD=session.jsonl python
+main.py "..."``. The prompt only matters for a live run; replays serve the
+recorded responses in order.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from google.genai import types  # noqa: E402
+
+import main as agent_main  # noqa: E402  (before bench_tools puts calculator/main.py on the path)
+from benchmarks.bench_tools import compare  # noqa: E402
+from core.backends import ReplayBackend  # noqa: E402
+from core.cache import TOOL_CACHE  # noqa: E402
+
+
+def _model_turn(*parts, prompt_tokens=1000, response_tokens=50):
+    response = types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=list(parts)))],
+        usage_metadata=types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt_tokens, candidates_token_count=response_tokens
+        ),
+    )
+    return {"model": "scripted", "contents": [], "response": response.model_dump(mode="json", exclude_none=True)}
+
+
+def _call(name, **args):
+    return types.Part(function_call=types.FunctionCall(name=name, args=args))
+
+
+def builtin_scenario():
+    """A typical short session: locate, read, search, run, answer."""
+    return [
+        _model_turn(_call("find_files", filename="calculator.py")),
+        _model_turn(
+            _call("get_file_content", file_path="calculator/pkg/calculator.py"),
+            _call("search_code", query="def evaluate", path="calculator"),
+            prompt_tokens=1400,
+        ),
+        _model_turn(_call("run_python_file", file_path="calculator/main.py", args=["3 + 5 * 2"]),
+                    prompt_tokens=6200),
+        _model_turn(_call("get_files_info", directory="calculator"), prompt_tokens=6400),
+        _model_turn(types.Part(text="The calculator evaluates `3 + 5 * 2` to 13."), prompt_tokens=6600),
+    ]
+
+
+class TimedBackend:
+    """Wrap a backend and record when each model call starts and ends."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.spans = []
+
+    def generate_content(self, model, contents, config):
+        start = time.perf_counter()
+        try:
+            return self.inner.generate_content(model, contents, config)
+        finally:
+            self.spans.append((start, time.perf_counter()))
+
+    async def generate_content_stream(self, model, contents, config):
+        start = time.perf_counter()
+        async for chunk in self.inner.generate_content_stream(model, contents, config):
+            yield chunk
+        self.spans.append((start, time.perf_counter()))
+
+
+def run_once(loop, records, latency, server=None):
+    """Replay ``records`` through one loop; returns (total_s, model_s, per-iteration agent_s).
+
+    ``server`` is a ``(FakeGeminiServer, backend)`` pair to go over HTTP instead.
+    """
+    if server is None:
+        source = ReplayBackend(records=records, latency=latency)
+        backend = TimedBackend(source)
+    else:
+        source, client_backend = server
+        source.load(records, latency)
+        backend = TimedBackend(client_backend)
+    TOOL_CACHE.invalidate()
+    sink = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sink):
+        if loop == "main":
+            agent_main.run_agent("benchmark", backend=backend)
+        else:
+            import interactive_cli
+
+            interactive_cli.console.file = sink
+            if loop == "interactive":
+                asyncio.run(interactive_cli.execute_query_async("benchmark", [], backend=backend))
+            else:
+                interactive_cli.execute_query("benchmark", [], backend=backend)
+    total = time.perf_counter() - start
+
+    if source.calls != len(records):
+        raise RuntimeError(f"{loop} loop made {source.calls} of {len(records)} recorded model calls")
+    # Agent time for an iteration runs from the end of one model call to the
+    # start of the next (or to the end of the run).
+    ends = [end for _, end in backend.spans]
+    starts = [begin for begin, _ in backend.spans[1:]] + [start + total]
+    agent = [next_start - end for end, next_start in zip(ends, starts)]
+    model = sum(end - begin for begin, end in backend.spans)
+    return total, model, agent
+
+
+def start_server(args):
+    """Start a fake API server and a client backend pointed at it."""
+    from google import genai
+
+    from benchmarks.fake_server import FakeGeminiServer
+    from core.backends import CachingBackend, GeminiBackend, ResilientBackend
+    from core.prompt_cache import PromptCache
+    from core.retry import RetryPolicy
+
+    server = FakeGeminiServer(fail_every=args.fail_every, status=args.fail_status,
+                              retry_after=args.retry_after, cache_min_tokens=args.cache_min_tokens)
+    client = genai.Client(api_key="fake", http_options=types.HttpOptions(base_url=server.start()))
+    gemini = GeminiBackend(client)
+    backend = ResilientBackend(gemini, RetryPolicy(base_delay=args.retry_delay))
+    if args.prompt_cache:
+        backend = CachingBackend(backend, PromptCache(gemini, min_tokens=args.cache_min_tokens))
+    return server, backend
+
+
+def run_benchmarks(args, records, server=None):
+    results = {}
+    for loop in args.loops:
+        run_once(loop, records, 0.0, server)  # warm imports, index, worker pool and connections
+        totals, agents, iterations = [], [], []
+        for _ in range(args.repeat):
+            total, model, agent = run_once(loop, records, args.latency, server)
+            totals.append(total * 1000)
+            agents.append(sum(agent) * 1000)
+            iterations.append([a * 1000 for a in agent])
+        results[f"agent.{loop}.end_to_end"] = _row(totals)
+        results[f"agent.{loop}.agent_time"] = _row(agents)
+        for i, per_iteration in enumerate(zip(*iterations), start=1):
+            results[f"agent.{loop}.iteration_{i}"] = _row(per_iteration)
+    return results
+
+
+def _row(times):
+    return {"median_ms": statistics.median(times), "min_ms": min(times), "runs": len(times)}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the agent loop offline.")
+    parser.add_argument("--replay", help="Recorded session (JSONL) to replay instead of the built-in scenario.")
+    parser.add_argument("--loop", default="main,interactive",
+                        help="Comma-separated loops: main, interactive (streaming) and/or interactive-sync.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Emulated model latency per call, in seconds.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per loop.")
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    parser.add_argument("--compare", help="Baseline JSON to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed slowdown before a result counts as a regression.")
+    parser.add_argument("--server", action="store_true",
+                        help="Serve the session from a local fake API server through the real client.")
+    parser.add_argument("--fail-every", type=int, default=0,
+                        help="With --server, fail every Nth request.")
+    parser.add_argument("--fail-status", type=int, default=503,
+                        help="With --server, HTTP status of injected failures (0 drops the connection).")
+    parser.add_argument("--retry-after", type=float, help="With --server, Retry-After sent with failures.")
+    parser.add_argument("--retry-delay", type=float, default=0.05,
+                        help="With --server, base backoff delay of the client, in seconds.")
+    parser.add_argument("--prompt-cache", action="store_true",
+                        help="With --server, send the stable prompt prefix as cached content.")
+    parser.add_argument("--cache-min-tokens", type=int, default=1024,
+                        help="With --server, smallest prefix (in estimated tokens) worth caching.")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5,
+                        help="Ignore slowdowns smaller than this many milliseconds.")
+    args = parser.parse_args(argv)
+    args.loops = [loop.strip() for loop in args.loop.split(",") if loop.strip()]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.replay:
+        with open(args.replay, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    else:
+        records = builtin_scenario()
+    # interactive_cli refuses to start without an API key unless replaying.
+    os.environ.setdefault("AGENT_REPLAY", args.replay or os.path.join(tempfile.gettempdir(), "unused.jsonl"))
+
+    server = start_server(args) if args.server else None
+    try:
+        results = run_benchmarks(args, records, server)
+    finally:
+        if server is not None:
+            server[0].stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"meta": {"records": len(records), "latency": args.latency}, "results": results}, f, indent=2)
+        print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(baseline, results, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+            return 1
+    elif not args.output:
+        for name, row in results.items():
+            print(f"{name:<40} {row['median_ms']:>9.2f}ms (min {row['min_ms']:.2f}ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
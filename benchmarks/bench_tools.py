@@ -0,0 +1,307 @@
+"""Benchmarks for the functions/ tool layer on synthetic project trees.
+
+Usage:
+    python benchmarks/bench_tools.py --sizes 1k,100k --output baseline.json
+    python benchmarks/bench_tools.py --sizes 1k,100k --compare baseline.json
+
+Sizes accept a k/m suffix (1k, 100k, 1m). Generated trees are cached under
+--workdir and reused by later runs. In compare mode, any benchmark whose
+median time grew by more than --threshold (a fraction, default 0.25) is
+reported as a regression (unless the absolute change is below --min-delta-ms)
+and the exit status is 1.
+
+Cold start of the entry points is measured in fresh interpreters; if its
+cost above a bare ``python -c pass`` exceeds --startup-budget-ms the exit
+status is 1 as well.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "calculator"))
+
+from benchmarks.synthetic import generate_big_file, generate_flat_dir, generate_tree  # noqa: E402
+from functions.edit_file import edit_file  # noqa: E402
+from functions.file_index import FileIndex  # noqa: E402
+from functions.find_files import find_files  # noqa: E402
+from functions.get_file_content import get_file_content  # noqa: E402
+from functions.get_files_info import get_files_info  # noqa: E402
+from functions.run_python_file import run_python_file  # noqa: E402
+from functions.write_file import write_file  # noqa: E402
+import functions.python_workers as python_workers  # noqa: E402
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    multiplier = {"k": 1000, "m": 1000000}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+
+def size_label(size):
+    """The shortest ``parse_size`` spelling of ``size``, used in result names."""
+    if size and size % 1000000 == 0:
+        return f"{size // 1000000}m"
+    if size and size % 1000 == 0:
+        return f"{size // 1000}k"
+    return str(size)
+
+
+def measure(function, repeat, warmup=1):
+    """Time ``function`` and return a result row in milliseconds."""
+    for _ in range(warmup):
+        function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": statistics.median(times), "min_ms": min(times), "runs": repeat}
+
+
+def reset_index(root, drop_cache_file):
+    FileIndex._instances.pop(os.path.abspath(root), None)
+    if drop_cache_file:
+        shutil.rmtree(os.path.join(root, ".kodex_cache"), ignore_errors=True)
+
+
+def bench_find_files(results, root, label, repeat):
+    def cold():
+        reset_index(root, drop_cache_file=True)
+        find_files(root, filename="__init__.py")
+
+    def warm_start():
+        reset_index(root, drop_cache_file=False)
+        find_files(root, filename="__init__.py")
+
+    results[f"find_files.cold_index[{label}]"] = measure(cold, max(1, repeat // 2), warmup=0)
+    results[f"find_files.warm_start[{label}]"] = measure(warm_start, repeat)
+    results[f"find_files.exact_hit[{label}]"] = measure(
+        lambda: find_files(root, filename="utils.py"), repeat)
+    results[f"find_files.miss_fallback[{label}]"] = measure(
+        lambda: find_files(root, filename="render.txt.missing"), repeat)
+    results[f"find_files.pattern[{label}]"] = measure(
+        lambda: find_files(root, pattern="handler"), repeat)
+    results[f"find_files.glob[{label}]"] = measure(
+        lambda: find_files(root, pattern="test_*_utils.py"), repeat)
+    results[f"find_files.segments[{label}]"] = measure(
+        lambda: find_files(root, pattern="core/render"), repeat)
+    results[f"find_files.typo[{label}]"] = measure(
+        lambda: find_files(root, pattern="hadnler_schmea"), repeat)
+    results[f"get_files_info.recursive_page[{label}]"] = measure(
+        lambda: get_files_info(root, ".", recursive=True), repeat)
+    results[f"get_files_info.recursive_glob[{label}]"] = measure(
+        lambda: get_files_info(root, ".", recursive=True, pattern="test_*.py"), repeat)
+
+
+def bench_files_info(results, workdir, entries, repeat):
+    flat = os.path.join(workdir, f"flat_{entries}")
+    generate_flat_dir(flat, entries)
+    results[f"get_files_info.flat[{entries}]"] = measure(
+        lambda: get_files_info(workdir, os.path.basename(flat)), repeat)
+    results[f"get_files_info.flat_last_page[{entries}]"] = measure(
+        lambda: get_files_info(workdir, os.path.basename(flat), cursor=f"entry_{entries - 100:07d}.txt"), repeat)
+
+
+def bench_file_content(results, workdir, big_file_mb, repeat):
+    small = os.path.join(workdir, "small.py")
+    with open(small, "w", encoding="utf-8") as f:
+        f.write("print('hello')\n" * 200)
+    big = os.path.join(workdir, f"big_{big_file_mb}mb.log")
+    generate_big_file(big, big_file_mb * 1024 * 1024)
+
+    results["get_file_content.small"] = measure(lambda: get_file_content(workdir, "small.py"), repeat)
+    name = os.path.basename(big)
+    results[f"get_file_content.big_head[{big_file_mb}mb]"] = measure(
+        lambda: get_file_content(workdir, name), repeat)
+    results[f"get_file_content.big_tail[{big_file_mb}mb]"] = measure(
+        lambda: get_file_content(workdir, name, tail_lines=50), repeat)
+    results[f"get_file_content.big_middle_lines[{big_file_mb}mb]"] = measure(
+        lambda: get_file_content(workdir, name, start_line=200000, end_line=200050), repeat)
+
+
+def bench_write_file(results, workdir, repeat):
+    content = "x = 1\n" * 3000
+    results["write_file.18kb"] = measure(
+        lambda: write_file(workdir, "written/output.py", content), repeat)
+
+
+def bench_edit_file(results, workdir, repeat):
+    lines = [f"value_{i} = {i}\n" for i in range(3000)]
+    path = os.path.join(workdir, "written", "module_3000.py")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+    flip = [False]
+
+    def one_line_edit():
+        # Alternate so every run changes the file
+        old, new = ("value_1500 = 1500\n", "value_1500 = -1\n")[::-1 if flip[0] else 1]
+        flip[0] = not flip[0]
+        edit_file(workdir, "written/module_3000.py", [{"search": old, "replace": new}])
+
+    results["edit_file.one_line_3000"] = measure(one_line_edit, repeat)
+    results["write_file.rewrite_3000"] = measure(
+        lambda: write_file(workdir, "written/module_3000.py", "".join(lines)), repeat)
+
+
+def bench_run_python_file(results, workdir, repeat):
+    with open(os.path.join(workdir, "noop.py"), "w", encoding="utf-8") as f:
+        f.write("pass\n")
+    previous = python_workers.WARM_PYTHON
+    try:
+        python_workers.WARM_PYTHON = False
+        results["run_python_file.cold_startup"] = measure(
+            lambda: run_python_file(workdir, "noop.py"), repeat)
+        if hasattr(os, "fork"):
+            python_workers.WARM_PYTHON = True
+            results["run_python_file.warm_startup"] = measure(
+                lambda: run_python_file(workdir, "noop.py"), repeat)
+    finally:
+        python_workers.WARM_PYTHON = previous
+
+
+def bench_calculator(results, repeat):
+    from pkg.calculator import Calculator
+
+    calculator = Calculator()
+    expressions = [f"3 * {i} + 5 - {i} / 2" for i in range(10000)]
+    results["calculator.evaluate_10k_distinct"] = measure(
+        lambda: [calculator.evaluate(e) for e in expressions], repeat)
+    results["calculator.evaluate_10k_repeated"] = measure(
+        lambda: [calculator.evaluate("3 * x + 5 - x / 2", {"x": 4}) for _ in range(10000)], repeat)
+    column = [float(i) for i in range(1000000)]
+    results["calculator.evaluate_columns_1m"] = measure(
+        lambda: calculator.evaluate_columns("3 * x + 5 - x / 2", {"x": column}), repeat)
+
+
+def bench_startup(results, repeat):
+    def start(*argv):
+        return lambda: subprocess.run([sys.executable, *argv], cwd=PROJECT_ROOT, check=True,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    results["startup.python_baseline"] = measure(start("-c", "pass"), repeat)
+    results["startup.main_help"] = measure(start("main.py", "--help"), repeat)
+    results["startup.interactive_import"] = measure(start("-c", "import interactive_cli"), repeat)
+
+
+def startup_over_budget(results, budget_ms):
+    """Return the cold-start benchmarks whose overhead exceeds ``budget_ms``."""
+    baseline = results["startup.python_baseline"]["median_ms"]
+    over = []
+    for name in ("startup.main_help", "startup.interactive_import"):
+        overhead = results[name]["median_ms"] - baseline
+        if overhead > budget_ms:
+            over.append(f"{name}: {overhead:.0f}ms over a bare interpreter (budget {budget_ms:.0f}ms)")
+    return over
+
+
+def run_benchmarks(args):
+    workdir = os.path.abspath(args.workdir)
+    os.makedirs(workdir, exist_ok=True)
+    results = {}
+
+    for size in args.sizes:
+        label = size_label(size)
+        root = os.path.join(workdir, f"tree_{label}")
+        print(f"Preparing synthetic tree with {size} files in {root} ...", flush=True)
+        generate_tree(root, size)
+        bench_find_files(results, root, label, args.repeat)
+
+    bench_files_info(results, workdir, args.flat_entries, args.repeat)
+    bench_file_content(results, workdir, args.big_file_mb, args.repeat)
+    bench_write_file(results, workdir, args.repeat)
+    bench_edit_file(results, workdir, args.repeat)
+    bench_run_python_file(results, workdir, args.repeat)
+    bench_calculator(results, args.repeat)
+    bench_startup(results, args.repeat)
+    return results
+
+
+def compare(baseline, results, threshold, min_delta_ms=0.1):
+    """Print a comparison table and return the names of regressed benchmarks."""
+    regressions = []
+    print(f"{'benchmark':<48} {'baseline':>11} {'current':>11} {'change':>8}")
+    for name, row in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<48} {'-':>11} {row['median_ms']:>9.2f}ms {'new':>8}")
+            continue
+        change = row["median_ms"] / base["median_ms"] - 1 if base["median_ms"] else 0.0
+        flag = ""
+        # Sub-millisecond benchmarks are noisy; ignore tiny absolute changes.
+        if change > threshold and row["median_ms"] - base["median_ms"] > min_delta_ms:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<48} {base['median_ms']:>9.2f}ms {row['median_ms']:>9.2f}ms {change:>+7.0%}{flag}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the agent's tool layer.")
+    parser.add_argument("--sizes", default="1k", help="Comma-separated tree sizes, e.g. 1k,100k,1m.")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "kodex-bench"),
+                        help="Where synthetic trees and files are generated (and cached).")
+    parser.add_argument("--big-file-mb", type=int, default=64, help="Size of the large file read test.")
+    parser.add_argument("--flat-entries", type=int, default=20000,
+                        help="Entries in the huge-directory listing test.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark.")
+    parser.add_argument("--startup-budget-ms", type=float, default=150,
+                        help="Allowed cold-start cost of the entry points above a bare interpreter.")
+    parser.add_argument("--output", help="Write results to this JSON file (e.g. a new baseline).")
+    parser.add_argument("--compare", help="Baseline JSON to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed slowdown before a benchmark counts as a regression.")
+    parser.add_argument("--min-delta-ms", type=float, default=0.1,
+                        help="Ignore slowdowns smaller than this many milliseconds.")
+    args = parser.parse_args(argv)
+    args.sizes = [parse_size(size) for size in args.sizes.split(",") if size.strip()]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_benchmarks(args)
+    status = 0
+
+    if args.output:
+        payload = {
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+        print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(baseline, results, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+            status = 1
+    elif not args.output:
+        for name, row in sorted(results.items()):
+            print(f"{name:<48} {row['median_ms']:>9.2f}ms (min {row['min_ms']:.2f}ms)")
+
+    for message in startup_over_budget(results, args.startup_budget_ms):
+        print(f"Cold start over budget: {message}")
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
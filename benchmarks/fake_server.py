@@ -0,0 +1,247 @@
+"""A local stand-in for the Gemini REST API that injects failures and latency.
+
+Serves ``models/<model>:generateContent`` and ``:streamGenerateContent``
+(server-sent events) from a recorded session, one record per successful
+request in order (see core/backends.py for the format), or a fixed text
+answer when no session is given. Failures are injected on every Nth request
+and/or at random: an HTTP error with an optional Retry-After header, or
+(status 0) a dropped connection. Failed requests do not consume a record,
+so a session still completes when the client retries.
+
+``cachedContents`` can be created, updated and deleted. A request that names
+one reports its size as ``cachedContentTokenCount``; tokens are estimated at
+four characters each, and caches under ``--cache-min-tokens`` are rejected
+like the real API does.
+
+Usage:
+    python benchmarks/fake_server.py --port 8765 --fail-every 3 --status 429 --retry-after 1
+    AGENT_API_BASE_URL=http://127.0.0.1:8765/ GEMINI_API_KEY=fake python main.py "hello"
+
+``bench_agent.py --server`` runs the agent loops against it in-process.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from google.genai import types  # noqa: E402
+
+from core.backends import merge_chunks  # noqa: E402
+
+_STATUS_NAMES = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE", 504: "DEADLINE_EXCEEDED"}
+
+
+def _text_record(text):
+    return {"response": {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}],
+        "usage_metadata": {"prompt_token_count": 10, "candidates_token_count": 5},
+    }}
+
+
+class FakeGeminiServer:
+    """Threaded HTTP server; ``start`` returns the base URL to give the client."""
+
+    def __init__(self, records=None, latency=0.0, fail_every=0, fail_rate=0.0,
+                 status=503, retry_after=None, seed=0, cache_min_tokens=1024):
+        self.records = records
+        self.latency = latency
+        self.fail_every = fail_every
+        self.fail_rate = fail_rate
+        self.status = status
+        self.retry_after = retry_after
+        self.requests = 0
+        self.failures = 0
+        self.calls = 0  # successful responses, like ReplayBackend.calls
+        self.cache_min_tokens = cache_min_tokens
+        self.caches = {}  # name -> {"tokens", "expires_at"}
+        self.cache_hits = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def load(self, records, latency=None):
+        """Serve ``records`` from the start (and reset the counters)."""
+        with self._lock:
+            self.records = records
+            if latency is not None:
+                self.latency = latency
+            self.requests = self.failures = self.calls = self.cache_hits = 0
+
+    def start(self, host="127.0.0.1", port=0):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                server._handle(self)
+
+            def do_PATCH(self):
+                server._handle(self)
+
+            def do_DELETE(self):
+                server._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fake-gemini", daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}/"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _handle(self, handler):
+        raw = handler.rfile.read(int(handler.headers.get("Content-Length") or 0))
+        body = json.loads(raw) if raw else {}
+        path = handler.path.split("?")[0]
+        if "/cachedContents" in path:
+            return self._handle_cache(handler, path, body)
+        stream = ":streamGenerateContent" in path
+        if ":generateContent" not in path and not stream:
+            return self._send_json(handler, 404, {"error": {"code": 404, "message": "not found"}})
+
+        cached_tokens = 0
+        if body.get("cachedContent"):
+            with self._lock:
+                cache = self.caches.get(body["cachedContent"])
+                if cache is None or cache["expires_at"] < time.time():
+                    return self._send_json(handler, 404, {"error": {
+                        "code": 404, "message": "CachedContent not found", "status": "NOT_FOUND"}})
+                self.cache_hits += 1
+                cached_tokens = cache["tokens"]
+
+        with self._lock:
+            self.requests += 1
+            fail = ((self.fail_every and self.requests % self.fail_every == 0)
+                    or (self.fail_rate and self._random.random() < self.fail_rate))
+            if fail:
+                self.failures += 1
+                record = None
+            elif self.records is None:
+                self.calls += 1
+                record = _text_record("Hello from the fake server.")
+            elif self.calls < len(self.records):
+                record = self.records[self.calls]
+                self.calls += 1
+            else:
+                return self._send_json(handler, 400, {"error": {
+                    "code": 400, "message": f"fake server: all {len(self.records)} records served"}})
+
+        if fail:
+            time.sleep(self.latency / 2)
+            return self._fail(handler)
+        chunks = [types.GenerateContentResponse.model_validate(chunk)
+                  for chunk in record.get("chunks", [record.get("response")])]
+        if cached_tokens:
+            for chunk in chunks:
+                if chunk.usage_metadata:
+                    chunk.usage_metadata.cached_content_token_count = cached_tokens
+        if not stream:
+            time.sleep(self.latency)
+            return self._send_json(handler, 200, self._to_wire(merge_chunks(chunks)))
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        for chunk in chunks:
+            time.sleep(self.latency / len(chunks))
+            handler.wfile.write(f"data: {json.dumps(self._to_wire(chunk))}\r\n\r\n".encode("utf-8"))
+            handler.wfile.flush()
+        handler.close_connection = True
+
+    def _handle_cache(self, handler, path, body):
+        name = path.split("/", 2)[-1]  # "cachedContents/<id>", or "cachedContents" to create
+        with self._lock:
+            if handler.command == "POST" and name == "cachedContents":
+                tokens = len(json.dumps(body)) // 4
+                if tokens < self.cache_min_tokens:
+                    return self._send_json(handler, 400, {"error": {
+                        "code": 400, "status": "INVALID_ARGUMENT",
+                        "message": f"Cached content is too small. total_token_count={tokens}, "
+                                   f"min_total_token_count={self.cache_min_tokens}"}})
+                name = f"cachedContents/fake-{len(self.caches) + 1}"
+                self.caches[name] = {"tokens": tokens}
+            elif name not in self.caches:
+                return self._send_json(handler, 404, {"error": {
+                    "code": 404, "message": "CachedContent not found", "status": "NOT_FOUND"}})
+            elif handler.command == "DELETE":
+                del self.caches[name]
+                return self._send_json(handler, 200, {})
+            cache = self.caches[name]
+            cache["expires_at"] = time.time() + float(str(body.get("ttl", "3600s")).rstrip("s"))
+
+        expire_time = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(cache["expires_at"]))
+        self._send_json(handler, 200, {"name": name, "expireTime": expire_time,
+                                       "usageMetadata": {"totalTokenCount": cache["tokens"]}})
+
+    def _fail(self, handler):
+        if not self.status:
+            handler.close_connection = True
+            handler.connection.close()  # a dropped connection, no response at all
+            return
+        body = {"error": {"code": self.status, "message": "injected failure",
+                          "status": _STATUS_NAMES.get(self.status, "UNKNOWN")}}
+        headers = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else {}
+        self._send_json(handler, self.status, body, headers)
+
+    @staticmethod
+    def _send_json(handler, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    @staticmethod
+    def _to_wire(response):
+        """A response as REST JSON (camelCase field names)."""
+        return response.model_dump(mode="json", exclude_none=True, by_alias=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a fake Gemini API server.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--replay", help="Recorded session (JSONL) to serve; default is a fixed text answer.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per response.")
+    parser.add_argument("--fail-every", type=int, default=0, help="Fail every Nth request.")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fail this fraction of requests at random.")
+    parser.add_argument("--status", type=int, default=503, help="HTTP status of failures; 0 drops the connection.")
+    parser.add_argument("--retry-after", type=float, help="Retry-After header (seconds) sent with failures.")
+    parser.add_argument("--cache-min-tokens", type=int, default=1024,
+                        help="Smallest cachedContents accepted, in (estimated) tokens.")
+    args = parser.parse_args(argv)
+
+    records = None
+    if args.replay:
+        with open(args.replay, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    server = FakeGeminiServer(records, args.latency, args.fail_every, args.fail_rate, args.status,
+                              args.retry_after, cache_min_tokens=args.cache_min_tokens)
+    url = server.start(port=args.port)
+    print(f"Fake Gemini API on {url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""Synthetic project trees for benchmarking the tool layer.
+
+Trees are deterministic for a given size and seed, and reused across runs:
+a marker file records the parameters a directory was generated with.
+"""
+import json
+import os
+import random
+
+MARKER_FILE = ".synthetic_tree.json"
+
+_WORDS = [
+    "api", "auth", "cache", "client", "config", "core", "data", "db", "handler",
+    "helpers", "index", "io", "loader", "main", "model", "models", "parser",
+    "render", "router", "schema", "server", "service", "settings", "store",
+    "stream", "task", "tools", "types", "user", "utils", "view", "worker",
+]
+# (extension, weight) roughly matching a Python-heavy monorepo
+_EXTENSIONS = [
+    (".py", 45), (".md", 8), (".txt", 6), (".json", 10), (".js", 10),
+    (".ts", 8), (".yaml", 5), (".cfg", 2), (".html", 4), (".csv", 2),
+]
+_COMMON_NAMES = ["__init__.py", "README.md", "utils.py", "test_main.py", "conftest.py"]
+
+_PY_BODY = '''"""Generated module {n}."""
+
+
+def handler_{n}(value):
+    return value * {n}
+
+
+class Model{n}:
+    name = "model_{n}"
+'''
+
+
+def _file_name(rng):
+    if rng.random() < 0.1:
+        return rng.choice(_COMMON_NAMES)
+    parts = rng.sample(_WORDS, rng.choice((1, 1, 2, 2, 3)))
+    stem = "_".join(parts)
+    if rng.random() < 0.15:
+        stem = f"test_{stem}"
+    extensions, weights = zip(*_EXTENSIONS)
+    return stem + rng.choices(extensions, weights)[0]
+
+
+def generate_tree(root, n_files, seed=0, max_depth=8, files_per_dir=15):
+    """Create (or reuse) a tree of ``n_files`` files under ``root``.
+
+    Directory depth follows a roughly geometric distribution capped at
+    ``max_depth``; file names mix common boilerplate names with word-based
+    names so both exact and substring lookups hit realistic match counts.
+    Returns the list of created relative file paths.
+    """
+    params = {"n_files": n_files, "seed": seed, "max_depth": max_depth, "files_per_dir": files_per_dir}
+    marker = os.path.join(root, MARKER_FILE)
+    try:
+        with open(marker, "r", encoding="utf-8") as f:
+            existing = json.load(f)
+        if existing["params"] == params:
+            return existing["files"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    rng = random.Random(seed)
+    dirs = [("", 0)]
+    for i in range(max(1, n_files // files_per_dir)):
+        parent, depth = rng.choice(dirs)
+        if depth >= max_depth or rng.random() < 0.3:
+            parent, depth = rng.choice(dirs[: max(1, len(dirs) // 4)])
+        name = f"{rng.choice(_WORDS)}_{i}" if rng.random() < 0.5 else f"{rng.choice(_WORDS)}{i}"
+        dirs.append((os.path.join(parent, name) if parent else name, depth + 1))
+
+    os.makedirs(root, exist_ok=True)
+    for rel, _ in dirs[1:]:
+        os.makedirs(os.path.join(root, rel), exist_ok=True)
+
+    files = []
+    seen = set()
+    for n in range(n_files):
+        rel_dir = rng.choice(dirs)[0]
+        name = _file_name(rng)
+        rel = os.path.join(rel_dir, name) if rel_dir else name
+        if rel in seen:
+            stem, ext = os.path.splitext(name)
+            rel = os.path.join(rel_dir, f"{stem}_{n}{ext}") if rel_dir else f"{stem}_{n}{ext}"
+        seen.add(rel)
+        with open(os.path.join(root, rel), "w", encoding="utf-8") as f:
+            f.write(_PY_BODY.format(n=n) if rel.endswith(".py") else f"generated file {n}\n")
+        files.append(rel)
+
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump({"params": params, "files": files}, f)
+    return files
+
+
+def generate_flat_dir(path, n_entries):
+    """Create a single directory with ``n_entries`` small files."""
+    os.makedirs(path, exist_ok=True)
+    existing = len(os.listdir(path))
+    for i in range(existing, n_entries):
+        with open(os.path.join(path, f"entry_{i:07d}.txt"), "w", encoding="utf-8") as f:
+            f.write("x\n")
+
+
+def generate_big_file(path, size_bytes):
+    """Create a text file of about ``size_bytes`` made of numbered lines."""
+    try:
+        if os.path.getsize(path) >= size_bytes:
+            return
+    except OSError:
+        pass
+    block = "".join(f"line {i:08d} lorem ipsum dolor sit amet\n" for i in range(20000)).encode()
+    written = 0
+    with open(path, "wb") as f:
+        while written < size_bytes:
+            f.write(block)
+            written += len(block)
@@ -1,60 +1,303 @@
+import math
+import operator
+import re
+from array import array
+from collections import OrderedDict
+from itertools import repeat
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+COMPILE_CACHE_SIZE = 256
+# Very long expressions are compiled each time rather than pinned in the cache.
+MAX_CACHED_EXPRESSION_CHARS = 10000
+
+_TOKEN_RE = re.compile(
+    r"\s*(?:"
+    r"(?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)"
+    r"|(?P<name>[A-Za-z_]\w*)"
+    r"|(?P<op>\*\*|[-+*/^()])"
+    r"|(?P<bad>\S))"
+)
+
+
+def _ieee_truediv(a, b):
+    """``a / b`` with NumPy's float64 result instead of ZeroDivisionError."""
+    try:
+        return a / b
+    except ZeroDivisionError:
+        if a == 0 or math.isnan(a):
+            return math.nan
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+
+
+def _ieee_pow(a, b):
+    """``a ** b`` with NumPy's float64 result: inf on overflow or a zero base
+    with a negative exponent, nan where Python would return a complex number."""
+    try:
+        result = a ** b
+    except (ZeroDivisionError, OverflowError):
+        odd = math.isfinite(b) and b == int(b) and int(b) % 2 == 1
+        return -math.inf if odd and math.copysign(1.0, a) < 0 else math.inf
+    return math.nan if isinstance(result, complex) else result
+
+
+# Column-wise replacements for operators that raise or leave the reals
+_IEEE_OPERATORS = {operator.truediv: _ieee_truediv, operator.pow: _ieee_pow}
+
+
+class CompiledExpression:
+    """An expression parsed once into a postfix (RPN) program.
+
+    Each step is ``(kind, value)`` where kind is "num", "var", "op" (binary)
+    or "unary". Constant sub-expressions are folded at compile time.
+    """
+
+    def __init__(self, source, program, variables):
+        self.source = source
+        self.program = program
+        self.variables = variables
+
+    def __repr__(self):
+        return f"CompiledExpression({self.source!r})"
+
 
 class Calculator:
     def __init__(self):
         self.operators = {
-            "+": lambda a, b: a + b,
-            "-": lambda a, b: a - b,
-            "*": lambda a, b: a * b,
-            "/": lambda a, b: a / b,
+            "+": operator.add,
+            "-": operator.sub,
+            "*": operator.mul,
+            "/": operator.truediv,
+            "^": operator.pow,
         }
         self.precedence = {
             "+": 1,  # Changed precedence for '+' from 3 to 1
             "-": 1,  # Assuming '-' should also have lower precedence
             "*": 2,
             "/": 2,
+            "^": 4,
         }
+        self.right_associative = {"^"}
+        # Unary minus binds tighter than * and / but looser than ^ (-2 ^ 2 == -4).
+        self.unary_operators = {"-": operator.neg}
+        self.unary_precedence = 3
+        self._compiled = OrderedDict()
 
-    def evaluate(self, expression):
+    def evaluate(self, expression, variables=None):
         if not expression or expression.isspace():
             return None
-        tokens = expression.strip().split()
-        return self._evaluate_infix(tokens)
+        return self._run_scalar(self.compile(expression), variables or {})
 
-    def _evaluate_infix(self, tokens):
-        values = []
+    def compile(self, expression):
+        """Parse ``expression`` once so it can be evaluated many times.
+
+        Compiled programs are kept in a bounded LRU keyed by the expression
+        string, so repeated expressions skip tokenizing and parsing.
+        """
+        compiled = self._compiled.get(expression)
+        if compiled is not None:
+            self._compiled.move_to_end(expression)
+            return compiled
+        compiled = self._compile_infix(expression, self._tokenize(expression))
+        if len(expression) <= MAX_CACHED_EXPRESSION_CHARS:
+            self._compiled[expression] = compiled
+            if len(self._compiled) > COMPILE_CACHE_SIZE:
+                self._compiled.popitem(last=False)
+        return compiled
+
+    def evaluate_columns(self, expression, columns):
+        """Evaluate an expression over whole columns of values at once.
+
+        ``columns`` maps variable names to equal-length sequences. With NumPy
+        installed the result is a float64 ``ndarray`` computed with array
+        operations. Without it, the result is an ``array('d')`` built by
+        mapping the operator functions over the columns. Either way a row
+        that divides by zero, overflows or has no real result is inf or nan
+        (IEEE rules, as in NumPy) rather than failing the whole batch.
+        """
+        compiled = expression if isinstance(expression, CompiledExpression) else self.compile(expression)
+        missing = [name for name in compiled.variables if name not in columns]
+        if missing:
+            raise ValueError(f"unknown variable: {missing[0]}")
+
+        lengths = {len(columns[name]) for name in compiled.variables}
+        if len(lengths) > 1:
+            raise ValueError("columns must all have the same length")
+        return self._run_columns(compiled, columns, lengths.pop() if lengths else 1)
+
+    def evaluate_many(self, expression, rows):
+        """Evaluate an expression for each mapping of variable values in ``rows``."""
+        compiled = expression if isinstance(expression, CompiledExpression) else self.compile(expression)
+        rows = list(rows)
+        columns = {}
+        for name in compiled.variables:
+            try:
+                columns[name] = [row[name] for row in rows]
+            except KeyError:
+                raise ValueError(f"unknown variable: {name}")
+        return self._run_columns(compiled, columns, len(rows))
+
+    def _tokenize(self, expression):
+        """Split ``expression`` into ``(kind, text)`` tokens in a single pass."""
+        tokens = []
+        for match in _TOKEN_RE.finditer(expression):
+            kind = match.lastgroup
+            if kind is None:
+                continue  # trailing whitespace
+            text = match.group(kind)
+            if kind == "bad":
+                raise ValueError(f"invalid token: {text}")
+            if text == "**":
+                text = "^"
+            tokens.append((kind, text))
+        return tokens
+
+    def _compile_infix(self, source, tokens):
+        """Shunting-yard over ``tokens``, producing a folded RPN program.
+
+        Both stacks are plain lists, so arbitrarily long or deeply nested
+        expressions compile in linear time without recursion.
+        """
+        program = []
         operators = []
+        expect_operand = True
 
-        for token in tokens:
-            if token in self.operators:
-                while (
-                    operators
-                    and operators[-1] in self.operators
-                    and self.precedence[operators[-1]] >= self.precedence[token]
-                ):
-                    self._apply_operator(operators, values)
-                operators.append(token)
+        for kind, text in tokens:
+            if kind in ("num", "name"):
+                if not expect_operand:
+                    raise ValueError("invalid expression")
+                if kind == "num":
+                    program.append(("num", float(text)))
+                else:
+                    program.append(("var", text))
+                expect_operand = False
+            elif text == "(":
+                if not expect_operand:
+                    raise ValueError("invalid expression")
+                operators.append(("paren", "("))
+            elif text == ")":
+                if expect_operand:
+                    raise ValueError("invalid expression")
+                while operators and operators[-1][0] != "paren":
+                    self._emit(program, operators.pop())
+                if not operators:
+                    raise ValueError("mismatched parentheses")
+                operators.pop()
+            elif expect_operand:
+                if text not in self.unary_operators:
+                    raise ValueError(f"not enough operands for operator {text}")
+                operators.append(("unary", text))
             else:
-                try:
-                    values.append(float(token))
-                except ValueError:
-                    raise ValueError(f"invalid token: {token}")
+                precedence = self.precedence[text]
+                while operators and operators[-1][0] != "paren":
+                    top_kind, top = operators[-1]
+                    top_precedence = self.unary_precedence if top_kind == "unary" else self.precedence[top]
+                    if top_precedence > precedence or (
+                        top_precedence == precedence and text not in self.right_associative
+                    ):
+                        self._emit(program, operators.pop())
+                    else:
+                        break
+                operators.append(("op", text))
+                expect_operand = True
 
+        if expect_operand:
+            if operators and operators[-1][0] != "paren":
+                raise ValueError(f"not enough operands for operator {operators[-1][1]}")
+            raise ValueError("invalid expression")
         while operators:
-            self._apply_operator(operators, values)
+            operator_entry = operators.pop()
+            if operator_entry[0] == "paren":
+                raise ValueError("mismatched parentheses")
+            self._emit(program, operator_entry)
 
-        if len(values) != 1:
-            raise ValueError("invalid expression")
+        variables = tuple(dict.fromkeys(value for kind, value in program if kind == "var"))
+        return CompiledExpression(source, tuple(program), variables)
+
+    def _emit(self, program, operator_entry):
+        """Append an operator to ``program``, folding it if its operands are constants."""
+        kind, symbol = operator_entry
+        try:
+            if kind == "unary" and program[-1][0] == "num":
+                program[-1] = ("num", self.unary_operators[symbol](program[-1][1]))
+                return
+            if kind == "op" and len(program) >= 2 and program[-1][0] == "num" and program[-2][0] == "num":
+                value = self.operators[symbol](program[-2][1], program[-1][1])
+                if not isinstance(value, complex):
+                    del program[-1]
+                    program[-1] = ("num", value)
+                    return
+        except (ArithmeticError, ValueError):
+            pass  # leave it for evaluation time to raise
+        program.append((kind, symbol))
 
+    def _run_scalar(self, compiled, variables):
+        values = []
+        for kind, value in compiled.program:
+            if kind == "num":
+                values.append(value)
+            elif kind == "var":
+                try:
+                    values.append(float(variables[value]))
+                except KeyError:
+                    raise ValueError(f"unknown variable: {value}")
+            elif kind == "unary":
+                values.append(self.unary_operators[value](values.pop()))
+            else:
+                b = values.pop()
+                a = values.pop()
+                values.append(self.operators[value](a, b))
+        if isinstance(values[0], complex):
+            raise ValueError("result is not a real number")
         return values[0]
 
-    def _apply_operator(self, operators, values):
-        if not operators:
-            return
+    def _run_columns(self, compiled, columns, length):
+        if np is not None:
+            return self._run_numpy(compiled, columns, length)
+        return self._run_arrays(compiled, columns, length)
 
-        operator = operators.pop()
-        if len(values) < 2:
-            raise ValueError(f"not enough operands for operator {operator}")
+    def _run_numpy(self, compiled, columns, length):
+        values = []
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            for kind, value in compiled.program:
+                if kind == "num":
+                    values.append(value)
+                elif kind == "var":
+                    values.append(np.asarray(columns[value], dtype=np.float64))
+                elif kind == "unary":
+                    values.append(self.unary_operators[value](values.pop()))
+                else:
+                    b = values.pop()
+                    a = values.pop()
+                    values.append(self.operators[value](a, b))
+        return np.broadcast_to(np.asarray(values[0], dtype=np.float64), (length,)).copy()
 
-        b = values.pop()
-        a = values.pop()
-        values.append(self.operators[operator](a, b))
+    def _run_arrays(self, compiled, columns, length):
+        # Scalars stay Python floats until combined with a column.
+        values = []
+        for kind, value in compiled.program:
+            if kind == "num":
+                values.append(value)
+            elif kind == "var":
+                column = columns[value]
+                values.append(column if isinstance(column, array) and column.typecode == "d"
+                              else array("d", column))
+            elif kind == "unary":
+                a = values.pop()
+                function = self.unary_operators[value]
+                values.append(function(a) if isinstance(a, float) else array("d", map(function, a)))
+            else:
+                b = values.pop()
+                a = values.pop()
+                function = self.operators[value]
+                if isinstance(a, float) and isinstance(b, float):
+                    values.append(function(a, b))
+                else:
+                    a = repeat(a, length) if isinstance(a, float) else a
+                    b = repeat(b, length) if isinstance(b, float) else b
+                    values.append(array("d", map(_IEEE_OPERATORS.get(function, function), a, b)))
+        result = values[0]
+        return array("d", repeat(result, length)) if isinstance(result, float) else result
@@ -1,4 +1,8 @@
+import math
 import unittest
+from unittest import mock
+
+import pkg.calculator
 from pkg.calculator import Calculator
 
 
@@ -54,6 +58,118 @@ class TestCalculator(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.calculator.evaluate("+ 3")
 
+    def test_no_spaces(self):
+        """Test expressions written without spaces."""
+        self.assertEqual(self.calculator.evaluate("3+5*2"), 13)
+
+    def test_parentheses(self):
+        """Test parenthesized sub-expressions."""
+        self.assertEqual(self.calculator.evaluate("(1 + 2) * 3"), 9)
+        self.assertEqual(self.calculator.evaluate("2 * (3 + (4 - 1)) / 3"), 4)
+
+    def test_unary_minus(self):
+        """Test unary minus, including before parentheses and exponents."""
+        self.assertEqual(self.calculator.evaluate("-3 + 5"), 2)
+        self.assertEqual(self.calculator.evaluate("4 * -(2 + 1)"), -12)
+        self.assertEqual(self.calculator.evaluate("-2 ^ 2"), -4)
+
+    def test_exponent(self):
+        """Test exponentiation, which is right-associative."""
+        self.assertEqual(self.calculator.evaluate("2 ^ 3 ^ 2"), 512)
+        self.assertEqual(self.calculator.evaluate("2 ** -1"), 0.5)
+
+    def test_mismatched_parentheses(self):
+        """Test expressions with unbalanced parentheses."""
+        with self.assertRaises(ValueError):
+            self.calculator.evaluate("(1 + 2")
+        with self.assertRaises(ValueError):
+            self.calculator.evaluate("1 + 2)")
+
+    def test_deeply_nested_expression(self):
+        """Test that deep nesting does not hit recursion limits."""
+        depth = 100000
+        expression = "(" * depth + "1 + x" + ")" * depth
+        self.assertEqual(self.calculator.evaluate(expression, {"x": 2}), 3)
+
+
+class TestCompiledEvaluation(unittest.TestCase):
+    """Test suite for compiled expressions and column evaluation."""
+
+    def setUp(self):
+        """Set up a Calculator instance before each test."""
+        self.calculator = Calculator()
+
+    def test_variables(self):
+        """Test evaluation with named variables."""
+        result = self.calculator.evaluate("x * 2 + y", {"x": 3, "y": 1})
+        self.assertEqual(result, 7)
+
+    def test_unknown_variable(self):
+        """Test evaluation with an unbound variable."""
+        with self.assertRaises(ValueError):
+            self.calculator.evaluate("x + 1")
+
+    def test_compile_once(self):
+        """Test that a compiled expression can be reused."""
+        compiled = self.calculator.compile("price * qty - discount")
+        self.assertEqual(compiled.variables, ("price", "qty", "discount"))
+        result = self.calculator.evaluate_columns(
+            compiled, {"price": [2.0, 3.0], "qty": [5, 10], "discount": [1, 0]}
+        )
+        self.assertEqual(list(result), [9.0, 30.0])
+
+    def test_evaluate_columns_matches_scalar(self):
+        """Test that column evaluation agrees with scalar evaluation."""
+        expression = "a + b * 2 - a / b"
+        a = [float(i) for i in range(1, 50)]
+        b = [float(i % 7 + 1) for i in range(1, 50)]
+        result = self.calculator.evaluate_columns(expression, {"a": a, "b": b})
+        expected = [self.calculator.evaluate(expression, {"a": x, "b": y}) for x, y in zip(a, b)]
+        self.assertEqual(list(result), expected)
+
+    def test_evaluate_many_rows(self):
+        """Test row-oriented batch evaluation, including constant expressions."""
+        rows = [{"x": 1}, {"x": 2}, {"x": 3}]
+        self.assertEqual(list(self.calculator.evaluate_many("x * x", rows)), [1.0, 4.0, 9.0])
+        self.assertEqual(list(self.calculator.evaluate_many("2 + 3", rows)), [5.0, 5.0, 5.0])
+
+    def test_compile_cache(self):
+        """Test that repeated expressions reuse the compiled program."""
+        first = self.calculator.compile("x * 2 + 1")
+        self.assertIs(self.calculator.compile("x * 2 + 1"), first)
+
+    def test_constant_folding(self):
+        """Test that constant sub-expressions are folded at compile time."""
+        compiled = self.calculator.compile("x + 2 * (3 + 4)")
+        self.assertEqual(compiled.program, (("var", "x"), ("num", 14.0), ("op", "+")))
+
+    def test_long_expression(self):
+        """Test evaluation of an expression with a very large number of tokens."""
+        terms = 200000
+        expression = " + ".join(["x"] * terms)
+        self.assertEqual(self.calculator.evaluate(expression, {"x": 1}), terms)
+
+    def test_mismatched_columns(self):
+        """Test columns of different lengths."""
+        with self.assertRaises(ValueError):
+            self.calculator.evaluate_columns("a + b", {"a": [1, 2], "b": [1]})
+
+    def test_columns_without_numpy_follow_ieee(self):
+        """Test that the pure-Python column path gives inf/nan per row, like NumPy."""
+        columns = {"a": [1, -1, 0, -8, 0, 10, 6], "b": [0, 0, 0, 0.5, -1, 400, 3]}
+        expected = {
+            "a / b": [math.inf, -math.inf, math.nan, -16.0, -0.0, 0.025, 2.0],
+            "a ^ b": [1.0, 1.0, 1.0, math.nan, math.inf, math.inf, 216.0],
+        }
+        with mock.patch.object(pkg.calculator, "np", None):
+            results = {expression: list(self.calculator.evaluate_columns(expression, columns))
+                       for expression in expected}
+        for expression, values in expected.items():
+            self.assertEqual([repr(value) for value in results[expression]], [repr(value) for value in values])
+            if pkg.calculator.np is not None:
+                numpy_values = [float(value) for value in self.calculator.evaluate_columns(expression, columns)]
+                self.assertEqual([repr(value) for value in numpy_values], [repr(value) for value in values])
+
 
 if __name__ == "__main__":
     unittest.main()
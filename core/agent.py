@@ -0,0 +1,357 @@
+"""Agent core shared by main.py and interactive_cli.py.
+
+Holds the system prompt (plus a map of the project, see core/repo_map.py),
+the tool dispatch table and the model/tool loop (blocking and streaming).
+The front ends only handle input and display.
+
+Nothing heavy is imported at module level: ``google.genai`` alone takes
+most of a second to import, so the tool registry, the request config and
+the model backend are all built on first use. ``preload`` does that work on
+a background thread so an interactive session is warm by the time the first
+prompt has been typed.
+"""
+import json
+import os
+import threading
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAX_ITERATIONS = 20
+
+SYSTEM_PROMPT = """
+You are a highly intelligent AI coding agent with access to a Python codebase.
+
+CORE PRINCIPLE: ALWAYS BE PROACTIVE. NEVER ask the user for file paths - YOU can find them!
+
+When a user mentions a file without providing the full path, you MUST:
+1. **AUTOMATICALLY** use find_files to locate the file (search by exact name first, then by pattern if needed)
+2. Use the discovered path in subsequent operations
+3. If multiple matches exist, use the most relevant one based on context
+4. Only ask for clarification if there are genuinely ambiguous cases
+
+Available operations:
+- get_files_info: List files and directories as a compact tree (recursive=True or max_depth to see a whole subtree in one call)
+- find_files: Search for files by exact name or pattern; patterns can be globs ("*_test.py"), path segments ("pkg/render") or approximate names (USE THIS PROACTIVELY!)
+- search_code: Search file contents for text or a regex (returns path:line: text hits)
+- get_file_content: Read file contents
+- run_python_file: Execute Python files with optional arguments
+- run_tests: Discover and run the test suite in parallel, returning one aggregated report
+- write_file: Write new files or fully rewrite small ones
+- edit_file: Change part of an existing file with search/replace or line-range hunks (much cheaper than write_file)
+
+SMART FILE HANDLING EXAMPLES:
+- User says "read readme.md" → IMMEDIATELY call find_files(filename="README.md") or find_files(pattern="readme"), then read the found file
+- User says "add docstrings to my config file" → find_files(pattern="config"), examine results, read the file, make changes
+- User says "run the tests" → run_tests() (or run_tests(path="calculator") to narrow it down)
+- User says "modify calculator.py" → find_files(filename="calculator.py"), find it, read it, make changes with edit_file
+- User says "where is format_json_output used?" → search_code(query="format_json_output"), then read only the relevant lines
+
+CRITICAL RULES:
+1. NEVER say "I need the path" - YOU find it using find_files!
+2. File names are case-insensitive - search flexibly (readme.md, README.md, Readme.MD are all the same)
+3. Always search before claiming a file doesn't exist
+4. Be smart about common variations (.py, .txt, .md extensions, etc.)
+5. Think like a developer - understand project structure and conventions
+
+Your goal is to be so intelligent that users feel like they're working with a mind-reading assistant, not a rigid script.
+"""
+
+_tools = None
+_config = None
+_config_map = None
+_lazy_lock = threading.Lock()
+
+
+class AgentError(Exception):
+    """A model or tool failure that ended the loop at ``iteration`` (1-based)."""
+
+    def __init__(self, iteration, cause):
+        super().__init__(str(cause))
+        self.iteration = iteration
+        self.__cause__ = cause
+
+
+def get_tools():
+    """Return the tool dispatch table, importing the tool modules on first use."""
+    global _tools
+    if _tools is None:
+        with _lazy_lock:
+            if _tools is None:
+                from functions.edit_file import edit_file
+                from functions.find_files import find_files
+                from functions.get_file_content import get_file_content
+                from functions.get_files_info import get_files_info
+                from functions.run_python_file import run_python_file
+                from functions.run_tests import run_tests
+                from functions.search_code import search_code
+                from functions.write_file import write_file
+
+                _tools = {
+                    "get_file_content": get_file_content,
+                    "get_files_info": get_files_info,
+                    "run_python_file": run_python_file,
+                    "run_tests": run_tests,
+                    "write_file": write_file,
+                    "edit_file": edit_file,
+                    "find_files": find_files,
+                    "search_code": search_code,
+                }
+    return _tools
+
+
+def get_config():
+    """Return the ``GenerateContentConfig`` (tools + system prompt + project map).
+
+    The config is rebuilt only when the project map changes, so between code
+    changes every request carries the same system instruction.
+    """
+    global _config, _config_map
+    project_map = project_map_text()
+    if _config is None or project_map != _config_map:
+        with _lazy_lock:
+            if _config is None or project_map != _config_map:
+                from google.genai import types
+
+                from functions.get_files_info import available_functions
+
+                instruction = SYSTEM_PROMPT + (f"\n{project_map}\n" if project_map else "")
+                _config = types.GenerateContentConfig(
+                    tools=[available_functions], system_instruction=instruction
+                )
+                _config_map = project_map
+    return _config
+
+
+def project_map_text():
+    """The project map for the system instruction ("" when disabled or unavailable)."""
+    from core.repo_map import REPO_MAP_CHARS, RepoMap
+
+    if REPO_MAP_CHARS <= 0:
+        return ""
+    try:
+        repo_map = RepoMap.for_root(PROJECT_ROOT)
+        repo_map.refresh()
+        return repo_map.render()
+    except Exception:
+        return ""  # the map only saves exploration; the agent works without it
+
+
+def preload():
+    """Import the model client and tools on a daemon thread."""
+
+    def load():
+        try:
+            get_tools()
+            get_config()
+            from core.backends import get_backend
+
+            get_backend()
+        except Exception:
+            pass  # the real call reports the problem
+
+    threading.Thread(target=load, name="agent-preload", daemon=True).start()
+
+
+def user_message(text):
+    from google.genai import types
+
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+
+def execute_tool(function_call_part):
+    """Run one function call through the prefetcher and the tool cache.
+
+    Returns ``(content, cache_hit)`` where ``content`` is the ``types.Content``
+    holding the function response, ready to append to the conversation.
+    ``cache_hit`` is also true for a result served from a prefetch.
+    """
+    from google.genai import types
+
+    from core.cache import TOOL_CACHE
+    from core.prefetch import PREFETCHER
+    from core.tracing import TRACER
+    from functions.results import render_response
+
+    function_name = function_call_part.name
+    function = get_tools().get(function_name)
+    if function is None:
+        return types.Content(
+            role="tool",
+            parts=[
+                types.Part.from_function_response(
+                    name=function_name,
+                    response={"error": f"Unknown function: {function_name}"},
+                )
+            ],
+        ), False
+
+    # Tools always run against the project root
+    args_dict = dict(function_call_part.args)
+    args_dict["working_directory"] = PROJECT_ROOT
+
+    args_chars = len(json.dumps(function_call_part.args or {}, default=str))
+    with TRACER.span("tool", function_name, args_chars=args_chars) as span:
+        prefetched = False
+        if PREFETCHER.enabled:
+            prefetched, function_result, saved = PREFETCHER.take(function_name, args_dict)
+            if prefetched:
+                span.update(prefetch_hit=True, prefetch_saved=saved)
+        cache_hit = prefetched
+        if not prefetched:
+            function_result, cache_hit = TOOL_CACHE.call(function_name, args_dict, function)
+        response = render_response(function_result)
+        span.update(result_chars=len(str(response["result"])), cache_hit=cache_hit)
+    if PREFETCHER.enabled:
+        # Runs the likely next read while the next model call is in flight
+        PREFETCHER.observe(function_name, args_dict, function_result, get_tools())
+
+    return types.Content(
+        role="tool",
+        parts=[
+            types.Part.from_function_response(
+                name=function_name,
+                response=response,
+            )
+        ],
+    ), cache_hit
+
+
+def run_loop(messages, model, call, backend=None, on_outcomes=None):
+    """Alternate model calls and tool calls until the model answers in text.
+
+    ``messages`` is extended in place. ``call(function_call)`` runs one tool
+    and returns its ``types.Content``; calls from one turn run concurrently.
+    ``on_outcomes(outcomes, wall_time)`` is called after each batch. Returns
+    the final text, or None if ``MAX_ITERATIONS`` was reached. Raises
+    ``AgentError`` if a model or tool call fails.
+    """
+    from core.backends import get_backend
+    from core.executor import run_function_calls
+    from core.tracing import TRACER, usage_attributes
+
+    if backend is None:
+        backend = get_backend()
+    config = get_config()
+
+    for iteration in range(MAX_ITERATIONS):
+        try:
+            with TRACER.span("model", "generate_content", iteration=iteration + 1) as span:
+                response = backend.generate_content(model, messages, config)
+                span.update(usage_attributes(response.usage_metadata))
+
+            # Add all candidates' content to messages
+            for candidate in response.candidates:
+                if candidate.content:
+                    messages.append(candidate.content)
+
+            function_call_parts = []
+            has_text = False
+            for candidate in response.candidates:
+                if not candidate.content or not candidate.content.parts:
+                    continue
+                for part in candidate.content.parts:
+                    if part.function_call:
+                        function_call_parts.append(part.function_call)
+                    if part.text:
+                        has_text = True
+
+            # Run this turn's function calls concurrently; results come back in call order
+            start = time.perf_counter()
+            outcomes = run_function_calls(function_call_parts, call)
+            wall_time = time.perf_counter() - start
+
+            for outcome in outcomes:
+                if outcome.error is not None:
+                    raise outcome.error
+            if on_outcomes and outcomes:
+                on_outcomes(outcomes, wall_time)
+            messages.extend(outcome.result for outcome in outcomes)
+
+            # If no function calls and has text, we're done
+            if not function_call_parts and has_text:
+                return response.text
+        except Exception as e:
+            raise AgentError(iteration + 1, e) from e
+    return None
+
+
+def _add_streamed_part(model_parts, part):
+    """Append a streamed part to the model turn being assembled.
+
+    Parts are kept as streamed, so fields besides the text (thought flags,
+    signatures, metadata) go back to the model unchanged; only runs of plain
+    text chunks are joined into one part.
+    """
+    from google.genai import types
+
+    fields = part.model_dump(exclude_none=True)
+    if not fields:
+        return
+    last = model_parts[-1] if model_parts else None
+    if fields.keys() == {"text"} and last is not None and last.model_dump(exclude_none=True).keys() == {"text"}:
+        model_parts[-1] = types.Part(text=last.text + part.text)
+    else:
+        model_parts.append(part)
+
+
+async def run_loop_async(messages, model, call, backend=None, on_text=None, on_outcomes=None):
+    """Streaming, asyncio version of ``run_loop``.
+
+    Text is passed to ``on_text(text_so_far)`` as it arrives, and each
+    function call is dispatched as soon as its part has streamed in.
+    """
+    import asyncio
+
+    from google.genai import types
+
+    from core.backends import get_backend
+    from core.executor import CallDispatcher
+    from core.tracing import TRACER, usage_attributes
+
+    if backend is None:
+        backend = get_backend()
+    config = get_config()
+
+    for iteration in range(MAX_ITERATIONS):
+        try:
+            stream = backend.generate_content_stream(model, messages, config)
+
+            text = ""
+            model_parts = []
+            pending = []
+            start = time.perf_counter()
+            with CallDispatcher(call) as dispatcher:
+                with TRACER.span("model", "generate_content_stream", iteration=iteration + 1) as span:
+                    async for chunk in stream:
+                        if chunk.usage_metadata:
+                            span.update(usage_attributes(chunk.usage_metadata))
+                        if not chunk.candidates or not chunk.candidates[0].content:
+                            continue
+                        for part in chunk.candidates[0].content.parts or []:
+                            _add_streamed_part(model_parts, part)
+                            if part.function_call:
+                                # Start the tool while the rest of the response streams in
+                                pending.append(asyncio.wrap_future(dispatcher.submit(part.function_call)))
+                            elif part.text:
+                                text += part.text
+                                if on_text:
+                                    on_text(text)
+
+                if model_parts:
+                    messages.append(types.Content(role="model", parts=model_parts))
+
+                outcomes = await asyncio.gather(*pending)
+            wall_time = time.perf_counter() - start
+
+            for outcome in outcomes:
+                if outcome.error is not None:
+                    raise outcome.error
+            if on_outcomes and outcomes:
+                on_outcomes(outcomes, wall_time)
+            messages.extend(outcome.result for outcome in outcomes)
+
+            if not outcomes and text:
+                return text
+        except Exception as e:
+            raise AgentError(iteration + 1, e) from e
+    return None
@@ -0,0 +1,367 @@
+"""Pluggable model backends for the agent loops.
+
+The loops only need ``generate_content`` (and, for the interactive CLI,
+``generate_content_stream``). Backends:
+
+- ``GeminiBackend``: the live API through a ``genai.Client``
+- ``RecordingBackend``: wraps another backend and appends every request and
+  response to a JSON Lines file
+- ``ReplayBackend``: serves a recording back in order, deterministically,
+  with optional injected latency, so loops can be run and profiled offline
+- ``ResilientBackend``: wraps another backend with a per-call deadline,
+  retries with backoff (see core/retry.py) and a shared rate limiter
+- ``CachingBackend``: sends the stable prompt prefix as a cached-content
+  handle (see core/prompt_cache.py), falling back to full requests
+
+``get_backend`` picks one from the environment: ``AGENT_REPLAY=<file>``
+replays (``AGENT_REPLAY_LATENCY`` seconds per call), otherwise the live API
+is used through ``ResilientBackend`` and ``CachingBackend`` (unless
+``AGENT_PROMPT_CACHE=0``), recorded to ``AGENT_RECORD=<file>``
+when that is set. ``AGENT_API_BASE_URL`` points the client at another
+server, such as benchmarks/fake_server.py.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+
+from google.genai import types
+
+MODEL_TIMEOUT = float(os.environ.get("AGENT_MODEL_TIMEOUT", "120"))
+HTTP_POOL_SIZE = int(os.environ.get("AGENT_HTTP_POOL_SIZE", "16"))
+
+
+def _dump(model):
+    return model.model_dump(mode="json", exclude_none=True)
+
+
+def merge_chunks(chunks):
+    """Combine streamed chunks into one ``GenerateContentResponse``."""
+    text = ""
+    parts = []
+    usage = None
+    for chunk in chunks:
+        if chunk.usage_metadata:
+            usage = chunk.usage_metadata
+        if not chunk.candidates or not chunk.candidates[0].content:
+            continue
+        for part in chunk.candidates[0].content.parts or []:
+            if part.text:
+                text += part.text
+            else:
+                parts.append(part)
+    if text:
+        parts.insert(0, types.Part(text=text))
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=parts))],
+        usage_metadata=usage,
+    )
+
+
+class GeminiBackend:
+    """The live Gemini API."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def generate_content(self, model, contents, config):
+        return self.client.models.generate_content(model=model, contents=contents, config=config)
+
+    async def generate_content_stream(self, model, contents, config):
+        stream = await self.client.aio.models.generate_content_stream(
+            model=model, contents=contents, config=config
+        )
+        async for chunk in stream:
+            yield chunk
+
+    def create_cache(self, model, contents, config, ttl):
+        """Cache ``contents`` plus the config's system prompt and tools; returns (name, expires_at, tokens)."""
+        cache = self.client.caches.create(model=model, config=types.CreateCachedContentConfig(
+            contents=list(contents) or None,
+            system_instruction=config.system_instruction,
+            tools=config.tools,
+            tool_config=config.tool_config,
+            ttl=f"{ttl}s",
+        ))
+        tokens = cache.usage_metadata.total_token_count if cache.usage_metadata else None
+        return cache.name, _expiry(cache, ttl), tokens
+
+    def refresh_cache(self, name, ttl):
+        cache = self.client.caches.update(name=name, config=types.UpdateCachedContentConfig(ttl=f"{ttl}s"))
+        return _expiry(cache, ttl)
+
+    def delete_cache(self, name):
+        self.client.caches.delete(name=name)
+
+
+def _expiry(cache, ttl):
+    return cache.expire_time.timestamp() if cache.expire_time else time.time() + ttl
+
+
+class RecordingBackend:
+    """Forward calls to ``inner`` and append each exchange to ``path``."""
+
+    def __init__(self, inner, path):
+        self.inner = inner
+        self.path = path
+        self._lock = threading.Lock()
+
+    def generate_content(self, model, contents, config):
+        response = self.inner.generate_content(model, contents, config)
+        self._write(model, contents, {"response": _dump(response)})
+        return response
+
+    async def generate_content_stream(self, model, contents, config):
+        chunks = []
+        async for chunk in self.inner.generate_content_stream(model, contents, config):
+            chunks.append(chunk)
+            yield chunk
+        self._write(model, contents, {"chunks": [_dump(chunk) for chunk in chunks]})
+
+    def _write(self, model, contents, payload):
+        record = {"model": model, "contents": [_dump(content) for content in contents]}
+        record.update(payload)
+        line = json.dumps(record)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class ReplayBackend:
+    """Serve recorded responses back in order.
+
+    Each call consumes the next record, regardless of the request, so a
+    replay is deterministic as long as the loop makes the same calls.
+    ``latency`` seconds are slept per call to emulate the live API.
+    """
+
+    def __init__(self, path=None, latency=0.0, records=None):
+        if records is None:
+            with open(path, "r", encoding="utf-8") as f:
+                records = [json.loads(line) for line in f if line.strip()]
+        self.records = records
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+
+    def generate_content(self, model, contents, config):
+        record = self._next()
+        if self.latency:
+            time.sleep(self.latency)
+        if "chunks" in record:
+            return merge_chunks(self._chunks(record))
+        return types.GenerateContentResponse.model_validate(record["response"])
+
+    async def generate_content_stream(self, model, contents, config):
+        record = self._next()
+        if "chunks" in record:
+            chunks = self._chunks(record)
+        else:
+            chunks = [types.GenerateContentResponse.model_validate(record["response"])]
+        delay = self.latency / len(chunks) if self.latency and chunks else 0
+        for chunk in chunks:
+            if delay:
+                await asyncio.sleep(delay)
+            yield chunk
+
+    def _next(self):
+        with self._lock:
+            if self.calls >= len(self.records):
+                raise RuntimeError(f"Replay exhausted after {self.calls} model call(s)")
+            record = self.records[self.calls]
+            self.calls += 1
+            return record
+
+    @staticmethod
+    def _chunks(record):
+        return [types.GenerateContentResponse.model_validate(chunk) for chunk in record["chunks"]]
+
+
+class ResilientBackend:
+    """Retry transient failures of ``inner`` within a per-call deadline.
+
+    Every attempt first takes a token from ``limiter``, which is shared by
+    all sessions using this backend. A streamed call is only retried if it
+    failed before its first chunk; chunks already handed to the loop cannot
+    be taken back.
+    """
+
+    def __init__(self, inner, policy=None, limiter=None, timeout=MODEL_TIMEOUT):
+        from core.retry import RetryPolicy, TokenBucket
+
+        self.inner = inner
+        self.policy = policy or RetryPolicy()
+        self.limiter = limiter or TokenBucket()
+        self.timeout = timeout
+
+    def generate_content(self, model, contents, config):
+        deadline = time.monotonic() + self.timeout
+        attempt = 0
+        while True:
+            time.sleep(self._admit(deadline))
+            try:
+                return self.inner.generate_content(model, contents, self._attempt_config(config, deadline))
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+            attempt += 1
+            time.sleep(delay)
+
+    async def generate_content_stream(self, model, contents, config):
+        deadline = time.monotonic() + self.timeout
+        attempt = 0
+        while True:
+            await asyncio.sleep(self._admit(deadline))
+            stream = self.inner.generate_content_stream(model, contents, self._attempt_config(config, deadline))
+            started = False
+            try:
+                while True:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        chunk = await asyncio.wait_for(anext(stream), max(remaining, 0.001))
+                    except StopAsyncIteration:
+                        return
+                    except TimeoutError:
+                        raise TimeoutError(f"Model call exceeded its {self.timeout:g}s deadline") from None
+                    started = True
+                    yield chunk
+            except Exception as e:
+                delay = None if started else self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+            finally:
+                await stream.aclose()
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _admit(self, deadline):
+        """Reserve a rate-limiter token; return how long to wait for it."""
+        wait = self.limiter.reserve()
+        if time.monotonic() + wait >= deadline:
+            raise TimeoutError(f"Rate limit wait of {wait:.1f}s exceeds the model call deadline")
+        return wait
+
+    def _attempt_config(self, config, deadline):
+        # The HTTP timeout of each attempt is whatever is left of the deadline
+        if not isinstance(config, types.GenerateContentConfig):
+            return config
+        remaining_ms = max(1, int((deadline - time.monotonic()) * 1000))
+        return config.model_copy(update={"http_options": types.HttpOptions(timeout=remaining_ms)})
+
+    def _retry_delay(self, error, attempt, deadline):
+        from core.retry import status_code
+        from core.tracing import TRACER
+
+        delay = self.policy.delay(error, attempt)
+        if delay is None or time.monotonic() + delay >= deadline:
+            return None
+        if status_code(error) == 429:
+            self.limiter.pause(delay)
+        TRACER.event("retry", "model", attempt=attempt + 1, delay=round(delay, 3),
+                     error=status_code(error) or type(error).__name__)
+        return delay
+
+
+class CachingBackend:
+    """Send requests through ``cache`` (a ``PromptCache``) before ``inner``.
+
+    If the server rejects a cached-content handle (expired or deleted), the
+    handle is dropped and the request is sent again in full.
+    """
+
+    def __init__(self, inner, cache):
+        self.inner = inner
+        self.cache = cache
+
+    def generate_content(self, model, contents, config):
+        request_contents, request_config, handle = self.cache.prepare(model, contents, config)
+        if handle is None:
+            return self.inner.generate_content(model, contents, config)
+        try:
+            return self.inner.generate_content(model, request_contents, request_config)
+        except Exception as e:
+            if not _cache_rejected(e):
+                raise
+            self.cache.discard(handle)
+            return self.inner.generate_content(model, contents, config)
+
+    async def generate_content_stream(self, model, contents, config):
+        # Creating or refreshing a handle is a blocking API call
+        request_contents, request_config, handle = await asyncio.to_thread(
+            self.cache.prepare, model, contents, config
+        )
+        if handle is not None:
+            started = False
+            try:
+                async for chunk in self.inner.generate_content_stream(model, request_contents, request_config):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started or not _cache_rejected(e):
+                    raise
+                self.cache.discard(handle)
+        async for chunk in self.inner.generate_content_stream(model, contents, config):
+            yield chunk
+
+
+def _cache_rejected(error):
+    from core.retry import status_code
+
+    return status_code(error) in (400, 403, 404)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the process-wide backend selected by the environment."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = _create_backend()
+        return _backend
+
+
+def set_backend(backend):
+    """Install ``backend`` for every later ``get_backend`` call (used by harnesses)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def _create_backend():
+    replay_path = os.environ.get("AGENT_REPLAY")
+    if replay_path:
+        return ReplayBackend(replay_path, latency=float(os.environ.get("AGENT_REPLAY_LATENCY", "0")))
+
+    import httpx
+    from google import genai
+
+    from core.prompt_cache import PROMPT_CACHE, PromptCache
+
+    # One client per process: its httpx pools keep connections alive across
+    # calls and are shared by every session (including concurrent batch tasks).
+    limits = httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE)
+    http_options = types.HttpOptions(
+        base_url=os.environ.get("AGENT_API_BASE_URL"),
+        timeout=int(MODEL_TIMEOUT * 1000),
+        client_args={"limits": limits},
+        async_client_args={"limits": limits},
+    )
+    client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"), http_options=http_options)
+    gemini = GeminiBackend(client)
+    backend = ResilientBackend(gemini)
+    if PROMPT_CACHE:
+        backend = CachingBackend(backend, PromptCache(gemini))
+    record_path = os.environ.get("AGENT_RECORD")
+    if record_path:
+        backend = RecordingBackend(backend, record_path)
+    return backend
@@ -0,0 +1,186 @@
+"""Headless batch mode: run many prompts concurrently in one process.
+
+Tasks come from a JSON Lines file (or stdin), one per line: an object with
+a ``prompt`` and an optional ``id`` (the line number otherwise), or a bare
+JSON string. All tasks run on one event loop, so they share the model
+backend and its connection pool, the tool cache and the file index;
+``concurrency`` bounds how many are in flight at once. Tasks also share the
+working tree, so a batch should not contain tasks that edit the same files.
+
+Each task is appended to the output as one JSON line as soon as it finishes,
+with its status (``ok``, ``max_iterations`` or ``error``), final text, token
+usage and tool spans. Re-running with the same output file skips the tasks
+already recorded there as finished (failed ones run again), so an
+interrupted batch resumes where it stopped.
+"""
+import asyncio
+import json
+import os
+import sys
+from dataclasses import asdict
+
+BATCH_CONCURRENCY = int(os.environ.get("AGENT_BATCH_CONCURRENCY", "4"))
+DEFAULT_MODEL = "gemini-3-pro"
+FINISHED_STATUSES = frozenset(["ok", "max_iterations"])
+
+
+def read_tasks(stream):
+    """Parse task lines into ``[(task_id, prompt)]``; raises ValueError on a bad line."""
+    tasks = []
+    seen = set()
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"line {number}: invalid JSON ({e})")
+        if isinstance(record, str):
+            record = {"prompt": record}
+        if not isinstance(record, dict) or not isinstance(record.get("prompt"), str) or not record["prompt"]:
+            raise ValueError(f'line {number}: expected an object with a "prompt" string')
+        task_id = str(record.get("id", number))
+        if task_id in seen:
+            raise ValueError(f'line {number}: duplicate task id "{task_id}"')
+        seen.add(task_id)
+        tasks.append((task_id, record["prompt"]))
+    return tasks
+
+
+def finished_ids(path):
+    """Return the ids of tasks recorded as finished in an existing output file."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by an interrupted run
+            if isinstance(record, dict) and record.get("status") in FINISHED_STATUSES:
+                done.add(str(record.get("id")))
+    return done
+
+
+async def run_task(task_id, prompt, model=DEFAULT_MODEL, backend=None):
+    """Run one prompt to completion and return its output record."""
+    from core.agent import AgentError, execute_tool, run_loop_async, user_message
+    from core.tracing import TRACER
+
+    # Bound to this task, so concurrent tasks keep separate spans and totals
+    TRACER.start_query(prompt, isolated=True)
+    record = {"id": task_id, "prompt": prompt}
+    try:
+        text = await run_loop_async(
+            [user_message(prompt)], model, lambda part: execute_tool(part)[0], backend=backend
+        )
+        record["status"] = "ok" if text is not None else "max_iterations"
+        record["text"] = text
+    except AgentError as e:
+        record["status"] = "error"
+        record["error"] = f"iteration {e.iteration}: {e}"
+    except Exception as e:
+        # A crash in one task (a tool, the tracer, the backend) must not take the batch down
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+    trace = TRACER.finish_query()
+
+    record["wall_time"] = round(trace.wall_time, 3)
+    record["usage"] = asdict(trace.totals)
+    record["spans"] = [
+        {"kind": span.kind, "name": span.name, "start": round(span.start, 4),
+         "duration": round(span.duration, 4), **span.attributes}
+        for span in trace.spans
+    ]
+    return record
+
+
+async def run_tasks(tasks, output, concurrency=BATCH_CONCURRENCY, model=DEFAULT_MODEL,
+                    backend=None, on_record=None):
+    """Run ``tasks`` with at most ``concurrency`` in flight, writing each record to ``output``.
+
+    Returns a ``{status: count}`` dict.
+    """
+    from core.backends import get_backend
+
+    if backend is None:
+        backend = get_backend()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    counts = dict.fromkeys(["ok", "max_iterations", "error"], 0)
+
+    async def run_one(task_id, prompt):
+        async with semaphore:
+            record = await run_task(task_id, prompt, model, backend)
+        # One write per record, flushed, so an interrupt loses at most the tasks in flight
+        output.write(json.dumps(record, default=str) + "\n")
+        output.flush()
+        counts[record["status"]] += 1
+        if on_record:
+            on_record(record)
+
+    await asyncio.gather(*(run_one(task_id, prompt) for task_id, prompt in tasks))
+    return counts
+
+
+def run_batch(input_path, output_path=None, concurrency=BATCH_CONCURRENCY, model=DEFAULT_MODEL):
+    """Run a batch from ``input_path`` ("-" for stdin); returns a process exit code.
+
+    Records go to ``output_path`` (stdout when None or "-"). Progress and the
+    final summary are printed to stderr.
+    """
+    try:
+        if input_path == "-":
+            tasks = read_tasks(sys.stdin)
+        else:
+            with open(input_path, "r", encoding="utf-8") as f:
+                tasks = read_tasks(f)
+    except (OSError, ValueError) as e:
+        print(f"Error: cannot read batch {input_path}: {e}", file=sys.stderr)
+        return 2
+
+    to_stdout = output_path in (None, "-")
+    skipped = 0
+    if not to_stdout:
+        done = finished_ids(output_path)
+        skipped = sum(1 for task_id, _ in tasks if task_id in done)
+        tasks = [(task_id, prompt) for task_id, prompt in tasks if task_id not in done]
+    total = len(tasks)
+    if skipped:
+        print(f"Resuming: {skipped} task(s) already finished in {output_path}", file=sys.stderr)
+
+    finished = 0
+
+    def progress(record):
+        nonlocal finished
+        finished += 1
+        usage = record["usage"]
+        print(f"[{finished}/{total}] {record['id']}: {record['status']} in {record['wall_time']:.1f}s "
+              f"({usage['prompt_tokens']} + {usage['response_tokens']} tokens)", file=sys.stderr)
+
+    output = sys.stdout if to_stdout else open(output_path, "a", encoding="utf-8")
+    try:
+        if not to_stdout and output.tell() > 0:
+            _terminate_last_line(output_path, output)
+        counts = asyncio.run(run_tasks(tasks, output, concurrency, model, on_record=progress))
+    except KeyboardInterrupt:
+        print(f"\nInterrupted after {finished}/{total} task(s)."
+              + ("" if to_stdout else " Run again with the same output file to resume."),
+              file=sys.stderr)
+        return 130
+    finally:
+        if not to_stdout:
+            output.close()
+
+    print(f"Batch finished: {counts['ok']} ok, {counts['max_iterations']} hit max iterations, "
+          f"{counts['error']} failed" + (f", {skipped} skipped" if skipped else ""), file=sys.stderr)
+    return 1 if counts["error"] else 0
+
+
+def _terminate_last_line(path, output):
+    """Finish a partial last line left by an interrupt so new records start cleanly."""
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            output.write("\n")
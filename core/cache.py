@@ -0,0 +1,124 @@
+"""Result cache for the read-only tools.
+
+``get_file_content``, ``get_files_info`` and ``find_files`` only depend on
+the filesystem, so repeated calls with the same arguments can be answered
+from memory. Entries are keyed on the tool name, its normalized arguments
+and a fingerprint of the filesystem state the result depends on:
+
+- ``get_file_content``: the path the tool resolves ``file_path`` to (a bare
+  name is looked up in the FileIndex) and that file's mtime and size, or
+  the FileIndex generation while no file matches
+- ``get_files_info``: mtime of the directory, plus the FileIndex generation
+  for listings that descend into subdirectories
+- ``find_files``: generation counter of the project's FileIndex
+
+Because a directory's mtime does not change when a file inside it is
+rewritten, any call to a tool in ``INVALIDATING_TOOLS`` clears the cache.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from functions.file_index import FileIndex
+from functions.results import resolve_path
+
+CACHEABLE_TOOLS = frozenset(["get_file_content", "get_files_info", "find_files"])
+INVALIDATING_TOOLS = frozenset(["write_file", "edit_file", "run_python_file", "run_tests"])
+
+MAX_CACHE_ENTRIES = 256
+MAX_CACHE_BYTES = 8 * 1024 * 1024
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class ToolResultCache:
+    """Thread-safe LRU cache of tool results, bounded by count and size."""
+
+    def __init__(self, max_entries=MAX_CACHE_ENTRIES, max_bytes=MAX_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def call(self, name, args, function):
+        """Return ``(result, hit)`` for ``function(**args)``, using the cache when possible."""
+        if name in INVALIDATING_TOOLS:
+            try:
+                return function(**args), False
+            finally:
+                self.invalidate()
+        if name not in CACHEABLE_TOOLS:
+            return function(**args), False
+
+        key = self._key(name, args)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key], True
+            self.misses += 1
+
+        result = function(**args)
+        self._store(key, result)
+        return result, False
+
+    def invalidate(self):
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        return f"{self.hits} hits, {self.misses} misses, {self.invalidations} invalidations"
+
+    def _store(self, key, result):
+        size = len(str(result))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = result
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(str(evicted))
+
+    @staticmethod
+    def _key(name, args):
+        root = os.path.abspath(args.get("working_directory", "."))
+        if name == "get_file_content":
+            resolution = resolve_path(root, args.get("file_path", ""))
+            if resolution.found:
+                fingerprint = (resolution.path, _stat_key(resolution.full_path))
+            else:
+                # Until a matching file appears; resolve_path refreshed the index
+                fingerprint = FileIndex.for_root(root).generation
+        elif name == "get_files_info":
+            fingerprint = _stat_key(os.path.join(root, args.get("directory", ".")))
+            if args.get("recursive") or (args.get("max_depth") or 1) > 1:
+                # Changes below the top directory do not touch its mtime
+                index = FileIndex.for_root(root)
+                index.refresh()
+                fingerprint = (fingerprint, index.generation)
+        else:
+            index = FileIndex.for_root(root)
+            index.refresh()
+            fingerprint = index.generation
+        normalized = json.dumps(args, sort_keys=True, default=str)
+        return (name, normalized, fingerprint)
+
+
+TOOL_CACHE = ToolResultCache()
@@ -0,0 +1,146 @@
+"""Concurrent execution of the function calls returned in one model turn.
+
+Independent calls run on a bounded thread pool (the tools are I/O bound or
+spawn subprocesses, so threads are enough). Calls that conflict with an
+earlier call in the same turn wait for it to finish first, so a
+``write_file`` followed by a read of the same file behaves exactly as it
+would sequentially. Script and test runs may change any file, so they
+conflict with every other call. Results are always returned in the original call order.
+"""
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+MAX_TOOL_WORKERS = int(os.environ.get("AGENT_TOOL_WORKERS", "8"))
+
+# Tool name -> (kind, name of the argument holding its target path)
+_TOOL_FOOTPRINTS = {
+    "get_file_content": ("read", "file_path"),
+    "get_files_info": ("list", None),
+    "find_files": ("list", None),
+    "search_code": ("list", None),
+    "write_file": ("write", "file_path"),
+    "edit_file": ("write", "file_path"),
+    "run_python_file": ("run", "file_path"),
+    "run_tests": ("run", None),
+}
+
+
+@dataclass
+class CallOutcome:
+    name: str
+    result: object
+    duration: float
+    error: BaseException = None
+
+
+def call_footprint(function_call_part):
+    kind, path_arg = _TOOL_FOOTPRINTS.get(function_call_part.name, ("unknown", None))
+    path = None
+    if path_arg:
+        value = (function_call_part.args or {}).get(path_arg)
+        if value:
+            # Tools resolve missing paths by base name, so compare on that.
+            path = os.path.basename(os.path.normpath(str(value))).lower()
+    return kind, path
+
+
+def calls_conflict(first, second):
+    """Return True if ``second`` must wait for ``first`` to finish."""
+    kind_a, path_a = first
+    kind_b, path_b = second
+    if "unknown" in (kind_a, kind_b):
+        return True
+    # Scripts and test runs may change any file (see INVALIDATING_TOOLS in
+    # core/cache.py), so they run alone, like a write to an unknown path.
+    if "run" in (kind_a, kind_b):
+        return True
+    if "write" not in (kind_a, kind_b):
+        return False
+    other_kind, other_path = (kind_b, path_b) if kind_a == "write" else (kind_a, path_a)
+    write_path = path_a if kind_a == "write" else path_b
+    if other_kind in ("write", "read"):
+        return other_path is None or write_path is None or other_path == write_path
+    # Listings and searches may observe any write.
+    return True
+
+
+class CallDispatcher:
+    """Dispatch function calls as they arrive, honouring conflicts.
+
+    ``submit`` may be called while the model response is still streaming;
+    each call starts as soon as every earlier conflicting call has finished.
+    """
+
+    def __init__(self, call, max_workers=MAX_TOOL_WORKERS):
+        self._call = call
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self._footprints = []
+        self._futures = []
+
+    def submit(self, part):
+        footprint = call_footprint(part)
+        dependencies = [
+            future for other, future in zip(self._footprints, self._futures)
+            if calls_conflict(other, footprint)
+        ]
+        # The pool hands out work in submission order and a call only ever
+        # waits on earlier calls, so waiting inside a worker cannot deadlock.
+        # The caller's context goes along so tool spans land in its trace.
+        context = contextvars.copy_context()
+        future = self._pool.submit(context.run, self._timed, part, dependencies)
+        self._footprints.append(footprint)
+        self._futures.append(future)
+        return future
+
+    def outcomes(self):
+        """Wait for every submitted call and return outcomes in call order."""
+        return [future.result() for future in self._futures]
+
+    def close(self, cancel=False):
+        self._pool.shutdown(wait=not cancel, cancel_futures=cancel)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(cancel=exc_type is not None)
+
+    def _timed(self, part, dependencies):
+        if dependencies:
+            wait(dependencies)
+        start = time.perf_counter()
+        try:
+            result = self._call(part)
+            error = None
+        except Exception as e:
+            result, error = None, e
+        return CallOutcome(part.name, result, time.perf_counter() - start, error)
+
+
+def run_function_calls(function_call_parts, call, max_workers=MAX_TOOL_WORKERS):
+    """Run ``call(part)`` for every part and return ``CallOutcome``s in order.
+
+    Exceptions raised by ``call`` are captured on the outcome rather than
+    propagated, so one failing call does not discard the others' results.
+    """
+    parts = list(function_call_parts)
+    if not parts:
+        return []
+    with CallDispatcher(call, min(max_workers, len(parts))) as dispatcher:
+        for part in parts:
+            dispatcher.submit(part)
+        return dispatcher.outcomes()
+
+
+def format_timings(outcomes, wall_time):
+    """Return a short per-call timing report for verbose output."""
+    lines = [f"   {outcome.name}: {outcome.duration * 1000:.1f} ms" for outcome in outcomes]
+    total = sum(outcome.duration for outcome in outcomes)
+    lines.append(
+        f"   {len(outcomes)} call(s) in {wall_time * 1000:.1f} ms wall "
+        f"({total * 1000:.1f} ms sequential)"
+    )
+    return "\n".join(lines)
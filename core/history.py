@@ -0,0 +1,204 @@
+"""Token-budgeted conversation history for long interactive sessions.
+
+Every ``generate_content`` call re-sends the whole ``messages`` list, so old
+file reads and script outputs are paid for again on every later request.
+``HistoryManager.compact`` trims the list in place, cheapest loss first:
+
+1. Reads of a file that was later rewritten, or read again in full (or the
+   same window of it again), are replaced by a stub.
+2. If still over budget, tool results outside the most recent turns are cut
+   down to a short head plus an elision marker.
+3. If still over budget, the oldest turns are dropped entirely.
+
+The most recent ``keep_recent_turns`` turns are never summarized or dropped.
+Token counts are estimated from character length, which is close enough for
+budgeting and needs no extra API call.
+"""
+import json
+import os
+from dataclasses import dataclass
+
+HISTORY_TOKEN_BUDGET = int(os.environ.get("AGENT_HISTORY_TOKENS", "120000"))
+CHARS_PER_TOKEN = 4
+
+# Tool name -> argument naming the file it reads or writes
+_READ_TOOLS = {"get_file_content": "file_path"}
+_WRITE_TOOLS = {"write_file": "file_path", "edit_file": "file_path"}
+# Arguments that make a read return only a window of the file
+_RANGE_ARGS = ("offset", "length", "start_line", "end_line", "tail_lines")
+
+
+@dataclass
+class CompactionStats:
+    tokens_before: int
+    tokens_after: int
+    superseded_reads: int = 0
+    summarized_results: int = 0
+    dropped_turns: int = 0
+
+    @property
+    def saved(self):
+        return self.tokens_before - self.tokens_after
+
+
+def estimate_tokens(content):
+    """Roughly estimate the prompt tokens a ``types.Content`` costs."""
+    chars = 0
+    for part in content.parts or []:
+        if part.text:
+            chars += len(part.text)
+        if part.function_call:
+            chars += len(part.function_call.name or "")
+            chars += len(json.dumps(part.function_call.args or {}, default=str))
+        if part.function_response:
+            chars += len(json.dumps(part.function_response.response or {}, default=str))
+    return chars // CHARS_PER_TOKEN + 1
+
+
+def _is_user_prompt(content):
+    return content.role == "user" and any(part.text for part in content.parts or [])
+
+
+def _path_key(args, arg_name):
+    value = (args or {}).get(arg_name)
+    return os.path.normpath(str(value)).lower() if value else None
+
+
+def _replace_response(content, index, response):
+    from google.genai import types  # slow to import; only needed once there is history
+
+    parts = list(content.parts)
+    name = parts[index].function_response.name
+    parts[index] = types.Part.from_function_response(name=name, response=response)
+    return types.Content(role=content.role, parts=parts)
+
+
+class HistoryManager:
+    """Keep a conversation within a token budget."""
+
+    def __init__(self, token_budget=HISTORY_TOKEN_BUDGET, keep_recent_turns=2, summary_chars=300):
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+        self.summary_chars = summary_chars
+        self.total_saved = 0
+        self.compactions = []
+
+    def compact(self, messages):
+        """Compact ``messages`` in place and return a ``CompactionStats``."""
+        tokens_before = sum(estimate_tokens(content) for content in messages)
+        stats = CompactionStats(tokens_before, tokens_before)
+
+        stats.superseded_reads = self._collapse_superseded_reads(messages)
+        total = sum(estimate_tokens(content) for content in messages)
+
+        protected_from = self._protected_start(messages)
+        if total > self.token_budget:
+            stats.summarized_results = self._summarize_old_results(messages, protected_from)
+            total = sum(estimate_tokens(content) for content in messages)
+
+        while total > self.token_budget:
+            end = self._first_turn_end(messages, protected_from)
+            if end is None:
+                break
+            total -= sum(estimate_tokens(content) for content in messages[:end])
+            del messages[:end]
+            protected_from -= end
+            stats.dropped_turns += 1
+
+        stats.tokens_after = total
+        self.total_saved += stats.saved
+        self.compactions.append(stats)
+        return stats
+
+    def _tool_results(self, messages):
+        """Yield ``(message_index, part_index, name, args)`` for each tool result.
+
+        Results are matched to the preceding model turn's calls in order.
+        """
+        pending = []
+        for i, content in enumerate(messages):
+            for j, part in enumerate(content.parts or []):
+                if part.function_call:
+                    pending.append((part.function_call.name, part.function_call.args))
+                elif part.function_response:
+                    name = part.function_response.name
+                    for k, (call_name, call_args) in enumerate(pending):
+                        if call_name == name:
+                            del pending[k]
+                            yield i, j, name, call_args
+                            break
+                    else:
+                        yield i, j, name, None
+
+    def _collapse_superseded_reads(self, messages):
+        reads = {}  # path key -> earlier reads still shown: [(i, j, name, key, window)]
+        superseded = []
+        for i, j, name, args in self._tool_results(messages):
+            if name in _READ_TOOLS:
+                key = _path_key(args, _READ_TOOLS[name])
+            elif name in _WRITE_TOOLS:
+                key = _path_key(args, _WRITE_TOOLS[name])
+            else:
+                continue
+            if key is None:
+                continue
+            args = args or {}
+            earlier = reads.setdefault(key, [])
+            if name in _WRITE_TOOLS:
+                superseded.extend(earlier)
+                earlier.clear()
+                continue
+            window = tuple((arg, args[arg]) for arg in _RANGE_ARGS if args.get(arg) is not None)
+            # A full read covers every earlier read of the file; a window
+            # covers only earlier reads of the same window
+            covered = [read for read in earlier if not window or read[4] == window]
+            superseded.extend(covered)
+            earlier[:] = [read for read in earlier if read not in covered]
+            earlier.append((i, j, name, key, window))
+
+        collapsed = 0
+        for i, j, name, key, window in superseded:
+            response = messages[i].parts[j].function_response.response or {}
+            if response.get("superseded"):
+                continue
+            messages[i] = _replace_response(messages[i], j, {
+                "result": f"[Superseded: {key} was read or rewritten again later in this conversation]",
+                "superseded": True,
+            })
+            collapsed += 1
+        return collapsed
+
+    def _summarize_old_results(self, messages, protected_from):
+        summarized = 0
+        for i, j, name, args in list(self._tool_results(messages)):
+            if i >= protected_from:
+                break
+            response = messages[i].parts[j].function_response.response or {}
+            text = response.get("result")
+            if not isinstance(text, str) or len(text) <= self.summary_chars:
+                continue
+            omitted = len(text) - self.summary_chars
+            messages[i] = _replace_response(messages[i], j, {
+                "result": (
+                    f"{text[:self.summary_chars]}\n"
+                    f"[... {omitted} characters elided from this earlier {name} result; "
+                    f"call it again if needed]"
+                ),
+            })
+            summarized += 1
+        return summarized
+
+    def _protected_start(self, messages):
+        """Index of the first message belonging to the recent, verbatim turns."""
+        starts = [i for i, content in enumerate(messages) if _is_user_prompt(content)]
+        if len(starts) <= self.keep_recent_turns:
+            return 0
+        return starts[-self.keep_recent_turns] if self.keep_recent_turns else len(messages)
+
+    @staticmethod
+    def _first_turn_end(messages, protected_from):
+        """End index of the oldest turn, or None if it is protected."""
+        for i in range(1, protected_from + 1):
+            if i == len(messages) or _is_user_prompt(messages[i]):
+                return i
+        return None
@@ -0,0 +1,193 @@
+"""Speculative prefetch of the read-only tool call the model is likely to make next.
+
+With ``AGENT_PREFETCH=1``, ``execute_tool`` shows every finished call to
+``PREFETCHER``. From it the prefetcher predicts the next call and starts it
+on a background thread, so it runs while the next model call is in flight:
+
+- ``find_files`` found exactly one file: ``get_file_content`` of that file
+- ``write_file``/``edit_file`` changed a module: ``get_file_content`` of its
+  tests (``test_<name>.py``, ``<name>_test.py`` or the nearest ``tests.py``)
+
+Running the tests would often be the actual next step after a write, but
+that executes project code. Only tools in ``SPECULATIVE_TOOLS`` (which only
+read) are ever run speculatively.
+
+A later call with the same arguments is served from the prefetched result,
+waiting for it if it is still running. Entries are keyed like the tool
+cache (arguments plus the file's mtime and size; see core/cache.py), so a
+file that changed in between is read again. Entries live for
+``AGENT_PREFETCH_TTL`` seconds, and any call to a tool that changes files
+drops them all. ``stats`` reports the hit rate and the tool time saved.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from core.cache import INVALIDATING_TOOLS, ToolResultCache
+from functions.file_index import FileIndex
+from functions.results import FileMatches, rank_paths, resolve_path
+
+PREFETCH = os.environ.get("AGENT_PREFETCH", "0").lower() in ("1", "true", "yes")
+PREFETCH_TTL = float(os.environ.get("AGENT_PREFETCH_TTL", "60"))
+MAX_PREFETCH_WORKERS = 2
+MAX_PREFETCH_ENTRIES = 16
+MAX_TEST_FILES = 2
+
+SPECULATIVE_TOOLS = frozenset(["get_file_content", "get_files_info", "find_files", "search_code"])
+
+
+class _Entry:
+    def __init__(self, future, generation):
+        self.future = future
+        self.generation = generation
+        self.created = time.monotonic()
+        self.duration = 0.0  # how long the tool took in the background
+
+
+class Prefetcher:
+    """Runs predicted read-only calls in the background and serves their results."""
+
+    def __init__(self, enabled=PREFETCH, ttl=PREFETCH_TTL, max_workers=MAX_PREFETCH_WORKERS):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self.prefetched = 0
+        self.hits = 0
+        self.unused = 0
+        self.saved = 0.0  # seconds of tool time the hits did not have to wait for
+        self._entries = OrderedDict()  # tool cache key -> _Entry
+        self._generation = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def take(self, name, args):
+        """Return ``(hit, result, saved_seconds)`` for a call about to run."""
+        if name not in SPECULATIVE_TOOLS:
+            return False, None, 0.0
+        key = _key(name, args)
+        with self._lock:
+            self._expire()
+            entry = self._entries.pop(key, None)
+        if entry is None:
+            return False, None, 0.0
+
+        start = time.perf_counter()
+        try:
+            result = entry.future.result()
+        except Exception:
+            with self._lock:
+                self.unused += 1
+            return False, None, 0.0
+        saved = max(0.0, entry.duration - (time.perf_counter() - start))
+        with self._lock:
+            if entry.generation != self._generation:
+                # A file-changing call finished while this was running
+                self.unused += 1
+                return False, None, 0.0
+            self.hits += 1
+            self.saved += saved
+        return True, result, saved
+
+    def observe(self, name, args, result, tools):
+        """Start the calls predicted to follow ``name(**args)`` returning ``result``."""
+        if name in INVALIDATING_TOOLS:
+            self.invalidate()
+        for next_name, next_args in predict(name, args, result):
+            if next_name in SPECULATIVE_TOOLS:
+                self._submit(next_name, next_args, tools[next_name])
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self.unused += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        rate = self.hits / self.prefetched if self.prefetched else 0.0
+        return (f"{self.prefetched} prefetched, {self.hits} hit(s) ({rate:.0%}), "
+                f"{self.unused} unused, {self.saved * 1000:.0f} ms of tool time saved")
+
+    def _submit(self, name, args, function):
+        key = _key(name, args)
+        with self._lock:
+            self._expire()
+            if key in self._entries:
+                return
+            while len(self._entries) >= MAX_PREFETCH_ENTRIES:
+                self._entries.popitem(last=False)
+                self.unused += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="prefetch")
+            entry = _Entry(None, self._generation)
+
+            def run():
+                start = time.perf_counter()
+                try:
+                    return function(**args)
+                finally:
+                    entry.duration = time.perf_counter() - start
+
+            entry.future = self._executor.submit(run)
+            self._entries[key] = entry
+            self.prefetched += 1
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry.created < self.ttl:
+                break
+            del self._entries[key]
+            self.unused += 1
+
+
+def predict(name, args, result):
+    """``[(tool name, args)]`` likely to be called after ``name(**args)`` returned ``result``."""
+    root = args["working_directory"]
+    if name == "find_files" and isinstance(result, FileMatches) and len(result.paths) == 1:
+        return [("get_file_content", {"working_directory": root, "file_path": result.paths[0]})]
+    if name in ("write_file", "edit_file") and isinstance(result, str) and not result.startswith("Error"):
+        written = resolve_path(root, args.get("file_path", ""))
+        if written.found:
+            return [("get_file_content", {"working_directory": root, "file_path": path})
+                    for path in _test_files(root, written.path)]
+    return []
+
+
+def _test_files(root, rel_path):
+    """The test modules most likely to cover the module at ``rel_path``."""
+    directory, name = os.path.split(rel_path)
+    stem, extension = os.path.splitext(name)
+    if extension != ".py" or stem.startswith("test") or stem.endswith("_test"):
+        return []
+    index = FileIndex.for_root(root)
+    found = []
+    for candidate in (f"test_{stem}.py", f"{stem}_test.py"):
+        matches = index.find_by_name(candidate)
+        if matches:
+            found.append(rank_paths(matches, os.path.join(directory, candidate))[0])
+    if not found:
+        # Fall back to the nearest tests.py in the module's directory or above it
+        while True:
+            candidate = os.path.join(directory, "tests.py")
+            if os.path.isfile(os.path.join(root, candidate)):
+                found.append(candidate)
+                break
+            if not directory:
+                break
+            directory = os.path.dirname(directory)
+    return found[:MAX_TEST_FILES]
+
+
+def _key(name, args):
+    if name == "get_file_content":
+        # "calculator.py" and "calculator/pkg/calculator.py" read the same file
+        resolution = resolve_path(args["working_directory"], args.get("file_path", ""))
+        if resolution.found:
+            args = dict(args, file_path=resolution.path)
+    return ToolResultCache._key(name, args)
+
+
+PREFETCHER = Prefetcher()
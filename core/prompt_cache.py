@@ -0,0 +1,198 @@
+"""Server-side caching of the stable prompt prefix.
+
+Every model call re-sends the system prompt, the tool declarations and the
+whole history. ``PromptCache`` turns the stable part of that into a
+cached-content handle, so the request only carries what came after it:
+
+- the first handle for a (model, config) covers the system instruction and
+  tools, and is shared by every session and batch task using that config
+- once a session's uncached history has grown by ``CACHE_HISTORY_STEP_CHARS``,
+  a longer handle is created covering everything but the newest message
+
+Handles are found by content digests, so any conversation whose messages
+start with a cached prefix reuses it. A handle is created with a TTL of
+``AGENT_PROMPT_CACHE_TTL`` seconds and its TTL is extended when it is used
+close to expiry. Prefixes smaller than ``AGENT_PROMPT_CACHE_MIN_TOKENS`` are
+never cached (the API rejects small caches). If creating or refreshing a
+handle fails, the request is sent in full and further attempts pause for
+``CACHE_RETRY_DELAY`` seconds. The tokens served from the cache come back
+in each response's ``usage_metadata`` and are summed by the tracer.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+PROMPT_CACHE = os.environ.get("AGENT_PROMPT_CACHE", "1").lower() not in ("0", "false", "no")
+CACHE_TTL = int(os.environ.get("AGENT_PROMPT_CACHE_TTL", "600"))
+CACHE_MIN_TOKENS = int(os.environ.get("AGENT_PROMPT_CACHE_MIN_TOKENS", "1024"))
+CACHE_HISTORY_STEP_CHARS = 16 * 1024
+CACHE_REFRESH_MARGIN = 60
+CACHE_RETRY_DELAY = 60
+MAX_CACHE_HANDLES = 32
+# Rough size of a token, used to skip prefixes too small to cache
+CHARS_PER_TOKEN = 4
+_MAX_DIGESTS = 4096
+
+
+class CacheHandle:
+    def __init__(self, name, key, prefix_len, expires_at, tokens):
+        self.name = name
+        self.key = key  # (model, config digest, content digests...)
+        self.prefix_len = prefix_len  # messages covered, after the system prompt and tools
+        self.expires_at = expires_at
+        self.tokens = tokens
+
+
+class PromptCache:
+    """Create, reuse and refresh cached-content handles through ``api``.
+
+    ``api`` provides ``create_cache(model, contents, config, ttl)`` returning
+    ``(name, expires_at, tokens)``, ``refresh_cache(name, ttl)`` returning the
+    new ``expires_at`` and ``delete_cache(name)`` (see ``GeminiBackend``).
+    Thread-safe; network calls are made outside the lock.
+    """
+
+    def __init__(self, api, ttl=CACHE_TTL, min_tokens=CACHE_MIN_TOKENS,
+                 history_step_chars=CACHE_HISTORY_STEP_CHARS):
+        self.api = api
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.history_step_chars = history_step_chars
+        self.created = 0
+        self.refreshed = 0
+        self.failures = 0
+        self._handles = OrderedDict()  # key -> CacheHandle, least recently used first
+        self._pending = set()
+        self._retry_at = 0.0
+        self._digests = OrderedDict()  # id(obj) -> (obj, digest, chars)
+        self._lock = threading.Lock()
+
+    def prepare(self, model, contents, config):
+        """Return ``(contents, config, handle)`` for one request.
+
+        With a handle, ``contents`` is the uncached suffix and ``config``
+        refers to the handle instead of carrying the system prompt and tools.
+        Without one (nothing cached yet, or caching unavailable) the request
+        is returned unchanged.
+        """
+        if getattr(config, "cached_content", None) or not (config.system_instruction or config.tools):
+            return contents, config, None
+        base_digest, base_chars = self._digest(config, ("system_instruction", "tools", "tool_config"))
+        digests = []
+        sizes = []
+        for content in contents:
+            digest, chars = self._digest(content)
+            digests.append(digest)
+            sizes.append(chars)
+
+        # At least the newest message is always sent with the request
+        limit = len(contents) - 1
+        handle = self._best_handle(model, base_digest, digests, limit)
+        if handle is not None and handle.expires_at - time.time() < CACHE_REFRESH_MARGIN:
+            handle = self._refresh(handle)
+            if handle is None:
+                handle = self._best_handle(model, base_digest, digests, limit)
+
+        covered = handle.prefix_len if handle is not None else 0
+        target = 0 if handle is None and self._fits(base_chars) else limit
+        if handle is None or sum(sizes[covered:target]) >= self.history_step_chars:
+            if target >= covered and self._fits(base_chars + sum(sizes[:target])):
+                handle = self._create(model, base_digest, digests, target, contents, config) or handle
+
+        if handle is None:
+            return contents, config, None
+        request_config = config.model_copy(
+            update={"system_instruction": None, "tools": None, "tool_config": None,
+                    "cached_content": handle.name}
+        )
+        return contents[handle.prefix_len:], request_config, handle
+
+    def discard(self, handle):
+        """Forget a handle the server no longer accepts."""
+        with self._lock:
+            self._handles.pop(handle.key, None)
+            self.failures += 1
+            self._retry_at = time.monotonic() + CACHE_RETRY_DELAY
+
+    def stats(self):
+        return f"{self.created} created, {self.refreshed} refreshed, {self.failures} failure(s)"
+
+    def _fits(self, chars):
+        return chars >= self.min_tokens * CHARS_PER_TOKEN
+
+    def _best_handle(self, model, base_digest, digests, limit):
+        with self._lock:
+            best = None
+            for key, handle in self._handles.items():
+                if (key[0] == model and key[1] == base_digest and handle.prefix_len <= limit
+                        and key[2:] == tuple(digests[:handle.prefix_len])
+                        and handle.expires_at > time.time()
+                        and (best is None or handle.prefix_len > best.prefix_len)):
+                    best = handle
+            if best is not None:
+                self._handles.move_to_end(best.key)
+            return best
+
+    def _create(self, model, base_digest, digests, prefix_len, contents, config):
+        key = (model, base_digest) + tuple(digests[:prefix_len])
+        with self._lock:
+            if key in self._pending or key in self._handles or time.monotonic() < self._retry_at:
+                return None
+            self._pending.add(key)
+        try:
+            name, expires_at, tokens = self.api.create_cache(model, contents[:prefix_len], config, self.ttl)
+        except Exception:
+            with self._lock:
+                self.failures += 1
+                self._retry_at = time.monotonic() + CACHE_RETRY_DELAY
+            return None
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+        handle = CacheHandle(name, key, prefix_len, expires_at, tokens)
+        with self._lock:
+            self.created += 1
+            self._handles[key] = handle
+            evicted = []
+            while len(self._handles) > MAX_CACHE_HANDLES:
+                evicted.append(self._handles.popitem(last=False)[1])
+        for old in evicted:
+            try:
+                self.api.delete_cache(old.name)
+            except Exception:
+                pass  # it expires on its own
+        return handle
+
+    def _refresh(self, handle):
+        try:
+            handle.expires_at = self.api.refresh_cache(handle.name, self.ttl)
+        except Exception:
+            self.discard(handle)
+            return None
+        with self._lock:
+            self.refreshed += 1
+        return handle
+
+    def _digest(self, obj, fields=None):
+        """``(digest, chars)`` of a Content or config, memoized per object.
+
+        The loops never mutate a message in place (history compaction swaps
+        in a new ``Content``), so an object's digest cannot go stale.
+        """
+        with self._lock:
+            entry = self._digests.get(id(obj))
+            if entry is not None and entry[0] is obj:
+                return entry[1], entry[2]
+        data = obj.model_dump(mode="json", exclude_none=True, include=set(fields) if fields else None)
+        text = json.dumps(data, sort_keys=True)
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            # The object is kept alive with its entry, so its id cannot be reused
+            self._digests[id(obj)] = (obj, digest, len(text))
+            while len(self._digests) > _MAX_DIGESTS:
+                self._digests.popitem(last=False)
+        return digest, len(text)
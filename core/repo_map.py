@@ -0,0 +1,305 @@
+"""Compact outline of the project's Python modules for the system prompt.
+
+``RepoMap`` parses each module with ``ast`` and keeps the first line of its
+docstring, what it imports and its public classes, functions and
+signatures. Outlines are cached in ``.kodex_cache/repo_map.json`` keyed by
+each file's mtime and size, so only new or changed files are parsed again,
+in this process or the next. Files are only stat'ed again when the
+``FileIndex`` generation moves (a file was added, removed or written
+through a tool) or every ``AGENT_REPO_MAP_REFRESH`` seconds, which catches
+in-place edits made outside the agent.
+
+``render`` ranks modules by how central they look (imported by many other
+modules, entry points, recently changed, close to the root) and emits as
+many as fit in ``AGENT_REPO_MAP_CHARS`` characters. The ranking depends
+only on the code, not on the prompt or the clock, so the system
+instruction stays identical from one session to the next until the code
+changes and the prompt cache (core/prompt_cache.py) keeps serving it.
+"""
+import ast
+import json
+import os
+import threading
+import time
+
+from functions.file_index import CACHE_DIR_NAME, FileIndex
+
+# Size budget of the rendered map; 0 leaves the map out of the prompt
+REPO_MAP_CHARS = int(os.environ.get("AGENT_REPO_MAP_CHARS", "8000"))
+# Seconds between full mtime checks while the file index reports no change
+REPO_MAP_REFRESH_INTERVAL = float(os.environ.get("AGENT_REPO_MAP_REFRESH", "30"))
+MAP_FILE_NAME = "repo_map.json"
+MAP_VERSION = 1
+MAX_OUTLINE_BYTES = 1024 * 1024  # larger modules are listed without an outline
+MAX_SIGNATURE_CHARS = 80
+MAX_CLASS_CHARS = 240
+MAX_DOC_CHARS = 80
+ENTRY_POINT_NAMES = frozenset(["main.py", "__main__.py", "cli.py", "app.py", "manage.py"])
+# A module changed this long before the newest one gets no recency bonus
+RECENCY_WINDOW_NS = 7 * 24 * 3600 * 10**9
+
+_HEADER = (
+    "PROJECT MAP (the most central Python modules and their public API; "
+    "use it instead of exploring with get_files_info/find_files where it is enough):"
+)
+
+
+class RepoMap:
+    """Outline of the Python modules under one project root."""
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def for_root(cls, root):
+        """Return the shared map for ``root``, creating it on first use."""
+        root = os.path.abspath(root)
+        with cls._instances_lock:
+            repo_map = cls._instances.get(root)
+            if repo_map is None:
+                repo_map = cls(root)
+                cls._instances[root] = repo_map
+            return repo_map
+
+    def __init__(self, root, cache_path=None):
+        self.root = os.path.abspath(root)
+        self.cache_path = cache_path or os.path.join(self.root, CACHE_DIR_NAME, MAP_FILE_NAME)
+        self.parsed = 0  # modules parsed by the last refresh
+        self._files = {}  # rel path -> outline dict (see _outline)
+        self._loaded = False
+        self._version = 0
+        self._generation = None  # FileIndex generation at the last full check
+        self._checked = 0.0  # time.monotonic() of the last full check
+        self._rendered = None  # (version, max_chars, text)
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """Parse new and changed modules and drop deleted ones.
+
+        Cheap unless the file index changed or the refresh interval passed
+        (or ``force``). Returns True if the map changed.
+        """
+        with self._lock:
+            if not self._loaded:
+                self._loaded = True
+                self._load_cache()
+            index = FileIndex.for_root(self.root)
+            index.refresh()
+            now = time.monotonic()
+            self.parsed = 0
+            if (not force and index.generation == self._generation
+                    and now - self._checked < REPO_MAP_REFRESH_INTERVAL):
+                return False
+            self._generation = index.generation
+            self._checked = now
+            paths = [path for path in index.all_paths() if path.endswith(".py")]
+            changed = False
+            for rel in paths:
+                try:
+                    st = os.stat(os.path.join(self.root, rel))
+                except OSError:
+                    continue
+                key = [st.st_mtime_ns, st.st_size]
+                entry = self._files.get(rel)
+                if entry is not None and entry["key"] == key:
+                    continue
+                self._files[rel] = _outline(os.path.join(self.root, rel), rel, key)
+                self.parsed += 1
+                changed = True
+            current = set(paths)
+            for rel in [rel for rel in self._files if rel not in current]:
+                del self._files[rel]
+                changed = True
+            if changed:
+                self._version += 1
+                self._save_cache()
+            return changed
+
+    def render(self, max_chars=REPO_MAP_CHARS):
+        """The highest-ranked module outlines that fit in ``max_chars``, or ""."""
+        with self._lock:
+            if self._rendered is not None and self._rendered[:2] == (self._version, max_chars):
+                return self._rendered[2]
+            text = self._render(max_chars)
+            self._rendered = (self._version, max_chars, text)
+            return text
+
+    def _render(self, max_chars):
+        if max_chars <= 0 or not self._files:
+            return ""
+        # Room for the "N more modules" line
+        budget = max_chars - len(_HEADER) - 80
+        scores = self._scores()
+        blocks = {}
+        used = 0
+        for rel in sorted(self._files, key=lambda rel: (-scores[rel], rel)):
+            entry = self._files[rel]
+            for block in (_block(rel, entry), _block(rel, entry, symbols=False)):
+                if used + len(block) + 1 <= budget:
+                    blocks[rel] = block
+                    used += len(block) + 1
+                    break
+        if not blocks:
+            return ""
+        lines = [_HEADER] + [blocks[rel] for rel in sorted(blocks)]
+        omitted = len(self._files) - len(blocks)
+        if omitted:
+            lines.append(f"({omitted} more module(s) not shown; find them with find_files)")
+        return "\n".join(lines)
+
+    def _scores(self):
+        """Rank modules: imported by others, entry points, recently changed, shallow."""
+        modules = {}  # dotted name, and each dotted suffix of it -> rel paths
+        for rel in self._files:
+            parts = rel[:-3].split(os.sep)
+            if parts[-1] == "__init__":
+                parts = parts[:-1]
+            for i in range(len(parts)):
+                modules.setdefault(".".join(parts[i:]), set()).add(rel)
+
+        importers = {rel: set() for rel in self._files}
+        for rel, entry in self._files.items():
+            for name in entry["imports"]:
+                for target in modules.get(name, ()):
+                    if target != rel:
+                        importers[target].add(rel)
+
+        newest = max(entry["key"][0] for entry in self._files.values())
+        scores = {}
+        for rel, entry in self._files.items():
+            name = os.path.basename(rel)
+            age = newest - entry["key"][0]
+            score = 2.0 * min(len(importers[rel]), 10)
+            if name in ENTRY_POINT_NAMES or (entry["main"] and os.sep not in rel):
+                score += 3.0
+            score += 2.0 * max(0.0, 1.0 - age / RECENCY_WINDOW_NS)
+            score -= 0.5 * rel.count(os.sep)
+            if name.startswith("test") or name.endswith("_test.py") or name == "conftest.py":
+                score -= 2.0
+            if not entry["symbols"]:
+                score -= 1.0
+            scores[rel] = score
+        return scores
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == MAP_VERSION and data.get("root") == self.root:
+            self._files = data["files"]
+
+    def _save_cache(self):
+        data = {"version": MAP_VERSION, "root": self.root, "files": self._files}
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            # The cache is an optimisation; a read-only project still works.
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def _outline(full_path, rel, key):
+    """Docstring summary, imported module names and public symbols of one module."""
+    entry = {"key": key, "doc": "", "imports": [], "symbols": [], "main": False}
+    if key[1] > MAX_OUTLINE_BYTES:
+        entry["doc"] = "(large module, not outlined)"
+        return entry
+    try:
+        with open(full_path, "rb") as f:
+            tree = ast.parse(f.read(), filename=rel)
+    except (OSError, SyntaxError, ValueError):
+        entry["doc"] = "(could not be parsed)"
+        return entry
+
+    entry["doc"] = _summary(ast.get_docstring(tree))
+    package = rel.split(os.sep)[:-1]
+    imports = set()
+    # Imports inside functions count too: this codebase defers heavy imports
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            if node.level:
+                parent = package[:max(0, len(package) - node.level + 1)]
+                base = ".".join(parent + ([base] if base else []))
+            if base:
+                imports.add(base)
+            imports.update(f"{base}.{alias.name}" if base else alias.name for alias in node.names)
+    entry["imports"] = sorted(imports)
+
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and not node.name.startswith("_"):
+            entry["symbols"].append(_signature(node))
+        elif isinstance(node, ast.ClassDef) and not node.name.startswith("_"):
+            entry["symbols"].append(_class_line(node))
+        elif isinstance(node, ast.If) and "__name__" in ast.unparse(node.test):
+            entry["main"] = True
+    return entry
+
+
+def _summary(docstring):
+    if not docstring:
+        return ""
+    line = docstring.strip().splitlines()[0].strip()
+    return line if len(line) <= MAX_DOC_CHARS else line[:MAX_DOC_CHARS - 3] + "..."
+
+
+def _signature(node, method=False):
+    args = node.args
+    if method and args.args and args.args[0].arg in ("self", "cls"):
+        args = ast.arguments(
+            posonlyargs=args.posonlyargs, args=args.args[1:], vararg=args.vararg,
+            kwonlyargs=args.kwonlyargs, kw_defaults=args.kw_defaults, kwarg=args.kwarg,
+            defaults=args.defaults[1:] if len(args.defaults) == len(args.args) else args.defaults,
+        )
+    text = ast.unparse(args)
+    if len(text) > MAX_SIGNATURE_CHARS:
+        text = text[:MAX_SIGNATURE_CHARS - 3] + "..."
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns is not None else ""
+    prefix = "async " if isinstance(node, ast.AsyncFunctionDef) else ""
+    if method:
+        return f"{prefix}{node.name}({text}){returns}"
+    return f"{prefix}def {node.name}({text}){returns}"
+
+
+def _class_line(node):
+    bases = ", ".join(ast.unparse(base) for base in node.bases)
+    line = f"class {node.name}({bases})" if bases else f"class {node.name}"
+    fields = [
+        item.target.id for item in node.body
+        if isinstance(item, ast.AnnAssign) and isinstance(item.target, ast.Name)
+    ]
+    if fields:
+        line += f" [{', '.join(fields)}]"
+    methods = [
+        _signature(item, method=True) for item in node.body
+        if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))
+        and (not item.name.startswith("_") or item.name in ("__init__", "__call__"))
+        and not _is_property(item)
+    ]
+    if methods:
+        line += ": " + ", ".join(methods)
+    return line if len(line) <= MAX_CLASS_CHARS else line[:MAX_CLASS_CHARS - 3] + "..."
+
+
+def _is_property(node):
+    return any(
+        (isinstance(d, ast.Name) and d.id == "property") or (isinstance(d, ast.Attribute) and d.attr == "setter")
+        for d in node.decorator_list
+    )
+
+
+def _block(rel, entry, symbols=True):
+    head = f"{rel.replace(os.sep, '/')}" + (f" - {entry['doc']}" if entry["doc"] else "")
+    if not symbols or not entry["symbols"]:
+        return head
+    return "\n".join([head] + [f"  {symbol}" for symbol in entry["symbols"]])
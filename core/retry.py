@@ -0,0 +1,127 @@
+"""Retry policy and client-side rate limiting for model calls.
+
+``RetryPolicy`` decides whether a failed call is worth retrying (429, 5xx,
+timeouts and dropped connections) and how long to wait: exponential backoff
+with full jitter, or longer when the server sent a retry-after hint.
+``TokenBucket`` spaces out requests so that every session sharing a backend
+stays under ``AGENT_RATE_LIMIT`` requests per minute; after a 429 the whole
+bucket is paused, so concurrent sessions back off together instead of each
+hitting the limit in turn.
+"""
+import email.utils
+import os
+import random
+import re
+import threading
+import time
+
+MAX_RETRIES = int(os.environ.get("AGENT_MAX_RETRIES", "5"))
+RETRY_BASE_DELAY = float(os.environ.get("AGENT_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.environ.get("AGENT_RETRY_MAX_DELAY", "30"))
+# Requests per minute across the process; 0 disables the limiter
+RATE_LIMIT = float(os.environ.get("AGENT_RATE_LIMIT", "0"))
+RATE_BURST = int(os.environ.get("AGENT_RATE_BURST", "4"))
+
+RETRYABLE_STATUS = frozenset([408, 429, 500, 502, 503, 504])
+
+
+class RetryPolicy:
+    def __init__(self, max_retries=MAX_RETRIES, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt):
+        """Full-jitter delay before retry number ``attempt + 1``."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def delay(self, error, attempt):
+        """Seconds to wait before retrying ``error``, or None to give up."""
+        if attempt >= self.max_retries or not is_retryable(error):
+            return None
+        delay = self.backoff(attempt)
+        hint = retry_after(error)
+        if hint is not None:
+            delay = max(delay, min(hint, self.max_delay))
+        return delay
+
+
+class TokenBucket:
+    """Thread-safe token bucket; ``reserve`` returns how long to wait for a token.
+
+    A token is taken immediately even when the bucket is empty (the balance
+    goes negative), so callers are served in order and each one only has to
+    sleep for its own reservation.
+    """
+
+    def __init__(self, per_minute=RATE_LIMIT, burst=RATE_BURST):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._paused_until - now)
+            if self.rate <= 0:
+                return wait
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens < 0:
+                wait = max(wait, -self._tokens / self.rate)
+            return wait
+
+    def pause(self, seconds):
+        """Hold back every caller for ``seconds`` (after the server said to slow down)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def status_code(error):
+    """HTTP status of an API error, or None."""
+    code = getattr(error, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(error):
+    if status_code(error) in RETRYABLE_STATUS:
+        return True
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(error, httpx.TransportError)
+
+
+def retry_after(error):
+    """Server-suggested delay in seconds, from a Retry-After header or a RetryInfo detail."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+
+    details = getattr(error, "details", None)
+    if isinstance(details, dict):
+        # {"error": {"details": [...]}} from the API, but "error" may also be a plain message
+        inner = details.get("error")
+        details = (inner if isinstance(inner, dict) else details).get("details")
+    for detail in details if isinstance(details, list) else []:
+        if isinstance(detail, dict) and str(detail.get("@type", "")).endswith("RetryInfo"):
+            match = re.fullmatch(r"([\d.]+)s", str(detail.get("retryDelay", "")))
+            if match:
+                return float(match.group(1))
+    return None
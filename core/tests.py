@@ -0,0 +1,704 @@
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from google.genai import types
+
+from core.agent import execute_tool, run_loop, run_loop_async
+from core.batch import run_tasks
+from core import backends
+from core.backends import CachingBackend, GeminiBackend, RecordingBackend, ReplayBackend, ResilientBackend
+from core.cache import ToolResultCache
+from core.executor import call_footprint, calls_conflict
+from core import agent, repo_map
+from core.history import HistoryManager
+from core.prefetch import Prefetcher, predict
+from core.prompt_cache import PromptCache
+from core.repo_map import RepoMap
+from core.retry import RetryPolicy, TokenBucket, retry_after
+from core.tracing import Tracer, format_summary
+from functions.file_index import FileIndex
+from functions.find_files import find_files
+from functions.get_file_content import get_file_content
+from functions.get_files_info import get_files_info
+from functions.write_file import write_file
+
+
+def tool_turn(name, result, **args):
+    """The model's call and the tool's response, as two history entries."""
+    return [
+        types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(name=name, args=args))]),
+        types.Content(role="user", parts=[types.Part.from_function_response(name=name, response={"result": result})]),
+    ]
+
+
+def results(messages):
+    return [
+        part.function_response.response["result"]
+        for content in messages for part in content.parts if part.function_response
+    ]
+
+
+class TestHistoryManager(unittest.TestCase):
+    """Test suite for superseded-read collapsing in HistoryManager."""
+
+    def setUp(self):
+        self.history = HistoryManager(token_budget=10**6)
+
+    def test_full_read_supersedes_earlier_reads(self):
+        messages = (tool_turn("get_file_content", "lines 1-100", file_path="big.py", start_line=1, end_line=100)
+                    + tool_turn("get_file_content", "whole file", file_path="big.py"))
+        stats = self.history.compact(messages)
+        self.assertEqual(stats.superseded_reads, 1)
+        self.assertTrue(results(messages)[0].startswith("[Superseded"))
+        self.assertEqual(results(messages)[1], "whole file")
+
+    def test_other_window_does_not_supersede(self):
+        messages = (tool_turn("get_file_content", "lines 1-100", file_path="big.py", start_line=1, end_line=100)
+                    + tool_turn("get_file_content", "lines 500-600", file_path="big.py", start_line=500, end_line=600)
+                    + tool_turn("get_file_content", "tail", file_path="big.py", tail_lines=20))
+        self.assertEqual(self.history.compact(messages).superseded_reads, 0)
+        self.assertEqual(results(messages), ["lines 1-100", "lines 500-600", "tail"])
+
+    def test_window_or_full_read_does_not_supersede_full_read(self):
+        messages = (tool_turn("get_file_content", "whole file", file_path="big.py")
+                    + tool_turn("get_file_content", "lines 1-10", file_path="big.py", start_line=1, end_line=10))
+        self.assertEqual(self.history.compact(messages).superseded_reads, 0)
+
+    def test_same_window_and_writes_supersede(self):
+        messages = (tool_turn("get_file_content", "first", file_path="big.py", offset=0, length=100)
+                    + tool_turn("get_file_content", "second", file_path="big.py", offset=0, length=100)
+                    + tool_turn("get_file_content", "tail", file_path="big.py", tail_lines=5)
+                    + tool_turn("edit_file", "Successfully edited", file_path="big.py"))
+        self.assertEqual(self.history.compact(messages).superseded_reads, 3)
+        self.assertEqual(results(messages)[3], "Successfully edited")
+
+
+class TestCallConflicts(unittest.TestCase):
+    """Test suite for which calls in one turn must run one after the other."""
+
+    def conflict(self, first, second):
+        footprints = [call_footprint(types.FunctionCall(name=name, args=args)) for name, args in (first, second)]
+        return calls_conflict(*footprints)
+
+    def test_reads_and_listings_run_together(self):
+        self.assertFalse(self.conflict(("get_file_content", {"file_path": "a.py"}), ("find_files", {})))
+        self.assertFalse(self.conflict(("get_file_content", {"file_path": "a.py"}),
+                                       ("get_file_content", {"file_path": "a.py"})))
+
+    def test_writes_conflict_with_the_same_path(self):
+        self.assertTrue(self.conflict(("write_file", {"file_path": "a.py"}), ("get_file_content", {"file_path": "a.py"})))
+        self.assertFalse(self.conflict(("write_file", {"file_path": "a.py"}), ("get_file_content", {"file_path": "b.py"})))
+        self.assertTrue(self.conflict(("edit_file", {"file_path": "a.py"}), ("search_code", {})))
+
+    def test_runs_conflict_with_everything(self):
+        run = ("run_python_file", {"file_path": "script.py"})
+        for other in (("get_file_content", {"file_path": "other.py"}), ("get_files_info", {}),
+                      ("search_code", {}), ("run_tests", {}), run):
+            self.assertTrue(self.conflict(run, other), other)
+            self.assertTrue(self.conflict(other, run), other)
+
+
+class TestToolResultCache(unittest.TestCase):
+    """Test suite for when ToolResultCache entries stop being served."""
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.root = self.scratch.name
+        os.makedirs(os.path.join(self.root, "pkg"))
+        self.write("pkg/module.py", "VALUE = 1\n")
+        self.cache = ToolResultCache()
+
+    def tearDown(self):
+        self.scratch.cleanup()
+
+    def write(self, rel_path, content, mtime=None):
+        full_path = os.path.join(self.root, rel_path)
+        with open(full_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        if mtime is not None:
+            os.utime(full_path, (mtime, mtime))
+
+    def call(self, function, **args):
+        return self.cache.call(function.__name__, dict(args, working_directory=self.root), function)
+
+    def test_repeated_read_is_a_hit(self):
+        first, hit = self.call(get_file_content, file_path="pkg/module.py")
+        self.assertFalse(hit)
+        self.assertEqual(self.call(get_file_content, file_path="pkg/module.py"), (first, True))
+
+    def test_outside_edit_invalidates_read(self):
+        for file_path in ("pkg/module.py", "module.py"):  # the bare name is found through the FileIndex
+            with self.subTest(file_path=file_path):
+                self.write("pkg/module.py", "VALUE = 1\n", mtime=1_000_000)
+                self.assertIn("VALUE = 1", self.call(get_file_content, file_path=file_path)[0])
+                self.write("pkg/module.py", "VALUE = 2\n", mtime=2_000_000)
+                result, hit = self.call(get_file_content, file_path=file_path)
+                self.assertFalse(hit)
+                self.assertIn("VALUE = 2", result)
+
+    def test_missing_file_is_read_once_created(self):
+        self.assertTrue(self.call(get_file_content, file_path="later.py")[0].startswith("Error"))
+        self.write("pkg/later.py", "LATER = True\n")
+        FileIndex.notify_changed(self.root)
+        result, hit = self.call(get_file_content, file_path="later.py")
+        self.assertFalse(hit)
+        self.assertIn("LATER = True", result)
+
+    def test_new_file_invalidates_find_and_listing(self):
+        self.assertIn("Found 1 file", str(self.call(find_files, pattern="module")[0]))
+        self.call(get_files_info, directory="pkg")
+        self.write("pkg/module_two.py", "")
+        FileIndex.notify_changed(self.root)
+        self.assertIn("Found 2 file", str(self.call(find_files, pattern="module")[0]))
+        result, hit = self.call(get_files_info, directory="pkg")
+        self.assertFalse(hit)
+        self.assertIn("module_two.py", result)
+
+    def test_invalidating_tool_clears_cache(self):
+        self.call(get_file_content, file_path="pkg/module.py")
+        self.call(write_file, file_path="pkg/other.py", content="")
+        self.assertEqual(self.cache.invalidations, 1)
+        self.assertFalse(self.call(get_file_content, file_path="pkg/module.py")[1])
+
+
+class FakeBackend:
+    """Serves one scripted model turn per call; a turn is a list of chunks of parts."""
+
+    def __init__(self, *turns):
+        self.turns = list(turns)
+
+    def _next(self):
+        turn = self.turns.pop(0)
+        if isinstance(turn, Exception):
+            raise turn
+        return turn
+
+    def generate_content(self, model, contents, config):
+        parts = [part for chunk in self._next() for part in chunk]
+        return types.GenerateContentResponse(candidates=[types.Candidate(content=types.Content(role="model", parts=parts))])
+
+    async def generate_content_stream(self, model, contents, config):
+        for chunk in self._next():
+            yield types.GenerateContentResponse(candidates=[types.Candidate(content=types.Content(role="model", parts=chunk))])
+
+
+def respond(function_call):
+    return types.Content(role="tool", parts=[
+        types.Part.from_function_response(name=function_call.name, response={"result": "ok"}),
+    ])
+
+
+class TestAgentLoop(unittest.TestCase):
+    """Test suite for the model turns the agent loop keeps and rolls back."""
+
+    def setUp(self):
+        self.call = types.Part(function_call=types.FunctionCall(name="get_files_info", args={"directory": "."}))
+
+    def test_streamed_parts_are_kept(self):
+        thought = types.Part(text="The listing will tell.", thought=True)
+        backend = FakeBackend(
+            [[types.Part(text="Let me ")], [types.Part(text="look.")], [thought], [self.call]],
+            [[types.Part(text="Done.")]],
+        )
+        messages = []
+        text = asyncio.run(run_loop_async(messages, "model", respond, backend=backend))
+        self.assertEqual(text, "Done.")
+        self.assertEqual(messages[0].parts, [types.Part(text="Let me look."), thought, self.call])
+
+    def test_failed_query_is_rolled_back(self):
+        import interactive_cli
+
+        history = [types.Content(role="user", parts=[types.Part(text="earlier prompt")])]
+        tool_crash = RuntimeError("tool crashed")
+        model_crash = FakeBackend([[self.call]], RuntimeError("quota"))
+        cases = [
+            (tool_crash, lambda messages: interactive_cli.execute_query(
+                "list", messages, backend=FakeBackend([[self.call]]))),
+            (tool_crash, lambda messages: asyncio.run(interactive_cli.execute_query_async(
+                "list", messages, backend=FakeBackend([[self.call]])))),
+            (respond, lambda messages: interactive_cli.execute_query("list", messages, backend=model_crash)),
+        ]
+        for call_function, run in cases:
+            with mock.patch.object(interactive_cli, "call_function", side_effect=call_function), \
+                    mock.patch.object(interactive_cli, "_show_error") as show_error:
+                response, messages = run(list(history))
+            show_error.assert_called_once()
+            self.assertIsNone(response)
+            self.assertEqual(messages, history)
+
+
+
+
+class TestRecordReplay(unittest.TestCase):
+    """Test suite for recording model exchanges and serving them back offline."""
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.scratch.name, "session.jsonl")
+        self.call = types.Part(function_call=types.FunctionCall(name="get_files_info", args={"directory": "."}))
+
+    def tearDown(self):
+        self.scratch.cleanup()
+
+    def turns(self):
+        return [[types.Part(text="Look")], [types.Part(text="ing.")], [self.call]], [[types.Part(text="Done.")]]
+
+    def test_replay_reproduces_a_recorded_session(self):
+        recorder = RecordingBackend(FakeBackend(*self.turns()), self.path)
+        recorded = []
+        self.assertEqual(asyncio.run(run_loop_async(recorded, "model", respond, backend=recorder)), "Done.")
+
+        replay = ReplayBackend(self.path)
+        streamed, blocking = [], []
+        self.assertEqual(asyncio.run(run_loop_async(streamed, "model", respond, backend=replay)), "Done.")
+        replay.reset()
+        self.assertEqual(run_loop(blocking, "model", respond, backend=replay), "Done.")
+        self.assertEqual(streamed, recorded)
+        self.assertEqual(blocking, recorded)
+        with self.assertRaisesRegex(RuntimeError, "exhausted after 2"):
+            replay.generate_content("model", [], None)
+
+    def test_blocking_calls_are_recorded_whole(self):
+        recorder = RecordingBackend(FakeBackend(*self.turns()), self.path)
+        run_loop([], "model", respond, backend=recorder)
+        with open(self.path, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([sorted(record) for record in records], [["contents", "model", "response"]] * 2)
+        self.assertEqual(len(records[1]["contents"]), 2)  # the call and its result
+        replay = ReplayBackend(records=records, latency=0.05)
+        started = time.monotonic()
+        self.assertEqual(replay.generate_content("model", [], None).function_calls[0].name, "get_files_info")
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+
+    def test_environment_selects_replay(self):
+        RecordingBackend(FakeBackend(*self.turns()), self.path).generate_content("model", [], None)
+        with mock.patch.object(backends, "_backend", None), \
+                mock.patch.dict(os.environ, {"AGENT_REPLAY": self.path, "AGENT_REPLAY_LATENCY": "0.5"}):
+            backend = backends.get_backend()
+            self.assertIs(backends.get_backend(), backend)
+        self.assertIsInstance(backend, ReplayBackend)
+        self.assertEqual((len(backend.records), backend.latency), (1, 0.5))
+
+
+def usage_record(usage, *parts):
+    """A recorded blocking response with ``(prompt, response)`` token counts."""
+    content = types.Content(role="model", parts=list(parts))
+    response = types.GenerateContentResponse(
+        candidates=[types.Candidate(content=content)],
+        usage_metadata=types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=usage[0], candidates_token_count=usage[1]),
+    )
+    return {"response": response.model_dump(mode="json", exclude_none=True)}
+
+
+class TestTracing(unittest.TestCase):
+    """Test suite for spans and token accounting across loop iterations."""
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.trace_path = os.path.join(self.scratch.name, "trace.jsonl")
+        self.tracer = Tracer(export_path=self.trace_path)
+        patcher = mock.patch("core.tracing.TRACER", self.tracer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        call = types.Part(function_call=types.FunctionCall(name="get_files_info", args={"directory": "functions"}))
+        self.records = [usage_record((10, 3), call), usage_record((20, 5), types.Part(text="Done."))]
+
+    def tearDown(self):
+        self.scratch.cleanup()
+
+    def run_query(self, prompt):
+        self.tracer.start_query(prompt)
+        run_loop([], "model", lambda part: execute_tool(part)[0], backend=ReplayBackend(records=self.records))
+        return self.tracer.finish_query()
+
+    def test_usage_is_summed_over_iterations(self):
+        first = self.run_query("list functions")
+        self.assertEqual([(span.kind, span.name) for span in first.spans],
+                         [("model", "generate_content"), ("tool", "get_files_info"), ("model", "generate_content")])
+        self.assertEqual((first.totals.model_calls, first.totals.prompt_tokens, first.totals.response_tokens,
+                          first.totals.tool_calls), (2, 30, 8, 1))
+        self.assertGreater(first.spans[1].attributes["result_chars"], 0)
+        self.assertIn("Tokens: 30 prompt + 8 response this query; 30 prompt + 8 response this session",
+                      format_summary(first))
+
+        second = self.run_query("again")
+        self.assertEqual((second.totals.prompt_tokens, second.session.prompt_tokens), (30, 60))
+        with open(self.trace_path, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([record["query"] for record in records], [1] * 4 + [2] * 4)
+        self.assertEqual(records[3]["kind"], "query")
+        self.assertEqual(records[3]["attributes"]["prompt_tokens"], 30)
+
+    def test_isolated_queries_keep_their_own_spans(self):
+        async def query(name, delay):
+            self.tracer.start_query(name, isolated=True)
+            with self.tracer.span("tool", name):
+                await asyncio.sleep(delay)
+            self.tracer.event("retry", "model")
+            return self.tracer.finish_query()
+
+        async def both():
+            return await asyncio.gather(query("first", 0.02), query("second", 0.01))
+
+        traces = asyncio.run(both())
+        for trace, name in zip(traces, ("first", "second")):
+            self.assertEqual([span.name for span in trace.spans], [name, "model"])
+            self.assertEqual((trace.totals.tool_calls, trace.totals.retries), (1, 1))
+        self.assertEqual(traces[0].session.retries, 2)  # "first" finishes last
+
+
+class TestLazyCore(unittest.TestCase):
+    """Test suite for the lazily built tool table and config shared by the entry points."""
+
+    PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def imported_after(self, code):
+        probe = (f"import sys; {code}; "
+                 "print(*sorted(name for name in sys.modules if name.startswith(('google', 'functions.'))))")
+        result = subprocess.run([sys.executable, "-c", probe], cwd=self.PROJECT_ROOT,
+                                capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return result.stdout.split()
+
+    def test_entry_points_import_no_client_or_tools(self):
+        self.assertEqual(self.imported_after("import interactive_cli"), [])
+        self.assertEqual(self.imported_after("import main, core.agent"), [])
+
+    def test_tools_and_config_are_built_once(self):
+        tools = agent.get_tools()
+        self.assertIs(agent.get_tools(), tools)
+        self.assertEqual(sorted(tools), ["edit_file", "find_files", "get_file_content", "get_files_info",
+                                         "run_python_file", "run_tests", "search_code", "write_file"])
+        with mock.patch.object(agent, "project_map_text", return_value=""):
+            config = agent.get_config()
+            self.assertIs(agent.get_config(), config)
+        declared = {declaration.name for declaration in config.tools[0].function_declarations}
+        self.assertEqual(declared, set(tools))
+        self.assertEqual(config.system_instruction, agent.SYSTEM_PROMPT)
+
+    def test_unknown_tool_is_reported_to_the_model(self):
+        content, cache_hit = execute_tool(types.FunctionCall(name="delete_everything", args={}))
+        self.assertFalse(cache_hit)
+        self.assertEqual(content.parts[0].function_response.response,
+                         {"error": "Unknown function: delete_everything"})
+
+
+class FakeCacheApi:
+    """Cached-content calls of ``GeminiBackend``, kept in memory."""
+
+    def __init__(self, ttl_left=600, fail=False):
+        self.ttl_left = ttl_left
+        self.fail = fail
+        self.created = []
+        self.refreshed = []
+
+    def create_cache(self, model, contents, config, ttl):
+        if self.fail:
+            raise ApiError(500)
+        self.created.append(len(contents))
+        return f"cachedContents/{len(self.created)}", time.time() + self.ttl_left, None
+
+    def refresh_cache(self, name, ttl):
+        self.refreshed.append(name)
+        return time.time() + ttl
+
+    def delete_cache(self, name):
+        pass
+
+
+def text_message(role, text):
+    return types.Content(role=role, parts=[types.Part(text=text)])
+
+
+class TestPromptCache(unittest.TestCase):
+    """Test suite for which prompt prefixes are cached and how requests use them."""
+
+    def setUp(self):
+        self.config = types.GenerateContentConfig(system_instruction="You are a careful agent. " * 40)
+        self.api = FakeCacheApi()
+        self.cache = PromptCache(self.api, min_tokens=100, history_step_chars=2000)
+
+    def test_system_prompt_is_cached_once_and_shared(self):
+        for prompt in ("first session", "second session"):
+            contents = [text_message("user", prompt)]
+            request_contents, request_config, handle = self.cache.prepare("model", contents, self.config)
+            self.assertEqual(request_contents, contents)
+            self.assertEqual(request_config.cached_content, handle.name)
+            self.assertIsNone(request_config.system_instruction)
+        self.assertEqual(self.api.created, [0])
+
+    def test_long_history_gets_a_longer_handle(self):
+        contents = [text_message("user", "read it"), text_message("model", "x" * 3000), text_message("user", "next")]
+        self.cache.prepare("model", contents, self.config)  # the shared system prompt handle first
+        request_contents, _, handle = self.cache.prepare("model", contents, self.config)
+        self.assertEqual(self.api.created, [0, 2])
+        self.assertEqual((handle.prefix_len, request_contents), (2, contents[2:]))
+        # A later turn of the same conversation starts from the longer handle
+        longer = contents + [text_message("model", "ok"), text_message("user", "more")]
+        self.assertEqual(self.cache.prepare("model", longer, self.config)[0], longer[2:])
+        self.assertEqual(len(self.api.created), 2)
+
+    def test_small_prompts_and_failures_are_sent_in_full(self):
+        small = types.GenerateContentConfig(system_instruction="Be brief.")
+        contents = [text_message("user", "hi")]
+        self.assertEqual(self.cache.prepare("model", contents, small), (contents, small, None))
+
+        failing = PromptCache(FakeCacheApi(fail=True), min_tokens=100)
+        self.assertIsNone(failing.prepare("model", contents, self.config)[2])
+        self.assertIsNone(failing.prepare("model", contents, self.config)[2])
+        self.assertEqual(failing.failures, 1)  # no new attempt until the retry delay passes
+
+    def test_handle_close_to_expiry_is_refreshed(self):
+        cache = PromptCache(FakeCacheApi(ttl_left=30), min_tokens=100)
+        contents = [text_message("user", "hi")]
+        handle = cache.prepare("model", contents, self.config)[2]
+        self.assertIs(cache.prepare("model", contents, self.config)[2], handle)
+        self.assertEqual((cache.api.refreshed, cache.refreshed), ([handle.name], 1))
+
+    def test_rejected_handle_falls_back_to_a_full_request(self):
+        class Inner(FakeBackend):
+            def __init__(self, *turns):
+                super().__init__(*turns)
+                self.configs = []
+
+            def generate_content(self, model, contents, config):
+                self.configs.append(config)
+                if config.cached_content:
+                    raise ApiError(404)
+                return super().generate_content(model, contents, config)
+
+            async def generate_content_stream(self, model, contents, config):
+                self.configs.append(config)
+                if config.cached_content:
+                    raise ApiError(404)
+                async for chunk in super().generate_content_stream(model, contents, config):
+                    yield chunk
+
+        async def stream(backend):
+            return [chunk async for chunk in backend.generate_content_stream("model", contents, self.config)]
+
+        contents = [text_message("user", "hi")]
+        inner = Inner([[types.Part(text="one")]], [[types.Part(text="two")]], [[types.Part(text="three")]])
+        backend = CachingBackend(inner, self.cache)
+        self.assertEqual(backend.generate_content("model", contents, self.config).text, "one")
+        # Caching pauses after a rejection
+        self.assertEqual(backend.generate_content("model", contents, self.config).text, "two")
+        backend = CachingBackend(inner, PromptCache(FakeCacheApi(), min_tokens=100))
+        self.assertEqual(asyncio.run(stream(backend))[0].text, "three")
+        self.assertEqual([config.cached_content for config in inner.configs],
+                         ["cachedContents/1", None, None, "cachedContents/1", None])
+        self.assertEqual((self.cache.failures, backend.cache.failures), (1, 1))
+
+    def test_cached_tokens_are_reported_by_the_server(self):
+        from google import genai
+
+        from benchmarks.fake_server import FakeGeminiServer
+
+        server = FakeGeminiServer(cache_min_tokens=100)
+        client = genai.Client(api_key="fake", http_options=types.HttpOptions(base_url=server.start()))
+        try:
+            gemini = GeminiBackend(client)
+            backend = CachingBackend(gemini, PromptCache(gemini, min_tokens=100))
+            response = backend.generate_content("gemini-test", [text_message("user", "hi")], self.config)
+        finally:
+            server.stop()
+        self.assertEqual(server.cache_hits, 1)
+        self.assertGreater(response.usage_metadata.cached_content_token_count, 0)
+
+
+class TestPrefetch(unittest.TestCase):
+    """Test suite for predicting, serving and dropping prefetched reads."""
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.root = self.scratch.name
+        for rel_path, content in (("pkg/shapes.py", "AREA = 1\n"), ("pkg/test_shapes.py", "import shapes\n"),
+                                  ("pkg/colors.py", "RED = 1\n"), ("tests.py", "")):
+            os.makedirs(os.path.dirname(os.path.join(self.root, rel_path)), exist_ok=True)
+            with open(os.path.join(self.root, rel_path), "w", encoding="utf-8") as f:
+                f.write(content)
+        self.prefetcher = Prefetcher(enabled=True)
+        self.tools = agent.get_tools()
+
+    def tearDown(self):
+        self.scratch.cleanup()
+
+    def args(self, **args):
+        return dict(args, working_directory=self.root)
+
+    def observe(self, name, **args):
+        args = self.args(**args)
+        self.prefetcher.observe(name, args, self.tools[name](**args), self.tools)
+
+    def test_predictions(self):
+        found = find_files(self.root, filename="colors.py")
+        self.assertEqual(predict("find_files", self.args(filename="colors.py"), found),
+                         [("get_file_content", self.args(file_path=os.path.join("pkg", "colors.py")))])
+        self.assertEqual(predict("find_files", self.args(pattern="py"), find_files(self.root, pattern="py")), [])
+        written = "Successfully wrote"
+        self.assertEqual(predict("write_file", self.args(file_path="pkg/shapes.py"), written),
+                         [("get_file_content", self.args(file_path=os.path.join("pkg", "test_shapes.py")))])
+        self.assertEqual(predict("edit_file", self.args(file_path="pkg/colors.py"), written),
+                         [("get_file_content", self.args(file_path="tests.py"))])
+        self.assertEqual(predict("write_file", self.args(file_path="pkg/test_shapes.py"), written), [])
+        self.assertEqual(predict("write_file", self.args(file_path="pkg/shapes.py"), "Error: disk full"), [])
+
+    def test_predicted_read_is_served_once(self):
+        self.observe("find_files", filename="colors.py")
+        hit, result, _ = self.prefetcher.take("get_file_content", self.args(file_path="colors.py"))
+        self.assertTrue(hit)
+        self.assertEqual(result, get_file_content(self.root, "pkg/colors.py"))
+        self.assertFalse(self.prefetcher.take("get_file_content", self.args(file_path="colors.py"))[0])
+        self.assertFalse(self.prefetcher.take("get_file_content", self.args(file_path="pkg/shapes.py"))[0])
+        self.assertTrue(self.prefetcher.stats().startswith("1 prefetched, 1 hit(s) (100%), 0 unused"))
+
+    def test_changes_drop_prefetched_reads(self):
+        self.observe("find_files", filename="colors.py")
+        self.observe("write_file", file_path="pkg/shapes.py", content="AREA = 2\n")
+        self.assertFalse(self.prefetcher.take("get_file_content", self.args(file_path="pkg/colors.py"))[0])
+        # The write predicted its tests; an outside edit to them since changes the key
+        test_path = os.path.join(self.root, "pkg", "test_shapes.py")
+        self.prefetcher._entries[next(iter(self.prefetcher._entries))].future.result()
+        with open(test_path, "a", encoding="utf-8") as f:
+            f.write("import colors\n")
+        self.assertFalse(self.prefetcher.take("get_file_content", self.args(file_path="pkg/test_shapes.py"))[0])
+
+        expired = Prefetcher(enabled=True, ttl=0)
+        args = self.args(filename="colors.py")
+        expired.observe("find_files", args, find_files(**args), self.tools)
+        self.assertFalse(expired.take("get_file_content", self.args(file_path="pkg/colors.py"))[0])
+        self.assertEqual((expired.prefetched, expired.unused), (1, 1))
+
+class TestBatch(unittest.TestCase):
+    """Test suite for how batch mode records each task."""
+
+    def test_crashing_task_is_recorded_as_error(self):
+        async def run_loop(messages, model, call_function, backend=None):
+            if "crash" in messages[0].parts[0].text:
+                raise RuntimeError("tracer broke")
+            return "Done."
+
+        output = io.StringIO()
+        with mock.patch("core.agent.run_loop_async", run_loop):
+            counts = asyncio.run(run_tasks([("1", "crash"), ("2", "fine")], output, backend=object()))
+        self.assertEqual(counts, {"ok": 1, "max_iterations": 0, "error": 1})
+        records = {record["id"]: record for record in map(json.loads, output.getvalue().splitlines())}
+        self.assertEqual(records["1"]["error"], "RuntimeError: tracer broke")
+        self.assertEqual(records["2"]["text"], "Done.")
+
+
+class ApiError(Exception):
+    def __init__(self, code, headers=None, details=None):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+        self.response = SimpleNamespace(headers=headers) if headers is not None else None
+        self.details = details
+
+
+class TestRetry(unittest.TestCase):
+    """Test suite for retry decisions, rate limiting and retried model calls."""
+
+    def test_retry_after_sources(self):
+        retry_info = [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "7s"}]
+        http_date = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 60))
+        self.assertEqual(retry_after(ApiError(429, headers={"retry-after": "3"})), 3.0)
+        self.assertAlmostEqual(retry_after(ApiError(429, headers={"retry-after": http_date})), 60, delta=2)
+        self.assertEqual(retry_after(ApiError(429, details={"error": {"details": retry_info}})), 7.0)
+        self.assertEqual(retry_after(ApiError(429, details={"details": retry_info})), 7.0)
+        self.assertIsNone(retry_after(ApiError(429, details={"error": "quota exceeded"})))
+        self.assertIsNone(retry_after(ApiError(429, headers={"retry-after": "soon"})))
+
+    def test_policy_retries_transient_errors_only(self):
+        policy = RetryPolicy(max_retries=2, base_delay=0.01, max_delay=5)
+        self.assertIsNotNone(policy.delay(ApiError(503), 0))
+        self.assertIsNone(policy.delay(ApiError(400), 0))
+        self.assertIsNone(policy.delay(ApiError(503), 2))
+        self.assertEqual(policy.delay(ApiError(429, headers={"retry-after": "3"}), 0), 3.0)
+        self.assertEqual(policy.delay(ApiError(429, headers={"retry-after": "60"}), 0), 5)
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(per_minute=60, burst=2)
+        self.assertEqual([bucket.reserve() for _ in range(2)], [0.0, 0.0])
+        self.assertAlmostEqual(bucket.reserve(), 1.0, delta=0.05)
+        self.assertAlmostEqual(bucket.reserve(), 2.0, delta=0.05)
+        unlimited = TokenBucket(per_minute=0)
+        unlimited.pause(5)
+        self.assertAlmostEqual(unlimited.reserve(), 5.0, delta=0.05)
+
+    def test_resilient_backend_retries_then_succeeds(self):
+        from google import genai
+
+        from benchmarks.fake_server import FakeGeminiServer
+
+        server = FakeGeminiServer(fail_every=2, status=503, retry_after=0)
+        client = genai.Client(api_key="fake", http_options=types.HttpOptions(base_url=server.start()))
+        try:
+            backend = ResilientBackend(GeminiBackend(client), RetryPolicy(base_delay=0.01),
+                                       TokenBucket(per_minute=0), timeout=30)
+            contents = [types.Content(role="user", parts=[types.Part(text="hello")])]
+            config = types.GenerateContentConfig()
+            for _ in range(2):
+                response = backend.generate_content("gemini-test", contents, config)
+                self.assertEqual(response.text, "Hello from the fake server.")
+        finally:
+            server.stop()
+        self.assertEqual((server.requests, server.failures), (3, 1))
+
+
+class TestRepoMap(unittest.TestCase):
+    """Test suite for when the project map is rebuilt."""
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.root = self.scratch.name
+        self.path = os.path.join(self.root, "tool.py")
+        self.write("def first():\n    pass\n", mtime=1_000_000)
+        self.repo_map = RepoMap(self.root)
+
+    def tearDown(self):
+        self.scratch.cleanup()
+
+    def write(self, content, mtime):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.utime(self.path, (mtime, mtime))
+
+    def test_outside_edit_waits_for_the_interval(self):
+        self.assertTrue(self.repo_map.refresh())
+        self.write("def first():\n    pass\n\n\ndef second():\n    pass\n", mtime=2_000_000)
+        self.assertFalse(self.repo_map.refresh())
+        self.assertNotIn("second", self.repo_map.render())
+        with mock.patch.object(repo_map, "REPO_MAP_REFRESH_INTERVAL", 0):
+            self.assertTrue(self.repo_map.refresh())
+        self.assertIn("def second()", self.repo_map.render())
+
+    def test_index_change_refreshes_at_once(self):
+        self.repo_map.refresh()
+        self.write("def renamed():\n    pass\n", mtime=2_000_000)
+        FileIndex.notify_changed(self.root, self.path)
+        self.assertTrue(self.repo_map.refresh())
+        self.assertEqual(self.repo_map.parsed, 1)
+        self.assertIn("def renamed()", self.repo_map.render())
+
+    def test_config_is_rebuilt_only_when_the_map_text_changes(self):
+        maps = iter(["MAP A", "MAP A", "MAP B"])
+        with mock.patch.object(agent, "_config", None), mock.patch.object(agent, "_config_map", None), \
+                mock.patch.object(agent, "project_map_text", lambda: next(maps)):
+            first, second, third = agent.get_config(), agent.get_config(), agent.get_config()
+        self.assertIs(first, second)
+        self.assertIsNot(second, third)
+        self.assertIn("MAP B", third.system_instruction)
+
+if __name__ == "__main__":
+    unittest.main()
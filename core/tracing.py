@@ -0,0 +1,234 @@
+"""Tracing spans and token/latency accounting for the agent loops.
+
+Every model call and tool call is recorded as a ``Span`` (kind, name, start,
+duration and free-form attributes such as token counts, argument and result
+sizes or cache hits). Spans are grouped per query; ``Tracer.finish_query``
+returns the query's spans plus running totals for the whole session, and
+appends the spans to a JSON Lines file when ``AGENT_TRACE`` names one.
+``format_summary`` turns a finished query into a small table.
+
+Token counts come from each response's ``usage_metadata``, so usage is
+summed over all iterations rather than taken from the last response.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+
+TRACE_FILE = os.environ.get("AGENT_TRACE")
+
+
+@dataclass
+class Span:
+    kind: str  # "model", "tool", "retry", ...
+    name: str
+    start: float  # seconds since the query started
+    duration: float
+    attributes: dict = field(default_factory=dict)
+
+
+@dataclass
+class UsageTotals:
+    model_calls: int = 0
+    prompt_tokens: int = 0
+    response_tokens: int = 0
+    cached_tokens: int = 0
+    model_time: float = 0.0
+    tool_calls: int = 0
+    tool_time: float = 0.0
+    cache_hits: int = 0
+    prefetch_hits: int = 0
+    prefetch_saved: float = 0.0
+    retries: int = 0
+
+    def add_span(self, span):
+        if span.kind == "model":
+            self.model_calls += 1
+            self.model_time += span.duration
+            self.prompt_tokens += span.attributes.get("prompt_tokens", 0)
+            self.response_tokens += span.attributes.get("response_tokens", 0)
+            self.cached_tokens += span.attributes.get("cached_tokens", 0)
+        elif span.kind == "tool":
+            self.tool_calls += 1
+            self.tool_time += span.duration
+            self.cache_hits += bool(span.attributes.get("cache_hit"))
+            self.prefetch_hits += bool(span.attributes.get("prefetch_hit"))
+            self.prefetch_saved += span.attributes.get("prefetch_saved", 0.0)
+        elif span.kind == "retry":
+            self.retries += 1
+
+
+@dataclass
+class QueryTrace:
+    prompt: str
+    wall_time: float
+    spans: list
+    totals: UsageTotals
+    session: UsageTotals
+
+
+def usage_attributes(usage_metadata):
+    """Token counts from a response's ``usage_metadata`` as span attributes."""
+    if usage_metadata is None:
+        return {}
+    return {
+        "prompt_tokens": usage_metadata.prompt_token_count or 0,
+        "response_tokens": usage_metadata.candidates_token_count or 0,
+        "cached_tokens": usage_metadata.cached_content_token_count or 0,
+    }
+
+
+class _Query:
+    def __init__(self, prompt, number):
+        self.prompt = prompt
+        self.number = number
+        self.start = time.perf_counter()
+        self.spans = []
+
+
+# Set by ``start_query(..., isolated=True)``; None means the tracer's shared query
+_current_query = contextvars.ContextVar("agent_trace_query", default=None)
+
+
+class Tracer:
+    """Collects spans for the current query and totals for the session.
+
+    Safe to use from the tool worker threads. Normally one query runs at a
+    time; batch runs trace several at once with ``isolated=True``, which
+    binds a query to the calling context (an asyncio task or a thread, and
+    the tool calls it dispatches).
+    """
+
+    def __init__(self, export_path=TRACE_FILE):
+        self.export_path = export_path
+        self.session = UsageTotals()
+        self._lock = threading.Lock()
+        self._query = _Query("", 0)
+        self._query_count = 0
+
+    def start_query(self, prompt, isolated=False):
+        with self._lock:
+            self._query_count += 1
+            query = _Query(prompt, self._query_count)
+            if not isolated:
+                self._query = query
+        if isolated:
+            _current_query.set(query)
+
+    def _current(self):
+        return _current_query.get() or self._query
+
+    @contextmanager
+    def span(self, kind, name, **attributes):
+        """Time the enclosed block; attributes may be added to the yielded dict."""
+        query = self._current()
+        start = time.perf_counter()
+        try:
+            yield attributes
+        except BaseException as e:
+            attributes["error"] = type(e).__name__
+            raise
+        finally:
+            self._add(query, Span(kind, name, start - query.start, time.perf_counter() - start, attributes))
+
+    def event(self, kind, name, **attributes):
+        """Record an instantaneous span, e.g. a retry."""
+        query = self._current()
+        self._add(query, Span(kind, name, time.perf_counter() - query.start, 0.0, attributes))
+
+    def _add(self, query, span):
+        with self._lock:
+            query.spans.append(span)
+            self.session.add_span(span)
+
+    def finish_query(self):
+        """Close the current query, export its spans and return a ``QueryTrace``."""
+        query = self._current()
+        if query is _current_query.get():
+            _current_query.set(None)
+        with self._lock:
+            spans = sorted(query.spans, key=lambda span: span.start)
+            query.spans = []
+            trace = QueryTrace(
+                prompt=query.prompt,
+                wall_time=time.perf_counter() - query.start,
+                spans=spans,
+                totals=UsageTotals(),
+                session=UsageTotals(**asdict(self.session)),
+            )
+        for span in spans:
+            trace.totals.add_span(span)
+        if self.export_path:
+            self._export(trace, query.number)
+        return trace
+
+    def _export(self, trace, query):
+        with self._lock:
+            with open(self.export_path, "a", encoding="utf-8") as f:
+                for span in trace.spans:
+                    record = {"query": query, **asdict(span)}
+                    f.write(json.dumps(record, default=str) + "\n")
+                summary = {"query": query, "kind": "query", "name": trace.prompt[:200], "start": 0.0,
+                           "duration": trace.wall_time, "attributes": asdict(trace.totals)}
+                f.write(json.dumps(summary) + "\n")
+
+
+def format_summary(trace):
+    """Render a finished query as a per-name table followed by totals.
+
+    The in/out columns are tokens for model spans and characters (arguments,
+    result) for tool spans. Tool time is summed, so it can exceed wall time
+    when calls run concurrently.
+    """
+    rows = {}
+    for span in trace.spans:
+        row = rows.setdefault((span.kind, span.name), [0, 0.0, 0, 0])
+        row[0] += 1
+        row[1] += span.duration
+        if span.kind == "model":
+            row[2] += span.attributes.get("prompt_tokens", 0)
+            row[3] += span.attributes.get("response_tokens", 0)
+        else:
+            row[2] += span.attributes.get("args_chars", 0)
+            row[3] += span.attributes.get("result_chars", 0)
+
+    lines = [f"{'span':<32} {'count':>5} {'total ms':>10} {'avg ms':>9} {'in':>9} {'out':>9}"]
+    for (kind, name), (count, duration, size_in, size_out) in sorted(
+        rows.items(), key=lambda item: -item[1][1]
+    ):
+        lines.append(
+            f"{kind + ':' + name:<32} {count:>5} {duration * 1000:>10.1f} "
+            f"{duration * 1000 / count:>9.1f} {size_in:>9} {size_out:>9}"
+        )
+
+    totals = trace.totals
+    session = trace.session
+    other = max(0.0, trace.wall_time - totals.model_time - totals.tool_time)
+    lines.append(
+        f"Query: {trace.wall_time * 1000:.0f} ms wall "
+        f"(model {totals.model_time * 1000:.0f} ms, tools {totals.tool_time * 1000:.0f} ms, "
+        f"other {other * 1000:.0f} ms); {totals.model_calls} model call(s), "
+        f"{totals.tool_calls} tool call(s), {totals.cache_hits} cache hit(s), {totals.retries} retry(ies)"
+    )
+    lines.append(
+        f"Tokens: {totals.prompt_tokens} prompt + {totals.response_tokens} response this query; "
+        f"{session.prompt_tokens} prompt + {session.response_tokens} response this session"
+    )
+    if session.cached_tokens:
+        lines.append(
+            f"Prompt cache: {totals.cached_tokens} of this query's prompt tokens "
+            f"({session.cached_tokens} this session) were served from cached content"
+        )
+    if session.prefetch_hits:
+        lines.append(
+            f"Prefetch: {totals.prefetch_hits} call(s) served from prefetched results, "
+            f"{totals.prefetch_saved * 1000:.0f} ms of tool time saved this query "
+            f"({session.prefetch_hits} call(s), {session.prefetch_saved * 1000:.0f} ms this session)"
+        )
+    return "\n".join(lines)
+
+
+TRACER = Tracer()
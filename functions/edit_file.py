@@ -0,0 +1,179 @@
+"""Targeted edits to an existing file.
+
+Instead of re-sending a whole file through ``write_file``, the model sends
+a list of hunks. Each hunk is either
+
+- ``{"search": "...", "replace": "..."}``: replace the one exact occurrence
+  of ``search`` (it must match exactly once), or
+- ``{"start_line": s, "end_line": e, "replace": "..."}``: replace lines
+  s..e (1-based, inclusive). ``end_line = start_line - 1`` inserts before
+  ``start_line`` without removing anything.
+
+All hunks are located against the original file and checked for overlaps
+before anything is changed, so an edit is applied completely or not at all.
+The result is written atomically and summarized as a compact diff.
+"""
+import os
+
+from functions.file_index import FileIndex
+from functions.results import resolve_path
+from functions.write_file import atomic_write
+
+MAX_DIFF_LINES_PER_HUNK = 8
+MAX_DIFF_LINE_CHARS = 160
+
+
+def edit_file(working_directory, file_path, edits):
+    try:
+        working_directory = os.path.abspath(working_directory)
+        full_path = os.path.abspath(os.path.join(working_directory, file_path))
+
+        if not full_path.startswith(working_directory):
+            return f'Error: Cannot edit "{file_path}" as it is outside the project root'
+
+        # Resolve a bare file name the same way the other tools do
+        if not os.path.exists(full_path) and os.sep not in file_path:
+            resolution = resolve_path(working_directory, file_path)
+            if len(resolution.candidates) > 1:
+                return (f'Error: "{file_path}" is ambiguous, use one of: '
+                        + ", ".join(resolution.candidates[:10]))
+            if resolution.found:
+                file_path = resolution.path
+                full_path = resolution.full_path
+
+        if not os.path.isfile(full_path):
+            return f'Error: File "{file_path}" not found. Use write_file to create new files.'
+        if not edits:
+            return "Error: edits must contain at least one hunk"
+
+        with open(full_path, "r", encoding="utf-8", newline="") as f:
+            content = f.read()
+
+        hunks = []
+        for number, edit in enumerate(edits, start=1):
+            span = _locate(content, dict(edit))
+            if isinstance(span, str):
+                return f'Error: hunk {number} in "{file_path}": {span}. No changes were made.'
+            hunks.append(span + (number,))
+
+        # Same-offset insertions apply in the order they were given.
+        hunks.sort(key=lambda hunk: (hunk[0], hunk[1], hunk[3]))
+        for previous, current in zip(hunks, hunks[1:]):
+            if current[0] < previous[1]:
+                return (f'Error: hunks {previous[3]} and {current[3]} in "{file_path}" overlap. '
+                        "No changes were made.")
+
+        pieces = []
+        summary = []
+        position = 0
+        removed = added = 0
+        for start, end, replacement, _ in hunks:
+            pieces.append(content[position:start])
+            pieces.append(replacement)
+            position = end
+            diff, old_count, new_count = _describe(content, start, end, replacement, added - removed)
+            summary.append(diff)
+            removed += old_count
+            added += new_count
+        pieces.append(content[position:])
+        new_content = "".join(pieces)
+
+        if new_content == content:
+            return f'No changes: the edits leave "{file_path}" unchanged'
+
+        atomic_write(full_path, new_content)
+        FileIndex.notify_changed(working_directory, full_path)
+
+        header = f'Successfully edited "{file_path}" ({len(hunks)} hunk(s), +{added} -{removed} lines)'
+        return "\n".join([header] + summary)
+
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def _locate(content, edit):
+    """Return ``(start, end, replacement)`` offsets for one hunk, or an error string."""
+    replacement = edit.get("replace")
+    if replacement is None:
+        return "missing 'replace'"
+    replacement = str(replacement)
+
+    search = edit.get("search")
+    if search is not None and search != "":
+        search = str(search)
+        count = content.count(search)
+        if count == 0 and "\r\n" in content and "\r\n" not in search:
+            # The model writes "\n"; match a CRLF file the same way
+            search = search.replace("\n", "\r\n")
+            replacement = replacement.replace("\r\n", "\n").replace("\n", "\r\n")
+            count = content.count(search)
+        if count == 0:
+            return "search text not found (it must match the file exactly, including indentation)"
+        if count > 1:
+            return f"search text matches {count} times; include more surrounding lines to make it unique"
+        start = content.index(search)
+        return start, start + len(search), replacement
+
+    if edit.get("start_line") is None:
+        return "needs either 'search' or 'start_line'"
+    start_line = int(edit["start_line"])
+    end_line = int(edit.get("end_line", start_line))
+    line_starts = _line_starts(content)
+    total_lines = len(line_starts) - (1 if content.endswith("\n") or not content else 0)
+    if start_line < 1 or start_line > total_lines + 1:
+        return f"start_line {start_line} is outside the file (1-{total_lines})"
+    if end_line < start_line - 1 or end_line > total_lines:
+        return f"end_line {end_line} is invalid for start_line {start_line} (file has {total_lines} lines)"
+
+    start = line_starts[start_line - 1] if start_line - 1 < len(line_starts) else len(content)
+    end = line_starts[end_line] if end_line < len(line_starts) else len(content)
+    if replacement and not replacement.endswith("\n") and (end < len(content) or content.endswith("\n")):
+        replacement += "\n"  # keep the line break the replaced lines ended with
+    if start == len(content) and content and not content.endswith("\n") and replacement:
+        replacement = "\n" + replacement  # appending after a last line with no newline
+    return start, end, replacement
+
+
+def _line_starts(content):
+    starts = [0]
+    index = content.find("\n")
+    while index != -1:
+        starts.append(index + 1)
+        index = content.find("\n", index + 1)
+    return starts
+
+
+def _describe(content, start, end, replacement, line_delta):
+    """Render one hunk as a ``@@ -a,n +b,m @@`` block over the whole lines it touches.
+
+    Returns ``(text, old_line_count, new_line_count)``.
+    """
+    if start == end and (start == 0 or content[start - 1] == "\n"):
+        line_start = line_end = start  # pure insertion between lines
+    else:
+        line_start = content.rfind("\n", 0, start) + 1
+        line_end = content.find("\n", end - 1 if end > start else start)
+        line_end = len(content) if line_end == -1 else line_end + 1
+    old_lines = content[line_start:line_end].splitlines()
+    new_lines = (content[line_start:start] + replacement + content[end:line_end]).splitlines()
+
+    old_first = content.count("\n", 0, line_start) + 1
+    new_first = old_first + line_delta
+    lines = [f"@@ -{old_first},{len(old_lines)} +{new_first},{len(new_lines)} @@"]
+    lines.extend(_clip_block("-", old_lines))
+    lines.extend(_clip_block("+", new_lines))
+    return "\n".join(lines), len(old_lines), len(new_lines)
+
+
+def _clip_block(sign, lines):
+    shown = [sign + _clip(line) for line in lines[:MAX_DIFF_LINES_PER_HUNK]]
+    if len(lines) > MAX_DIFF_LINES_PER_HUNK:
+        shown.append(f"{sign}... ({len(lines) - MAX_DIFF_LINES_PER_HUNK} more lines)")
+    return shown
+
+
+def _clip(line):
+    if len(line) > MAX_DIFF_LINE_CHARS:
+        return line[:MAX_DIFF_LINE_CHARS] + "..."
+    return line
+
@@ -0,0 +1,423 @@
+"""Persistent, incrementally refreshed index of the project's file names.
+
+The index keeps, for every non-ignored directory, its mtime plus the files and
+subdirectories it contained when last scanned. From that it derives:
+
+- a ``name -> [relative paths]`` map for exact (case-insensitive) lookups
+- a newline-joined blob of unique lowercase names for substring lookups
+- a log of names in the order they first appeared, from which the ranked
+  query engine (functions/path_query.py) updates its trigram index; it is
+  compacted once vanished and repeated names make up half of it
+
+The directory table is persisted to ``.kodex_cache/file_index.json`` under the
+project root, so a new process starts warm. On refresh only directories whose
+mtime changed are rescanned. When the optional ``watchdog`` package is
+installed, filesystem events mark directories dirty and the mtime sweep is
+skipped entirely.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+
+IGNORED_DIRS = frozenset([
+    '__pycache__', '.git', 'node_modules', '.venv', 'venv', '.pytest_cache',
+    '__pypackages__', 'dist', 'build', '.egg-info', '.kodex_cache',
+])
+
+CACHE_DIR_NAME = ".kodex_cache"
+INDEX_FILE_NAME = "file_index.json"
+INDEX_VERSION = 1
+
+# Without a watcher, the mtime sweep runs at most once per interval (seconds).
+REFRESH_INTERVAL = 1.0
+
+
+class FileIndex:
+    """In-memory file name index for a single project root."""
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def for_root(cls, root):
+        """Return the shared index for ``root``, creating it on first use."""
+        root = os.path.abspath(root)
+        with cls._instances_lock:
+            index = cls._instances.get(root)
+            if index is None:
+                index = cls(root)
+                cls._instances[root] = index
+            return index
+
+    @classmethod
+    def notify_changed(cls, root, path=None):
+        """Tell the index for ``root`` (if loaded) that ``path`` changed.
+
+        With no ``path`` the next lookup performs a full mtime sweep.
+        """
+        index = cls._instances.get(os.path.abspath(root))
+        if index is not None:
+            index.mark_dirty(path)
+
+    def __init__(self, root, cache_path=None, use_watcher=True):
+        self.root = os.path.abspath(root)
+        self.cache_path = cache_path or os.path.join(self.root, CACHE_DIR_NAME, INDEX_FILE_NAME)
+        self.generation = 0
+
+        # rel_dir ("" for root) -> (mtime_ns, [file names], [subdir names])
+        self._dirs = {}
+        self._by_name = {}
+        self._names_changed = True
+        self._names_blob = ""
+        self._name_offsets = []
+        self._name_list = []
+        self._name_log = []
+        self._name_log_epoch = 0  # bumped each time the log is compacted
+
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._last_sweep = 0.0
+        self._dirty = set()
+        self._watcher = self._start_watcher() if use_watcher else None
+
+    # ------------------------------------------------------------------ lookups
+
+    def find_by_name(self, name):
+        """Return relative paths whose base name equals ``name`` (case-insensitive)."""
+        with self._lock:
+            self.refresh()
+            return list(self._by_name.get(name.lower(), ()))
+
+    def find_by_substring(self, text):
+        """Return relative paths whose base name contains ``text`` (case-insensitive)."""
+        with self._lock:
+            return [path for name in self.names_containing(text) for path in self._by_name[name]]
+
+    def names_containing(self, text):
+        """Return the lowercase base names that contain ``text`` (case-insensitive)."""
+        text = text.lower()
+        if not text:
+            return []
+        with self._lock:
+            self.refresh()
+            if self._names_changed:
+                self._rebuild_name_blob()
+            blob = self._names_blob
+            offsets = self._name_offsets
+            names = []
+            start = blob.find(text)
+            while start != -1:
+                i = bisect.bisect_right(offsets, start) - 1
+                name = self._name_list[i]
+                names.append(name)
+                # Continue after the current name so each name is reported once.
+                start = blob.find(text, offsets[i] + len(name) + 1)
+            return names
+
+    def names_matching(self, regex):
+        """Return the lowercase base names in which the compiled ``regex`` matches.
+
+        The pattern is searched in a newline-joined blob of names, so it must
+        not match across a newline.
+        """
+        with self._lock:
+            self.refresh()
+            if self._names_changed:
+                self._rebuild_name_blob()
+            offsets = self._name_offsets
+            names = []
+            last = -1
+            for match in regex.finditer(self._names_blob):
+                i = bisect.bisect_right(offsets, match.start()) - 1
+                if i != last:
+                    names.append(self._name_list[i])
+                    last = i
+            return names
+
+    def paths_for_names(self, names):
+        """Return the relative paths of each lowercase base name in ``names``."""
+        with self._lock:
+            self.refresh()
+            return [list(self._by_name.get(name, ())) for name in names]
+
+    def names_since(self, position):
+        """Return ``(names, position, reset)``: base names first seen since ``position``.
+
+        Names are logged once when they first appear (again if they vanish
+        and come back), so a derived index can catch up incrementally.
+        ``position`` is the value returned by the previous call, or None.
+        When the log was compacted in between, ``reset`` is true and
+        ``names`` holds every current name, so the caller starts over.
+        """
+        with self._lock:
+            self.refresh()
+            end = (self._name_log_epoch, len(self._name_log))
+            if position is None or position[0] != self._name_log_epoch:
+                return list(self._name_log), end, True
+            return self._name_log[position[1]:], end, False
+
+    def all_paths(self):
+        """Return every indexed relative path."""
+        with self._lock:
+            self.refresh()
+            return [path for paths in self._by_name.values() for path in paths]
+
+    # ------------------------------------------------------------------ refresh
+
+    def mark_dirty(self, path=None):
+        with self._lock:
+            if path is None:
+                self._last_sweep = 0.0
+                return
+            path = os.path.abspath(path)
+            rel = os.path.relpath(path, self.root)
+            if IGNORED_DIRS.intersection(rel.split(os.sep)):
+                return
+            if os.path.isdir(path):
+                self._dirty.add(path)
+            self._dirty.add(os.path.dirname(path))
+
+    def refresh(self, force=False):
+        """Bring the index up to date with the filesystem."""
+        with self._lock:
+            changed = False
+            if not self._loaded:
+                self._loaded = True
+                if not self._load_cache():
+                    self._scan_tree("")
+                    self._last_sweep = time.monotonic()
+                    self._save_cache()
+                    return
+                # A cached index may be arbitrarily stale: sweep once now.
+                force = True
+
+            if self._dirty:
+                dirty, self._dirty = self._dirty, set()
+                for path in dirty:
+                    changed |= self._rescan_path(path)
+
+            now = time.monotonic()
+            watching = self._watcher is not None
+            if force or (not watching and now - self._last_sweep >= REFRESH_INTERVAL):
+                changed |= self._sweep("")
+                self._last_sweep = now
+
+            if changed:
+                self.generation += 1
+                self._compact_name_log()
+                self._save_cache()
+
+    def _sweep(self, rel_dir):
+        """Rescan every directory under ``rel_dir`` whose mtime changed."""
+        changed = False
+        stack = [rel_dir]
+        while stack:
+            rel = stack.pop()
+            entry = self._dirs.get(rel)
+            if entry is None:
+                continue
+            try:
+                mtime = os.stat(self._abs(rel)).st_mtime_ns
+            except OSError:
+                self._drop_tree(rel)
+                changed = True
+                continue
+            if mtime != entry[0]:
+                self._scan_dir(rel)
+                changed = True
+            stack.extend(self._join(rel, d) for d in self._dirs.get(rel, (0, (), ()))[2])
+        return changed
+
+    def _rescan_path(self, abs_dir):
+        """Rescan the nearest indexed ancestor of ``abs_dir``."""
+        rel = os.path.relpath(abs_dir, self.root)
+        if rel.startswith(os.pardir):
+            return False
+        rel = "" if rel == os.curdir else rel
+        while rel not in self._dirs and rel:
+            rel = os.path.dirname(rel)
+        if rel not in self._dirs:
+            return False
+        self._scan_dir(rel)
+        return True
+
+    def _scan_tree(self, rel_dir):
+        stack = [rel_dir]
+        while stack:
+            rel = stack.pop()
+            subdirs = self._scan_dir(rel, recurse=False)
+            stack.extend(self._join(rel, d) for d in subdirs)
+
+    def _scan_dir(self, rel, recurse=True):
+        """Re-read one directory, updating name maps and child directories.
+
+        Returns the list of subdirectory names. With ``recurse`` newly
+        appeared subdirectories are scanned in full and vanished ones dropped.
+        """
+        path = self._abs(rel)
+        files = []
+        subdirs = []
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            # Like os.walk(followlinks=False): a linked
+                            # directory is neither a file nor descended into
+                            if entry.name not in IGNORED_DIRS and not entry.is_symlink():
+                                subdirs.append(entry.name)
+                        else:
+                            files.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            self._drop_tree(rel)
+            return []
+
+        old = self._dirs.get(rel)
+        old_files = old[1] if old else []
+        old_subdirs = old[2] if old else []
+        for name in old_files:
+            self._remove_name(name, self._join(rel, name))
+        for name in files:
+            self._add_name(name, self._join(rel, name))
+        self._dirs[rel] = (mtime, files, subdirs)
+
+        if recurse:
+            current = set(subdirs)
+            for name in old_subdirs:
+                if name not in current:
+                    self._drop_tree(self._join(rel, name))
+            previous = set(old_subdirs)
+            for name in subdirs:
+                if name not in previous:
+                    self._scan_tree(self._join(rel, name))
+        return subdirs
+
+    def _drop_tree(self, rel_dir):
+        stack = [rel_dir]
+        while stack:
+            rel = stack.pop()
+            entry = self._dirs.pop(rel, None)
+            if entry is None:
+                continue
+            for name in entry[1]:
+                self._remove_name(name, self._join(rel, name))
+            stack.extend(self._join(rel, d) for d in entry[2])
+
+    # ------------------------------------------------------------ name tables
+
+    def _add_name(self, name, rel_path):
+        key = name.lower()
+        paths = self._by_name.get(key)
+        if paths is None:
+            self._by_name[key] = [rel_path]
+            self._names_changed = True
+            self._name_log.append(key)
+        else:
+            paths.append(rel_path)
+
+    def _remove_name(self, name, rel_path):
+        key = name.lower()
+        paths = self._by_name.get(key)
+        if not paths:
+            return
+        try:
+            paths.remove(rel_path)
+        except ValueError:
+            return
+        if not paths:
+            del self._by_name[key]
+            self._names_changed = True
+
+    def _compact_name_log(self):
+        """Drop vanished and repeated names once they make up half the log."""
+        if len(self._name_log) > 2 * len(self._by_name):
+            self._name_log = [name for name in dict.fromkeys(self._name_log) if name in self._by_name]
+            self._name_log_epoch += 1
+
+    def _rebuild_name_blob(self):
+        names = sorted(self._by_name)
+        offsets = []
+        position = 0
+        for name in names:
+            offsets.append(position)
+            position += len(name) + 1
+        self._name_list = names
+        self._name_offsets = offsets
+        self._names_blob = "\n".join(names)
+        self._names_changed = False
+
+    # ------------------------------------------------------------- persistence
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != INDEX_VERSION or data.get("root") != self.root:
+            return False
+        for rel, (mtime, files, subdirs) in data["dirs"].items():
+            self._dirs[rel] = (mtime, files, subdirs)
+            for name in files:
+                self._add_name(name, self._join(rel, name))
+        return True
+
+    def _save_cache(self):
+        data = {
+            "version": INDEX_VERSION,
+            "root": self.root,
+            "dirs": {rel: list(entry) for rel, entry in self._dirs.items()},
+        }
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            # The cache is an optimisation; a read-only project still works.
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    # ----------------------------------------------------------------- watcher
+
+    def _start_watcher(self):
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return None
+
+        index = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                for attr in ("src_path", "dest_path"):
+                    path = getattr(event, attr, None)
+                    if path:
+                        index.mark_dirty(path)
+
+        try:
+            observer = Observer()
+            observer.daemon = True
+            observer.schedule(_Handler(), self.root, recursive=True)
+            observer.start()
+        except Exception:
+            return None
+        return observer
+
+    # ----------------------------------------------------------------- helpers
+
+    def _abs(self, rel):
+        return os.path.join(self.root, rel) if rel else self.root
+
+    @staticmethod
+    def _join(rel, name):
+        return os.path.join(rel, name) if rel else name
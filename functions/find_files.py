@@ -1,67 +1,52 @@
 import os
 
+from functions.path_query import DEFAULT_LIMIT, MAX_LIMIT, PathQuery
+from functions.results import FileMatches
 
-def find_files(working_directory, filename=None, pattern=None):
+
+def find_files(working_directory, filename=None, pattern=None, limit=None):
     """
-    Recursively search for files in the project by exact name or pattern.
-    Returns a list of matching file paths relative to the project root.
-    Case-insensitive matching for better user experience.
+    Search for files in the project by exact name or by a ranked query.
+    Returns a FileMatches of paths relative to the project root, best match
+    first. Case-insensitive matching for better user experience.
+
+    ``pattern`` may be a substring, a glob (``*_test.py``), path segments
+    (``calc/pkg/render``) or a misspelled name; see functions/path_query.py
+    for how matches are scored. At most ``limit`` paths are returned.
+
+    Lookups are served from the project's FileIndex, so repeated searches
+    (and the fallbacks) never walk the tree again.
     """
     try:
+        if not filename and not pattern:
+            return "Please provide either 'filename' or 'pattern' parameter"
+
         working_directory = os.path.abspath(working_directory)
-        matches = []
-        
-        # Walk through all directories
-        for root, dirs, files in os.walk(working_directory):
-            # Skip common directories that should be ignored
-            dirs[:] = [d for d in dirs if d not in ['__pycache__', '.git', 'node_modules', '.venv', 'venv', '.pytest_cache', '__pypackages__', 'dist', 'build', '.egg-info']]
-            
-            for file in files:
-                full_path = os.path.join(root, file)
-                relative_path = os.path.relpath(full_path, working_directory)
-                
-                # Match by filename (case-insensitive)
-                if filename and file.lower() == filename.lower():
-                    matches.append(relative_path)
-                # Match by pattern (case-insensitive substring match)
-                elif pattern and pattern.lower() in file.lower():
-                    matches.append(relative_path)
-        
-        if not matches:
-            # If exact filename search failed, try pattern search as fallback
-            if filename and not pattern:
-                # Try pattern search with just the base name (without extension)
-                base_name = os.path.splitext(filename)[0] if '.' in filename else filename
-                for root, dirs, files in os.walk(working_directory):
-                    dirs[:] = [d for d in dirs if d not in ['__pycache__', '.git', 'node_modules', '.venv', 'venv', '.pytest_cache', '__pypackages__', 'dist', 'build', '.egg-info']]
-                    for file in files:
-                        if base_name.lower() in file.lower():
-                            full_path = os.path.join(root, file)
-                            relative_path = os.path.relpath(full_path, working_directory)
-                            matches.append(relative_path)
-                
-                if matches:
-                    result_lines = [f"Exact match not found, but found {len(matches)} similar file(s):"]
-                    for match in matches:
-                        result_lines.append(f"  - {match}")
-                    return "\n".join(result_lines)
-            
-            if filename:
-                return f'No files found matching "{filename}" (searched case-insensitively)'
-            elif pattern:
-                return f'No files found matching pattern "{pattern}" (searched case-insensitively)'
+        engine = PathQuery.for_root(working_directory)
+        limit = DEFAULT_LIMIT if limit is None else min(max(1, int(limit)), MAX_LIMIT)
+
+        paths, total, similar = [], 0, False
+        if filename:
+            paths, total, _ = engine.exact(filename, limit)
+        if pattern:
+            found, count, similar = engine.search(pattern, limit)
+            if total:
+                # A file matching both is counted once; only past the top-K cut
+                # does that need the full lists
+                exact = paths if total <= len(paths) else engine.exact(filename, total)[0]
+                matched = set(found if count <= len(found) else engine.search(pattern, count)[0])
+                total = count + sum(1 for path in exact if path not in matched)
             else:
-                return "Please provide either 'filename' or 'pattern' parameter"
-        
-        # Sort matches: prioritize shorter paths (likely more relevant)
-        matches.sort(key=lambda x: (len(x.split(os.sep)), x))
-        
-        # Return formatted results
-        result_lines = [f"Found {len(matches)} file(s):"]
-        for match in matches:
-            result_lines.append(f"  - {match}")
-        
-        return "\n".join(result_lines)
-        
+                total = count
+            paths += [path for path in found if path not in paths][:limit - len(paths)]
+
+        if not total and filename and not pattern:
+            # No exact match: rank files whose names contain or resemble it
+            paths, total, _ = engine.search(filename, limit)
+            if total:
+                return FileMatches(paths, filename, pattern, similar=True, total=total)
+
+        return FileMatches(paths, filename, pattern, similar=similar and not filename, total=total)
+
     except Exception as e:
         return f"Error searching for files: {str(e)}"
@@ -1,55 +1,141 @@
+import codecs
 import os
 from functions.config import MAX_FILE_CHARS
+from functions.line_index import get_line_index
+from functions.results import resolve_path
 
+TAIL_BLOCK_BYTES = 64 * 1024
 
-def get_file_content(working_directory, file_path):
+
+def get_file_content(working_directory, file_path, offset=None, length=None,
+                     start_line=None, end_line=None, tail_lines=None):
+    """Read a file, or a window of it.
+
+    With no range arguments the first MAX_FILE_CHARS characters are returned.
+    Otherwise exactly one window is read, and memory use is proportional to
+    the window rather than the file:
+
+    - ``offset``/``length``: a byte range
+    - ``start_line``/``end_line``: a 1-based, inclusive line range
+    - ``tail_lines``: the last N lines
+    """
     try:
-        full_path = os.path.join(working_directory, file_path)
-        full_path = os.path.abspath(full_path)
-        working_directory = os.path.abspath(working_directory)
-        
-        if not full_path.startswith(working_directory):
+        resolution = resolve_path(working_directory, file_path)
+        if resolution.outside:
             return f'Error: Cannot read "{file_path}" as it is outside the project root'
-        
-        # If file doesn't exist at given path, try to find it
-        if not os.path.exists(full_path) or not os.path.isfile(full_path):
-            # Import find_files to search for the file
-            from functions.find_files import find_files
-            
-            # Extract just the filename from the path
+        if not resolution.found:
             filename = os.path.basename(file_path)
-            search_result = find_files(working_directory, filename=filename)
-            
-            # Check if we found the file
-            if search_result.startswith("Found"):
-                # Parse the result to get the first matching path
-                lines = search_result.split('\n')
-                if len(lines) > 1:
-                    # Get the first match (format: "  - path/to/file")
-                    first_match = lines[1].strip().replace('- ', '')
-                    
-                    # Try reading from the found path
-                    full_path = os.path.join(working_directory, first_match)
-                    full_path = os.path.abspath(full_path)
-                    
-                    if os.path.exists(full_path) and os.path.isfile(full_path):
-                        # Success! Continue with reading this file
-                        pass
-                    else:
-                        return f'Error: File not found or is not a regular file: "{file_path}"'
-                else:
-                    return f'Error: File not found or is not a regular file: "{file_path}"'
-            else:
-                return f'Error: File not found or is not a regular file: "{file_path}". Searched entire project but could not locate "{filename}".'
+            return f'Error: File not found or is not a regular file: "{file_path}". Searched entire project but could not locate "{filename}".'
+        full_path = resolution.full_path
+
+        if tail_lines is not None:
+            return _read_tail(full_path, file_path, int(tail_lines))
+        if start_line is not None or end_line is not None:
+            return _read_lines(full_path, file_path, int(start_line or 1),
+                               None if end_line is None else int(end_line))
+        if offset is not None or length is not None:
+            return _read_bytes(full_path, file_path, int(offset or 0),
+                               MAX_FILE_CHARS if length is None else int(length))
         
         with open(full_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+            content = f.read(MAX_FILE_CHARS + 1)
         
         if len(content) > MAX_FILE_CHARS:
             content = content[:MAX_FILE_CHARS]
-            content += f'\n[...File "{file_path}" truncated at {MAX_FILE_CHARS} characters]'
+            content += (
+                f'\n[...File "{file_path}" truncated at {MAX_FILE_CHARS} characters; '
+                f'use start_line/end_line or offset/length to read further]'
+            )
         
         return content
         
     except Exception as e:
         return f"Error: {str(e)}"
+
+
+def _read_bytes(full_path, file_path, offset, length):
+    if offset < 0 or length < 0:
+        return 'Error: offset and length must be non-negative'
+    length = min(length, MAX_FILE_CHARS)
+    size = os.path.getsize(full_path)
+    with open(full_path, 'rb') as f:
+        f.seek(offset)
+        data = f.read(length)
+    end = offset + len(data)
+    header = f'[Bytes {offset}-{end} of {size} in "{file_path}"]'
+    return f"{header}\n{data.decode('utf-8', errors='replace')}"
+
+
+def _read_lines(full_path, file_path, start_line, end_line):
+    if start_line < 1 or (end_line is not None and end_line < start_line):
+        return 'Error: start_line must be >= 1 and end_line must be >= start_line'
+    index = get_line_index(full_path)
+    lines = []
+    chars = 0
+    truncated = False
+    with open(full_path, 'rb') as f:
+        if not index.line_offset(f, start_line):
+            return f'Error: "{file_path}" has fewer than {start_line} lines'
+        line_number = start_line
+        while end_line is None or line_number <= end_line:
+            # A UTF-8 character takes at most 4 bytes, so a line cut at this
+            # limit already holds more characters than the budget has left
+            limit = (MAX_FILE_CHARS - chars + 1) * 4
+            raw = f.readline(limit)
+            if not raw:
+                break
+            if len(raw) == limit and not raw.endswith(b"\n"):
+                # Partial line: leave out a character split at the cut
+                text = codecs.getincrementaldecoder('utf-8')(errors='replace').decode(raw)
+            else:
+                text = raw.decode('utf-8', errors='replace')
+            if chars + len(text) > MAX_FILE_CHARS:
+                if not lines:
+                    return (
+                        f'[Line {start_line} of "{file_path}" exceeds {MAX_FILE_CHARS} characters; '
+                        f'first {MAX_FILE_CHARS} shown, use offset/length for the rest]\n'
+                        + text[:MAX_FILE_CHARS]
+                    )
+                truncated = True
+                break
+            lines.append(text)
+            chars += len(text)
+            line_number += 1
+    last_line = start_line + len(lines) - 1
+    content = f'[Lines {start_line}-{last_line} of "{file_path}"]\n' + "".join(lines)
+    if truncated:
+        content += (
+            f'\n[...Stopped at {MAX_FILE_CHARS} characters; '
+            f'continue with start_line={last_line + 1}]'
+        )
+    return content
+
+
+def _read_tail(full_path, file_path, tail_lines):
+    if tail_lines < 1:
+        return 'Error: tail_lines must be >= 1'
+    max_bytes = MAX_FILE_CHARS * 4
+    with open(full_path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        blocks = []
+        read = 0
+        newlines = 0
+        # One extra newline is needed to know where the first wanted line starts.
+        while position > 0 and newlines <= tail_lines and read < max_bytes:
+            step = min(TAIL_BLOCK_BYTES, position, max_bytes - read)
+            position -= step
+            f.seek(position)
+            block = f.read(step)
+            blocks.append(block)
+            read += step
+            newlines += block.count(b"\n")
+    data = b"".join(reversed(blocks))
+    lines = data.decode('utf-8', errors='replace').splitlines(keepends=True)
+    if position > 0 and lines:
+        lines = lines[1:]  # the first piece is a partial line
+    content = "".join(lines[-tail_lines:])
+    if len(content) > MAX_FILE_CHARS:
+        content = content[-MAX_FILE_CHARS:]
+        return f'[Last {MAX_FILE_CHARS} characters of "{file_path}"]\n{content}'
+    shown = content.count("\n") + (0 if content.endswith("\n") or not content else 1)
+    return f'[Last {shown} lines of "{file_path}"]\n{content}'
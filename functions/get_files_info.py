@@ -1,10 +1,18 @@
+import fnmatch
 import os
+
 from google.genai import types
 
+from functions.file_index import IGNORED_DIRS
+
+# Entries per call by default, and the most a call may ask for
+MAX_LIST_ENTRIES = 200
+MAX_LIST_LIMIT = 1000
+
 
 schema_get_files_info = types.FunctionDeclaration(
     name="get_files_info",
-    description="Lists files in the specified directory along with their sizes. Works anywhere in the project.",
+    description="Lists a directory as a compact indented tree: 'name size_in_bytes' for files, 'name/' for directories. Use recursive or max_depth to see a whole subtree in one call instead of listing one directory at a time. Long listings are paginated; pass the returned cursor to continue.",
     parameters=types.Schema(
         type=types.Type.OBJECT,
         properties={
@@ -12,13 +20,33 @@ schema_get_files_info = types.FunctionDeclaration(
                 type=types.Type.STRING,
                 description="The directory to list files from, relative to the project root (e.g., '.', 'calculator', 'functions', 'calculator/pkg'). If not provided, lists files in the project root.",
             ),
+            "recursive": types.Schema(
+                type=types.Type.BOOLEAN,
+                description="Optional: also list everything below subdirectories (skips .git, __pycache__, virtualenvs and the like).",
+            ),
+            "max_depth": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional depth limit: 1 lists only the directory itself (the default), 2 adds its subdirectories' contents, and so on.",
+            ),
+            "pattern": types.Schema(
+                type=types.Type.STRING,
+                description="Optional comma-separated globs to keep, matched against names (e.g., '*.py', 'test_*', '*.md,*.txt') or, if a glob contains '/', against paths relative to the directory.",
+            ),
+            "cursor": types.Schema(
+                type=types.Type.STRING,
+                description="Optional cursor from a previous, truncated listing to get the next page.",
+            ),
+            "limit": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional maximum number of entries to return (default 200, max 1000).",
+            ),
         },
     ),
 )
 
 schema_get_file_content = types.FunctionDeclaration(
     name="get_file_content",
-    description="Reads and returns the contents of a file anywhere in the project.",
+    description="Reads and returns the contents of a file anywhere in the project. Large files are truncated; pass a line range, byte range or tail_lines to read any part of them.",
     parameters=types.Schema(
         type=types.Type.OBJECT,
         properties={
@@ -26,6 +54,26 @@ schema_get_file_content = types.FunctionDeclaration(
                 type=types.Type.STRING,
                 description="The path to the file to read, relative to the project root (e.g., 'main.py', 'calculator/main.py', 'functions/config.py').",
             ),
+            "start_line": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional 1-based first line to read. Use with end_line to read part of a large file.",
+            ),
+            "end_line": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional 1-based last line to read (inclusive).",
+            ),
+            "tail_lines": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional: return only the last N lines of the file (e.g., for logs).",
+            ),
+            "offset": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional byte offset to start reading from. Use with length for byte ranges.",
+            ),
+            "length": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional number of bytes to read from offset (capped at the file size limit).",
+            ),
         },
         required=["file_path"],
     ),
@@ -46,11 +94,45 @@ schema_run_python_file = types.FunctionDeclaration(
                 description="Optional list of command-line arguments to pass to the Python script.",
                 items=types.Schema(type=types.Type.STRING),
             ),
+            "timeout": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional timeout in seconds (default 30, max 600). Raise it for long-running test suites.",
+            ),
+            "head_kb": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional KB of output to keep from the start of each stream (default 8).",
+            ),
+            "tail_kb": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional KB of output to keep from the end of each stream (default 8). Output in between is omitted.",
+            ),
         },
         required=["file_path"],
     ),
 )
 
+schema_run_tests = types.FunctionDeclaration(
+    name="run_tests",
+    description="Discovers and runs the project's unittest/pytest-style tests (test*.py, *_test.py, tests.py) in parallel and returns one report with pass/fail counts, failures with tracebacks and per-shard timings. USE THIS to run tests instead of calling run_python_file on each test file.",
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "path": types.Schema(
+                type=types.Type.STRING,
+                description="Optional directory or test file to limit discovery to, relative to the project root (e.g., 'calculator').",
+            ),
+            "pattern": types.Schema(
+                type=types.Type.STRING,
+                description="Optional case-insensitive substring of test class or test names to run (e.g., 'division').",
+            ),
+            "timeout": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional timeout in seconds for each shard (default 300).",
+            ),
+        },
+    ),
+)
+
 schema_write_file = types.FunctionDeclaration(
     name="write_file",
     description="Writes or overwrites content to a file anywhere in the project. Creates the file and parent directories if they don't exist.",
@@ -70,36 +152,134 @@ schema_write_file = types.FunctionDeclaration(
     ),
 )
 
+schema_edit_file = types.FunctionDeclaration(
+    name="edit_file",
+    description="Edits an existing file by applying hunks, without resending the whole file. PREFER THIS over write_file for changes to existing files. Each hunk either replaces a unique exact 'search' text with 'replace', or replaces lines start_line..end_line with 'replace'. All hunks are checked against the original file before any is applied; returns a compact diff.",
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "file_path": types.Schema(
+                type=types.Type.STRING,
+                description="The path to the file to edit, relative to the project root.",
+            ),
+            "edits": types.Schema(
+                type=types.Type.ARRAY,
+                description="Hunks to apply. Line numbers refer to the file before any hunk is applied.",
+                items=types.Schema(
+                    type=types.Type.OBJECT,
+                    properties={
+                        "search": types.Schema(
+                            type=types.Type.STRING,
+                            description="Exact text to replace, including indentation. Must occur exactly once; include a few surrounding lines if needed.",
+                        ),
+                        "start_line": types.Schema(
+                            type=types.Type.INTEGER,
+                            description="First line to replace (1-based), used instead of 'search'.",
+                        ),
+                        "end_line": types.Schema(
+                            type=types.Type.INTEGER,
+                            description="Last line to replace (inclusive, defaults to start_line). Use start_line - 1 to insert before start_line.",
+                        ),
+                        "replace": types.Schema(
+                            type=types.Type.STRING,
+                            description="The new text. Empty to delete.",
+                        ),
+                    },
+                    required=["replace"],
+                ),
+            ),
+        },
+        required=["file_path", "edits"],
+    ),
+)
+
 schema_find_files = types.FunctionDeclaration(
     name="find_files",
-    description="Search for files in the project by exact filename or pattern. USE THIS PROACTIVELY when the user mentions a file without a full path! Case-insensitive search with smart fallback. Returns matching file paths sorted by relevance that can be used with other functions.",
+    description="Search for files in the project by exact filename or pattern. USE THIS PROACTIVELY when the user mentions a file without a full path! Case-insensitive search with smart fallback. Returns the best-matching file paths first (by match quality, then shallower and recently modified files), ready to use with other functions.",
     parameters=types.Schema(
         type=types.Type.OBJECT,
         properties={
             "filename": types.Schema(
                 type=types.Type.STRING,
-                description="Exact filename to search for (case-insensitive, e.g., 'readme.md', 'Config.py', 'MAIN.PY'). Automatically tries pattern search if exact match fails.",
+                description="Exact filename to search for (case-insensitive, e.g., 'readme.md', 'Config.py', 'MAIN.PY'). Automatically falls back to similar names if there is no exact match.",
             ),
             "pattern": types.Schema(
                 type=types.Type.STRING,
-                description="Pattern to search for in filenames (case-insensitive substring match, e.g., 'test', 'util', 'config', 'readme'). Use this for broader searches.",
+                description="Ranked query for broader searches (case-insensitive): a substring ('test', 'config'), a glob ('*_test.py', 'src/**/*.yaml'), path segments ('calc/pkg/render') or an approximate name ('calcualtor').",
+            ),
+            "limit": types.Schema(
+                type=types.Type.INTEGER,
+                description="Maximum number of paths to return (default 50, max 500).",
             ),
         },
     ),
 )
 
+schema_search_code = types.FunctionDeclaration(
+    name="search_code",
+    description="Search the contents of project files (like grep) and return matching lines as 'path:line: text'. Use this to locate definitions, usages or strings instead of reading files one by one.",
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "query": types.Schema(
+                type=types.Type.STRING,
+                description="Text to search for. Treated as a literal unless regex is true.",
+            ),
+            "regex": types.Schema(
+                type=types.Type.BOOLEAN,
+                description="Treat query as a regular expression (e.g., 'def \\w+_test', 'class \\w+Error').",
+            ),
+            "path": types.Schema(
+                type=types.Type.STRING,
+                description="Optional file or directory to limit the search to, relative to the project root (e.g., 'calculator', 'functions/config.py').",
+            ),
+            "glob": types.Schema(
+                type=types.Type.STRING,
+                description="Optional file name filter (e.g., '*.py', 'test_*.py').",
+            ),
+            "context_lines": types.Schema(
+                type=types.Type.INTEGER,
+                description="Number of lines of context to show around each match (default 0).",
+            ),
+            "case_sensitive": types.Schema(
+                type=types.Type.BOOLEAN,
+                description="Match case exactly (default false).",
+            ),
+            "max_results": types.Schema(
+                type=types.Type.INTEGER,
+                description="Maximum number of matching lines to return (default 100).",
+            ),
+        },
+        required=["query"],
+    ),
+)
+
 available_functions = types.Tool(
     function_declarations=[
         schema_get_files_info,
         schema_get_file_content,
         schema_run_python_file,
+        schema_run_tests,
         schema_write_file,
+        schema_edit_file,
         schema_find_files,
+        schema_search_code,
     ]
 )
 
 
-def get_files_info(working_directory, directory="."):
+def get_files_info(working_directory, directory=".", recursive=False, max_depth=None,
+                   pattern=None, cursor=None, limit=None):
+    """List a directory as a compact tree, one ``name size`` or ``name/`` line per entry.
+
+    Entries come from a single ``os.scandir`` pass per directory: the entry
+    type comes from the directory listing itself and only files are
+    stat'ed, once. ``recursive``/``max_depth`` descend into subdirectories
+    (depth 1 is the directory itself), ``pattern`` keeps entries matching
+    any of its comma-separated globs, and at most ``limit`` entries are
+    returned per call. A truncated listing ends with the ``cursor`` that
+    continues it (the path of the last entry shown).
+    """
     try:
         full_path = os.path.join(working_directory, directory)
         full_path = os.path.abspath(full_path)
@@ -113,21 +293,114 @@ def get_files_info(working_directory, directory="."):
         
         if not os.path.isdir(full_path):
             return f'Error: "{directory}" is not a directory'
-        
-        entries = os.listdir(full_path)
-        entries.sort()
-        
-        result_lines = []
-        for entry in entries:
-            entry_path = os.path.join(full_path, entry)
-            try:
-                file_size = os.path.getsize(entry_path)
-                is_dir = os.path.isdir(entry_path)
-                result_lines.append(f"- {entry}: file_size={file_size} bytes, is_dir={is_dir}")
-            except OSError as e:
-                result_lines.append(f"- {entry}: Error accessing file: {e}")
-        
-        return "\n".join(result_lines) if result_lines else "Directory is empty"
-        
+
+        if max_depth is None:
+            max_depth = None if recursive else 1
+        elif int(max_depth) < 1:
+            return "Error: max_depth must be at least 1"
+        limit = MAX_LIST_ENTRIES if limit is None else int(limit)
+        if limit < 1:
+            return "Error: limit must be at least 1"
+        globs = [glob.strip().lower() for glob in (pattern or "").split(",") if glob.strip()]
+        after = tuple(part for part in str(cursor).split("/") if part) if cursor else None
+
+        lister = _TreeLister(max_depth and int(max_depth), globs, after, min(limit, MAX_LIST_LIMIT))
+        lister.walk(full_path, ())
+
+        if not lister.count:
+            if cursor:
+                return f'No entries after cursor "{cursor}"'
+            if globs:
+                return f'No entries match "{pattern}" in "{directory}"'
+            return "Directory is empty"
+
+        root = "./" if os.path.normpath(directory) == "." else os.path.normpath(directory) + "/"
+        lines = [root] + lister.lines
+        if lister.next_cursor:
+            lines.append(f'[{lister.count} entries shown; more remain: call again with cursor="{lister.next_cursor}"]')
+        else:
+            lines.append(f"[{lister.count} entries]")
+        return "\n".join(lines)
+
     except Exception as e:
         return f"Error: {str(e)}"
+
+
+class _TreeLister:
+    """Depth-first, name-ordered walk that stops after ``limit`` entries.
+
+    Entries are ordered like their path tuples, so resuming after a cursor
+    skips every subtree that sorts entirely before it without scanning it.
+    """
+
+    def __init__(self, max_depth, globs, after, limit):
+        self.max_depth = max_depth
+        self.globs = globs
+        self.after = after
+        self.limit = limit
+        self.lines = []
+        self.count = 0
+        self.next_cursor = None
+        self._last = None
+        self._shown_dirs = []  # directory path tuples whose lines are on the page, outermost first
+
+    def walk(self, path, parts):
+        """Walk ``path``; returns False once the page is full."""
+        try:
+            with os.scandir(path) as scanner:
+                entries = sorted(scanner, key=lambda entry: entry.name)
+        except OSError as e:
+            self._emit_context(parts)
+            self.lines.append(f"{'  ' * len(parts)}({e.strerror or e})")
+            return True
+
+        for entry in entries:
+            entry_parts = parts + (entry.name,)
+            is_dir = entry.is_dir(follow_symlinks=False)
+            descend = (is_dir and (self.max_depth is None or len(entry_parts) < self.max_depth)
+                       and entry.name not in IGNORED_DIRS)
+            if self.after is not None and entry_parts <= self.after:
+                # Already listed; only a directory on the cursor's own path has anything left
+                if descend and self.after[:len(entry_parts)] == entry_parts:
+                    if not self.walk(entry.path, entry_parts):
+                        return False
+                continue
+
+            if not self.globs or self._matches(entry_parts):
+                if self.count == self.limit:
+                    self.next_cursor = "/".join(self._last)
+                    return False
+                self._emit_context(parts)
+                self.lines.append("  " * len(parts) + self._describe(entry, is_dir))
+                self.count += 1
+                self._last = entry_parts
+                if is_dir:
+                    self._shown_dirs = self._shown_dirs[:len(parts)] + [entry_parts]
+            if descend and not self.walk(entry.path, entry_parts):
+                return False
+        return True
+
+    def _describe(self, entry, is_dir):
+        if entry.is_symlink():
+            return f"{entry.name}@"
+        if is_dir:
+            skipped = self.max_depth != 1 and entry.name in IGNORED_DIRS
+            return f"{entry.name}/ (skipped)" if skipped else f"{entry.name}/"
+        try:
+            return f"{entry.name} {entry.stat().st_size}"
+        except OSError:
+            return f"{entry.name} ?"
+
+    def _matches(self, parts):
+        name = parts[-1].lower()
+        rel = "/".join(parts).lower()
+        return any(fnmatch.fnmatchcase(rel if "/" in glob else name, glob) for glob in self.globs)
+
+    def _emit_context(self, parts):
+        """Print the not-yet-shown directories leading to an entry (filtered or resumed pages)."""
+        for depth in range(len(parts)):
+            ancestor = parts[:depth + 1]
+            if depth < len(self._shown_dirs) and self._shown_dirs[depth] == ancestor:
+                continue
+            self.lines.append(f"{'  ' * depth}{ancestor[-1]}/")
+            self._shown_dirs = self._shown_dirs[:depth] + [ancestor]
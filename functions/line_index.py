@@ -0,0 +1,101 @@
+"""Sparse newline index for line-range reads of large files.
+
+The index records the byte offset of every ``LINE_INDEX_STRIDE``-th line, so
+reading lines N..M seeks straight to the nearest checkpoint and skips fewer
+than ``LINE_INDEX_STRIDE`` lines, whatever the file size. Checkpoints are
+discovered lazily: reading line 10 of a 2 GB file only scans the first chunk.
+Indexes are cached per file and dropped when its mtime or size changes.
+"""
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from itertools import accumulate
+
+LINE_INDEX_STRIDE = 1024
+SCAN_CHUNK_BYTES = 1024 * 1024
+MAX_CACHED_INDEXES = 64
+
+
+class LineIndex:
+    """Byte offsets of every ``stride``-th line start of one file."""
+
+    def __init__(self, path, stamp, stride=LINE_INDEX_STRIDE):
+        self.path = path
+        self.stamp = stamp
+        self.stride = stride
+        self.checkpoints = array('q', [0])
+        self.total_lines = None
+        self._scanned_bytes = 0
+        self._newlines = 0
+        self._lock = threading.Lock()
+
+    def line_offset(self, f, line):
+        """Seek binary file ``f`` to the start of 1-based ``line``.
+
+        Returns False if the file has fewer lines.
+        """
+        k = (line - 1) // self.stride
+        with self._lock:
+            while len(self.checkpoints) <= k and self.total_lines is None:
+                self._scan_chunk(f)
+            if len(self.checkpoints) <= k:
+                return False
+            f.seek(self.checkpoints[k])
+        for _ in range((line - 1) - k * self.stride):
+            if not f.readline():
+                return False
+        # A "line" starting exactly at EOF does not exist.
+        return f.tell() < os.fstat(f.fileno()).st_size
+
+    def count_lines(self, f):
+        """Return the total number of lines, scanning the rest of the file if needed."""
+        with self._lock:
+            while self.total_lines is None:
+                self._scan_chunk(f)
+            return self.total_lines
+
+    def _scan_chunk(self, f):
+        f.seek(self._scanned_bytes)
+        chunk = f.read(SCAN_CHUNK_BYTES)
+        if not chunk:
+            ends_with_newline = self._scanned_bytes == 0 or self._last_byte_newline(f)
+            self.total_lines = self._newlines + (0 if ends_with_newline else 1)
+            return
+
+        count = chunk.count(b"\n")
+        # Line i (0-based) starts right after the i-th newline.
+        next_line = len(self.checkpoints) * self.stride
+        if next_line - self._newlines <= count:
+            cumulative = list(accumulate(map(len, chunk.split(b"\n"))))
+            while next_line - self._newlines <= count:
+                i = next_line - self._newlines
+                self.checkpoints.append(self._scanned_bytes + cumulative[i - 1] + i)
+                next_line += self.stride
+
+        self._newlines += count
+        self._scanned_bytes += len(chunk)
+
+    def _last_byte_newline(self, f):
+        f.seek(self._scanned_bytes - 1)
+        return f.read(1) == b"\n"
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_line_index(path):
+    """Return the cached ``LineIndex`` for ``path``, rebuilding it if the file changed."""
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None or index.stamp != stamp:
+            index = LineIndex(path, stamp)
+            _indexes[path] = index
+            while len(_indexes) > MAX_CACHED_INDEXES:
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(path)
+        return index
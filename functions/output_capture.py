@@ -0,0 +1,92 @@
+"""Bounded capture of a child process's output.
+
+Only the first ``head_bytes`` and the last ``tail_bytes`` of a stream are
+kept, however much the process prints, and the result reads
+``head ... [N bytes omitted] ... tail``. An optional listener (see
+``set_output_listener``) receives every chunk as it arrives, for live
+display in the interactive CLI.
+"""
+import os
+import threading
+
+OUTPUT_HEAD_KB = int(os.environ.get("AGENT_OUTPUT_HEAD_KB", "8"))
+OUTPUT_TAIL_KB = int(os.environ.get("AGENT_OUTPUT_TAIL_KB", "8"))
+# Upper bound for per-call head/tail sizes requested by the model
+MAX_OUTPUT_KB = 256
+READ_CHUNK_BYTES = 64 * 1024
+
+_listener = None
+
+
+def set_output_listener(listener):
+    """Install ``listener(stream_name, text)`` for live output, or None to disable."""
+    global _listener
+    _listener = listener
+
+
+def get_output_listener():
+    return _listener
+
+
+class BoundedCapture:
+    """Keep the head and tail of a byte stream within a fixed budget."""
+
+    def __init__(self, head_bytes, tail_bytes):
+        self.head_bytes = max(0, head_bytes)
+        self.tail_bytes = max(0, tail_bytes)
+        self.head = bytearray()
+        self._tail = bytearray()
+        self.total = 0
+
+    def feed(self, data):
+        self.total += len(data)
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data and self.tail_bytes:
+            self._tail += data
+            # Trim in batches so feeding stays amortized O(len(data))
+            if len(self._tail) > 2 * self.tail_bytes:
+                del self._tail[:-self.tail_bytes]
+
+    @property
+    def tail(self):
+        return bytes(self._tail[-self.tail_bytes:]) if self.tail_bytes else b""
+
+    def render(self):
+        tail = self.tail
+        return render_capped(
+            self.head.decode("utf-8", errors="replace"),
+            tail.decode("utf-8", errors="replace"),
+            self.total - len(self.head) - len(tail),
+        )
+
+
+def render_capped(head, tail, omitted):
+    """Join a captured head and tail, marking how many bytes were dropped."""
+    if omitted > 0:
+        return f"{head}\n... [{omitted} bytes omitted] ...\n{tail}"
+    return head + tail
+
+
+def drain(stream, capture, name, listener=None):
+    """Read ``stream`` to EOF on a daemon thread, feeding ``capture``."""
+
+    def pump():
+        fd = stream.fileno()
+        while True:
+            data = os.read(fd, READ_CHUNK_BYTES)
+            if not data:
+                break
+            capture.feed(data)
+            if listener is not None:
+                try:
+                    listener(name, data.decode("utf-8", errors="replace"))
+                except Exception:
+                    pass  # display problems must not break the capture
+        stream.close()
+
+    thread = threading.Thread(target=pump, name=f"capture-{name}", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,357 @@
+"""Ranked path queries for find_files.
+
+A query is one of:
+
+- a glob (``*_test.py``, ``pkg/*.py``, ``src/**/conf*.yaml``): ``*`` and ``?``
+  stay within one path segment and ``**`` spans directories. A glob with a
+  ``/`` must match the end of the relative path (the whole path when it
+  starts with ``/``), otherwise just the file name
+- path segments (``calc/pkg/render``): the last segment is matched against
+  file names as plain text, the others must match directory names in order
+  (exactly, as a prefix or as a substring)
+- plain text: a file name equal to it, equal to it without the extension,
+  starting with it, containing it, or resembling it (typos, dropped letters)
+
+Each matching path is scored by how well its name matched, minus a little
+per directory level, plus a bonus for exactly matched directory segments;
+the best candidates also get a bonus for recent modification. The best
+``limit`` paths are returned.
+
+Names resembling the query are found through a trigram index over the
+project's unique file names. The index is built on the first query that
+needs it and then follows the FileIndex's log of newly seen names, so it is
+updated incrementally, and a query only looks at names sharing trigrams
+with it. Exact, prefix and substring matches come straight from the
+FileIndex name tables.
+"""
+import difflib
+import heapq
+import os
+import re
+import threading
+import time
+import weakref
+from collections import Counter
+
+from functions.file_index import FileIndex
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# Score of each kind of name match
+EXACT = 100.0
+STEM = 95.0
+PREFIX = 85.0
+GLOB = 80.0
+SUBSTRING = 70.0
+FUZZY = 60.0  # scaled by the similarity of the two names
+SUBSEQUENCE = 45.0  # scaled by how compact the match is
+
+WORD_BOUNDARY_BONUS = 5.0
+DEPTH_PENALTY = 1.0
+SEGMENT_BONUS = 2.0  # per directory segment matched exactly (half for a prefix)
+RECENCY_BONUS = 5.0  # for a file modified just now, halving every RECENCY_HALF_LIFE
+RECENCY_HALF_LIFE = 24 * 3600
+MIN_SIMILARITY = 0.6
+# Names sharing the most trigrams with the query are compared in full, at most this many
+MAX_FUZZY_CANDIDATES = 200
+# Trigrams found in more than this share of names say little; skip them when others exist
+COMMON_TRIGRAM_SHARE = 0.2
+
+_GLOB_CHARS = re.compile(r"[*?\[]")
+_BOUNDARY_CHARS = frozenset("_-. ")
+
+
+class PathQuery:
+    """Query engine over the files of one FileIndex."""
+
+    _engines = weakref.WeakKeyDictionary()
+    _engines_lock = threading.Lock()
+
+    @classmethod
+    def for_root(cls, root):
+        """Return the shared engine for ``root``'s FileIndex."""
+        index = FileIndex.for_root(root)
+        with cls._engines_lock:
+            engine = cls._engines.get(index)
+            if engine is None:
+                engine = cls(index)
+                cls._engines[index] = engine
+            return engine
+
+    def __init__(self, index):
+        self.index = index
+        self._names = []  # name id -> lowercase base name
+        self._ids = {}
+        self._trigrams = {}  # trigram -> [name ids]
+        self._gram_counts = []  # name id -> number of distinct trigrams
+        self._position = None  # how much of the FileIndex name log is indexed
+        self._lock = threading.Lock()
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """Return ``(paths, total, approximate)`` for ``query``, best first.
+
+        ``total`` counts every matching path, of which at most ``limit`` are
+        returned. ``approximate`` is true when no path matched the query as
+        written and the results only resemble it.
+        """
+        query = query.strip().replace("\\", "/")
+        with self._lock:
+            if _GLOB_CHARS.search(query):
+                return self._rank(*self._glob_names(query), limit)
+            segments = [part for part in query.lower().split("/") if part and part != "."]
+            if not segments:
+                return [], 0, False
+            names, approximate = self._text_names(segments[-1])
+            return self._rank(names, segments[:-1], None, limit, approximate)
+
+    def exact(self, name, limit=DEFAULT_LIMIT):
+        """Like ``search``, for files whose base name equals ``name``."""
+        with self._lock:
+            return self._rank({name.lower(): EXACT}, [], None, limit)
+
+    # ------------------------------------------------------------ name matching
+
+    def _text_names(self, term):
+        """``({name: score}, approximate)`` for one plain-text segment."""
+        scores = {name: _text_score(name, term) for name in self.index.names_containing(term)}
+        if scores:
+            return scores, False
+
+        stem = os.path.splitext(term)[0]
+        if stem and stem != term:
+            # "config.yml" finds "config.yaml" and "config_dev.json"
+            for name in self.index.names_containing(stem):
+                scores[name] = _text_score(name, stem) - WORD_BOUNDARY_BONUS
+        if not scores and len(term) >= 3:
+            matcher = _Similarity(term)
+            for name in self._similar_names(term):
+                similarity = matcher.ratio(name)
+                if similarity >= MIN_SIMILARITY:
+                    scores[name] = max(scores.get(name, 0.0), FUZZY * similarity)
+        if not scores and len(term) >= 2:
+            # Negated classes keep the scan linear: no backtracking between letters
+            pattern = re.compile(re.escape(term[0]) + "".join(
+                f"[^{re.escape(char)}\n]*{re.escape(char)}" for char in term[1:]))
+            for name in self.index.names_matching(pattern):
+                span = pattern.search(name).span()
+                scores[name] = SUBSEQUENCE * len(term) / (span[1] - span[0])
+        return scores, True
+
+    def _glob_names(self, query):
+        self._sync()
+        anchored = query.startswith("/")
+        query = query.strip("/")
+        name_part = query.rsplit("/", 1)[-1]
+        name_regex = _glob_regex(name_part)
+        literals = [part for part in _GLOB_CHARS.split(name_part) if "]" not in part]
+        literal = max(literals, key=len, default="").lower()
+        if len(literal) >= 3:
+            candidates = self._names_with(literal)
+        else:
+            candidates = self._names
+        names = {name: GLOB for name in candidates if name_regex.match(name)}
+        path_regex = None
+        if "/" in query:
+            path_regex = _glob_regex(query if anchored else "**/" + query)
+        return names, [], path_regex
+
+    def _similar_names(self, term):
+        """Names sharing the most trigrams with ``term``, by Dice coefficient."""
+        self._sync()
+        grams = _trigrams(term)
+        postings = [self._trigrams[gram] for gram in grams if gram in self._trigrams]
+        common = len(self._names) * COMMON_TRIGRAM_SHARE
+        postings = [ids for ids in postings if len(ids) <= common] or postings
+        if not postings:
+            return []
+        counts = Counter()
+        for ids in postings:
+            counts.update(ids)
+        needed = max(1, len(postings) // 3)
+        gram_counts = self._gram_counts
+        ranked = heapq.nlargest(
+            MAX_FUZZY_CANDIDATES,
+            (i for i, count in counts.items() if count >= needed),
+            key=lambda i: counts[i] / (len(grams) + gram_counts[i]),
+        )
+        return [self._names[i] for i in ranked]
+
+    def _names_with(self, literal):
+        """Names that can contain ``literal``: those having all of its trigrams."""
+        postings = sorted((self._trigrams.get(gram, ()) for gram in _trigrams(literal)), key=len)
+        candidates = set(postings[0])
+        for ids in postings[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(ids)
+        return [self._names[i] for i in candidates]
+
+    # ----------------------------------------------------------------- ranking
+
+    def _rank(self, names, dir_segments, path_regex, limit, approximate=False):
+        """Expand scored names to paths and return the best ``limit`` of them."""
+        if not names:
+            return [], 0, False
+        ordered = sorted(names.items(), key=lambda item: -item[1])
+        path_lists = self.index.paths_for_names([name for name, _ in ordered])
+        # Directory bonuses and recency can lift a path by at most this much
+        headroom = SEGMENT_BONUS * len(dir_segments) + RECENCY_BONUS
+        pool_size = max(limit * 4, 200)
+        pool = []  # min-heap of (score, path)
+        dir_bonuses = {}  # parent directory -> segment bonus (None: no match)
+        total = 0
+        for (name, name_score), paths in zip(ordered, path_lists):
+            skip = len(pool) >= pool_size and name_score + headroom < pool[0][0]
+            if skip and not dir_segments and path_regex is None:
+                total += len(paths)
+                continue
+            for path in paths:
+                bonus = 0.0
+                if dir_segments:
+                    parent = path.rpartition(os.sep)[0]
+                    if parent in dir_bonuses:
+                        bonus = dir_bonuses[parent]
+                    else:
+                        bonus = dir_bonuses[parent] = _segment_bonus(parent, dir_segments)
+                    if bonus is None:
+                        continue
+                elif path_regex is not None and not path_regex.match(path.replace(os.sep, "/").lower()):
+                    continue
+                total += 1
+                if skip:
+                    continue
+                entry = (name_score + bonus - DEPTH_PENALTY * path.count(os.sep), path)
+                if len(pool) < pool_size:
+                    heapq.heappush(pool, entry)
+                elif entry > pool[0]:
+                    heapq.heapreplace(pool, entry)
+
+        if not pool:
+            return [], 0, False
+        # Only files that could still make the cut are stat'ed for recency
+        pool.sort(reverse=True)
+        cutoff = pool[min(limit, len(pool)) - 1][0] - RECENCY_BONUS
+        now = time.time()
+        scored = []
+        for score, path in pool:
+            if score < cutoff:
+                break
+            try:
+                age = max(0.0, now - os.stat(os.path.join(self.index.root, path)).st_mtime)
+                score += RECENCY_BONUS * 0.5 ** (age / RECENCY_HALF_LIFE)
+            except OSError:
+                pass
+            scored.append((-score, path))
+        scored.sort()
+        return [path for _, path in scored[:limit]], total, approximate
+
+    # ------------------------------------------------------------------- index
+
+    def _sync(self):
+        names, self._position, reset = self.index.names_since(self._position)
+        if reset:
+            # The log was compacted; drop names that have vanished since
+            self._names, self._ids, self._trigrams, self._gram_counts = [], {}, {}, []
+        trigrams = self._trigrams
+        for name in names:
+            if name in self._ids:
+                continue
+            name_id = len(self._names)
+            self._names.append(name)
+            self._ids[name] = name_id
+            grams = _trigrams(name)
+            self._gram_counts.append(len(grams))
+            for gram in grams:
+                trigrams.setdefault(gram, []).append(name_id)
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _text_score(name, term):
+    if name == term:
+        return EXACT
+    # Among names containing the term, shorter ones are closer matches
+    excess = min(5.0, 0.1 * (len(name) - len(term)))
+    if name.startswith(term):
+        rest = name[len(term):]
+        if rest[0] == "." and rest.count(".") == 1:
+            return STEM
+        return PREFIX - excess
+    start = name.find(term)
+    if start > 0 and name[start - 1] in _BOUNDARY_CHARS:
+        return SUBSTRING + WORD_BOUNDARY_BONUS - excess
+    return SUBSTRING - excess
+
+
+class _Similarity:
+    """0..1 similarity of names to one term, compared without extensions.
+
+    Differing extensions (when the term has one) cost a tenth.
+    """
+
+    def __init__(self, term):
+        stem, self.extension = os.path.splitext(term)
+        # The term is the cached side of the matcher: only names change
+        self.matcher = difflib.SequenceMatcher(None, autojunk=False)
+        self.matcher.set_seq2(stem)
+
+    def ratio(self, name):
+        stem, extension = os.path.splitext(name)
+        self.matcher.set_seq1(stem)
+        if self.matcher.real_quick_ratio() < MIN_SIMILARITY or self.matcher.quick_ratio() < MIN_SIMILARITY:
+            return 0.0
+        ratio = self.matcher.ratio()
+        return ratio * 0.9 if self.extension and extension != self.extension else ratio
+
+
+def _segment_bonus(directory, segments):
+    """Bonus for ``segments`` matching the names in ``directory`` in order, or None."""
+    dirs = directory.lower().split(os.sep) if directory else []
+    bonus = 0.0
+    position = 0
+    for segment in segments:
+        while position < len(dirs) and segment not in dirs[position]:
+            position += 1
+        if position == len(dirs):
+            return None
+        if dirs[position] == segment:
+            bonus += SEGMENT_BONUS
+        elif dirs[position].startswith(segment):
+            bonus += SEGMENT_BONUS / 2
+        position += 1
+    return bonus
+
+
+def _glob_regex(pattern):
+    """Compile a lowercase glob: ``*``/``?`` within a segment, ``**`` across segments."""
+    out = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if char == "*":
+            out.append("[^/]*")
+        elif char == "?":
+            out.append("[^/]")
+        elif char == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append("[" + body.replace("\\", "\\\\") + "]")
+            i = end + 1
+            continue
+        else:
+            out.append(re.escape(char))
+        i += 1
+    return re.compile("".join(out).lower() + r"\Z", re.DOTALL)
@@ -0,0 +1,273 @@
+"""Warm interpreter pool for run_python_file.
+
+Starting ``python3`` and re-importing the same modules on every run dominates
+the cost of short scripts such as ``calculator/tests.py``. With
+``AGENT_WARM_PYTHON=1`` runs are instead served by a small pool of
+long-lived fork servers, each with ``WARM_MODULES`` already imported.
+
+Every run forks a fresh child from the pristine server, so nothing a script
+does (imports, globals, monkey-patching) is visible to the next run. The
+child gets the same argv, cwd, ``sys.path[0]`` and ``__main__`` semantics as
+``python3 file.py``. When fork is unavailable or a server cannot be started,
+``run_in_warm_worker`` returns None and the caller runs the script cold.
+
+This file is also the fork server itself when executed as a script.
+"""
+import atexit
+import json
+import os
+import subprocess
+import sys
+import threading
+
+WARM_PYTHON = os.environ.get("AGENT_WARM_PYTHON", "").lower() in ("1", "true", "yes")
+WARM_WORKERS = int(os.environ.get("AGENT_WARM_WORKERS", "2"))
+WARM_MODULES = [
+    name.strip()
+    for name in os.environ.get(
+        "AGENT_WARM_MODULES", "unittest,json,re,collections,argparse,decimal,dataclasses"
+    ).split(",")
+    if name.strip()
+]
+
+
+class WarmPythonPool:
+    """A bounded set of fork servers; each serves one run at a time."""
+
+    def __init__(self, size=WARM_WORKERS, modules=WARM_MODULES):
+        self.size = max(1, size)
+        self.modules = list(modules)
+        self._idle = []  # most recently used last
+        self._started = 0
+        self._lock = threading.Lock()
+        # Notified when a server goes idle or is discarded, freeing a slot
+        self._available = threading.Condition(self._lock)
+        self._servers = []
+
+    def run(self, full_path, args, cwd, timeout, head_bytes, tail_bytes):
+        """Run a script in a forked child; returns a ``CompletedProcess`` or None.
+
+        Output is captured to temporary files and only its first
+        ``head_bytes`` and last ``tail_bytes`` are sent back.
+        """
+        server = self._acquire()
+        if server is None:
+            return None
+        request = {"file": full_path, "args": list(args), "cwd": cwd, "timeout": timeout,
+                   "head": head_bytes, "tail": tail_bytes}
+        try:
+            server.stdin.write(json.dumps(request) + "\n")
+            server.stdin.flush()
+        except OSError:
+            self._discard(server)
+            return None
+
+        line = server.stdout.readline()
+        if not line:
+            self._discard(server)
+            raise RuntimeError("warm interpreter exited unexpectedly")
+        with self._available:
+            self._idle.append(server)
+            self._available.notify()
+
+        # Imported here: the server runs this file as a script, outside the package
+        from functions.output_capture import render_capped
+
+        reply = json.loads(line)
+        cmd = ["python3", full_path] + list(args)
+        stdout = render_capped(*reply["stdout"])
+        stderr = render_capped(*reply["stderr"])
+        if reply.get("timed_out"):
+            raise subprocess.TimeoutExpired(cmd, timeout, output=stdout, stderr=stderr)
+        return subprocess.CompletedProcess(cmd, reply["returncode"], stdout, stderr)
+
+    def close(self):
+        with self._lock:
+            servers, self._servers = self._servers, []
+        for server in servers:
+            try:
+                server.stdin.close()
+                server.wait(timeout=1)
+            except Exception:
+                server.kill()
+            server.stdout.close()
+
+    def _acquire(self):
+        """Take an idle server, start one if the pool has room, or wait for either."""
+        with self._available:
+            while not self._idle and self._started >= self.size:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._started += 1
+        try:
+            server = subprocess.Popen(
+                ["python3", os.path.abspath(__file__), ",".join(self.modules)],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                text=True,
+            )
+        except OSError:
+            with self._available:
+                self._started -= 1
+                self._available.notify()
+            return None
+        with self._lock:
+            self._servers.append(server)
+        return server
+
+    def _discard(self, server):
+        server.kill()
+        for pipe in (server.stdin, server.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass  # unflushed input to a dead server
+        with self._available:
+            self._started -= 1
+            if server in self._servers:
+                self._servers.remove(server)
+            # A waiting run can now start a replacement
+            self._available.notify()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def run_in_warm_worker(full_path, args, cwd, timeout, head_bytes, tail_bytes):
+    """Run a script on the shared warm pool, or return None to run it cold."""
+    global _pool
+    if not WARM_PYTHON or not hasattr(os, "fork"):
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = WarmPythonPool()
+            atexit.register(_pool.close)
+    return _pool.run(full_path, args, cwd, timeout, head_bytes, tail_bytes)
+
+
+# ---------------------------------------------------------------- fork server
+
+
+def _serve(modules):
+    import importlib
+    import select
+    import signal
+    import tempfile
+    import time
+
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+    # Keep the protocol on private descriptors; fd 0/1 are for the scripts.
+    requests = os.fdopen(os.dup(0), "r")
+    replies = os.fdopen(os.dup(1), "w")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+
+    for line in requests:
+        request = json.loads(line)
+        out = tempfile.TemporaryFile()
+        err = tempfile.TemporaryFile()
+        pid = os.fork()
+        if pid == 0:
+            requests.close()
+            replies.close()
+            _run_child(request, out.fileno(), err.fileno())
+
+        deadline = time.monotonic() + request["timeout"]
+        status = None
+        pidfd = os.pidfd_open(pid) if hasattr(os, "pidfd_open") else None
+        while status is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if pidfd is not None:
+                select.select([pidfd], [], [], remaining)
+            else:
+                time.sleep(min(remaining, 0.005))
+            finished, raw_status = os.waitpid(pid, os.WNOHANG)
+            if finished:
+                status = raw_status
+        if pidfd is not None:
+            os.close(pidfd)
+
+        timed_out = status is None
+        if timed_out:
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except OSError:
+                pass
+            os.waitpid(pid, 0)
+
+        reply = {"timed_out": timed_out}
+        if not timed_out:
+            reply["returncode"] = os.waitstatus_to_exitcode(status)
+        for key, handle in (("stdout", out), ("stderr", err)):
+            reply[key] = _head_and_tail(handle, request["head"], request["tail"])
+        out.close()
+        err.close()
+        replies.write(json.dumps(reply) + "\n")
+        replies.flush()
+
+
+def _head_and_tail(handle, head_bytes, tail_bytes):
+    """Read ``[head, tail, omitted_bytes]`` from a capture file without loading it all."""
+    size = handle.seek(0, os.SEEK_END)
+    handle.seek(0)
+    head = handle.read(min(size, head_bytes))
+    tail_start = max(len(head), size - tail_bytes)
+    handle.seek(tail_start)
+    tail = handle.read(size - tail_start)
+    return [
+        head.decode("utf-8", errors="replace"),
+        tail.decode("utf-8", errors="replace"),
+        size - len(head) - len(tail),
+    ]
+
+
+def _run_child(request, out_fd, err_fd):
+    import runpy
+    import traceback
+
+    code = 0
+    try:
+        os.setpgid(0, 0)
+        os.dup2(out_fd, 1)
+        os.dup2(err_fd, 2)
+        os.chdir(request["cwd"])
+        path = request["file"]
+        sys.argv = [path] + request["args"]
+        sys.path[0] = os.path.dirname(path)
+        runpy.run_path(path, run_name="__main__")
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException:
+        # Hide the runpy frames so the traceback matches a cold run.
+        exc_type, exc, tb = sys.exc_info()
+        while tb is not None and tb.tb_frame.f_code.co_filename != request["file"]:
+            tb = tb.tb_next
+        traceback.print_exception(exc_type, exc, tb)
+        code = 1
+    finally:
+        try:
+            atexit._run_exitfuncs()
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+if __name__ == "__main__":
+    _serve([name for name in sys.argv[1].split(",") if name] if len(sys.argv) > 1 else [])
@@ -0,0 +1,123 @@
+"""Typed results shared between the tools.
+
+Tools that need another tool's answer (where a file is, which files match)
+use these values directly instead of formatting and re-parsing text. The
+value a tool returns is turned into a ``function_response`` payload once, by
+``render_response`` at the ``execute_tool`` boundary: as the text the model
+has always seen, or with ``AGENT_TOOL_RESULTS=json`` as a compact JSON
+object for results that have one. ``str()`` of a result is its text form, so
+callers that print a tool's return value keep working.
+"""
+import os
+from dataclasses import dataclass
+
+from functions.file_index import FileIndex
+
+TOOL_RESULTS = os.environ.get("AGENT_TOOL_RESULTS", "text").lower()
+
+
+@dataclass(slots=True)
+class PathResolution:
+    """Where a path given to a tool points.
+
+    ``candidates`` holds the ranked same-name matches when the path did not
+    exist and its base name was looked up in the index; ``path`` is then the
+    best of them.
+    """
+    requested: str
+    path: str | None = None  # relative to the project root
+    full_path: str | None = None
+    candidates: tuple = ()
+    outside: bool = False
+
+    @property
+    def found(self):
+        return self.full_path is not None
+
+    @property
+    def searched(self):
+        return bool(self.candidates)
+
+
+@dataclass(slots=True)
+class FileMatches:
+    """Files found by name or query, best match first."""
+    paths: list
+    filename: str | None = None
+    pattern: str | None = None
+    similar: bool = False  # nothing matched as written; these resemble it
+    total: int = 0  # matches before the top-K cut (0: all are in ``paths``)
+
+    def __str__(self):
+        if not self.paths:
+            if self.filename:
+                return f'No files found matching "{self.filename}" (searched case-insensitively)'
+            return f'No files found matching pattern "{self.pattern}" (searched case-insensitively)'
+        total = max(self.total, len(self.paths))
+        if self.similar:
+            header = f"Exact match not found, but found {total} similar file(s)"
+        else:
+            header = f"Found {total} file(s)"
+        if total > len(self.paths):
+            header += f", best {len(self.paths)} shown"
+        return "\n".join([header + ":"] + [f"  - {path}" for path in self.paths])
+
+    def to_json(self):
+        data = {"files": self.paths}
+        if self.similar:
+            data["similar"] = True
+        if self.total > len(self.paths):
+            data["total"] = self.total
+        return data
+
+
+def rank_paths(paths, requested=None):
+    """Sort relative paths best-first.
+
+    Paths ending with all of ``requested``'s segments come first (so
+    "pkg/render.py" prefers ".../pkg/render.py" over another "render.py"),
+    then shallower paths, then alphabetical order.
+    """
+    suffix = None
+    if requested:
+        parts = [part for part in requested.lower().replace("\\", "/").split("/") if part not in ("", ".")]
+        suffix = parts if len(parts) > 1 else None
+
+    def key(path):
+        segments = path.split(os.sep)
+        tail = suffix is not None and [s.lower() for s in segments[-len(suffix):]] == suffix
+        return (not tail, len(segments), path)
+
+    return sorted(paths, key=key)
+
+
+def resolve_path(working_directory, file_path, search=True):
+    """Resolve ``file_path`` inside the project.
+
+    An existing file resolves to itself. Otherwise, when ``search`` is set,
+    its base name is looked up once in the project's FileIndex and the
+    best-ranked match is used.
+    """
+    working_directory = os.path.abspath(working_directory)
+    full_path = os.path.abspath(os.path.join(working_directory, file_path))
+    if not full_path.startswith(working_directory):
+        return PathResolution(file_path, outside=True)
+    if os.path.isfile(full_path):
+        return PathResolution(file_path, os.path.relpath(full_path, working_directory), full_path)
+    if not search:
+        return PathResolution(file_path)
+
+    matches = FileIndex.for_root(working_directory).find_by_name(os.path.basename(file_path))
+    if not matches:
+        return PathResolution(file_path)
+    candidates = tuple(rank_paths(matches, file_path))
+    best = candidates[0]
+    return PathResolution(file_path, best, os.path.join(working_directory, best), candidates)
+
+
+def render_response(result, mode=None):
+    """The ``function_response`` payload for a tool's return value."""
+    mode = TOOL_RESULTS if mode is None else mode
+    if mode == "json" and hasattr(result, "to_json"):
+        return {"result": result.to_json()}
+    return {"result": result if isinstance(result, str) else str(result)}
@@ -1,68 +1,72 @@
 import os
+import signal
 import subprocess
+import time
 
+from functions.file_index import FileIndex
+from functions.output_capture import (
+    MAX_OUTPUT_KB,
+    OUTPUT_HEAD_KB,
+    OUTPUT_TAIL_KB,
+    BoundedCapture,
+    drain,
+    get_output_listener,
+)
+from functions.python_workers import run_in_warm_worker
+from functions.results import resolve_path
 
-def run_python_file(working_directory, file_path, args=[]):
+RUN_TIMEOUT = int(os.environ.get("AGENT_RUN_TIMEOUT", "30"))
+MAX_RUN_TIMEOUT = 600
+PIPE_DRAIN_GRACE = 0.5
+
+
+def run_python_file(working_directory, file_path, args=[], timeout=None, head_kb=None, tail_kb=None):
+    """Run a Python file and return its (bounded) output.
+
+    Only the first ``head_kb`` and last ``tail_kb`` KB of each stream are
+    kept. When an output listener is installed (interactive live output),
+    output is also forwarded to it as it is produced.
+    """
+    try:
+        timeout = RUN_TIMEOUT if timeout is None else min(max(1, int(timeout)), MAX_RUN_TIMEOUT)
+        head_bytes = min(max(0, int(OUTPUT_HEAD_KB if head_kb is None else head_kb)), MAX_OUTPUT_KB) * 1024
+        tail_bytes = min(max(0, int(OUTPUT_TAIL_KB if tail_kb is None else tail_kb)), MAX_OUTPUT_KB) * 1024
+    except (TypeError, ValueError):
+        return "Error: timeout, head_kb and tail_kb must be whole numbers"
     try:
-        full_path = os.path.join(working_directory, file_path)
-        full_path = os.path.abspath(full_path)
         working_directory = os.path.abspath(working_directory)
-        
-        # Check if file_path is outside working_directory
-        if not full_path.startswith(working_directory):
+        resolution = resolve_path(working_directory, file_path)
+        if resolution.outside:
             return f'Error: Cannot execute "{file_path}" as it is outside the project root'
-        
-        # Check if file exists - if not, try to find it
-        if not os.path.exists(full_path):
-            # Import find_files to search for the file
-            from functions.find_files import find_files
-            
-            # Extract just the filename from the path
+        if not resolution.found:
             filename = os.path.basename(file_path)
-            search_result = find_files(working_directory, filename=filename)
-            
-            # Check if we found the file
-            if search_result.startswith("Found"):
-                # Parse the result to get the first matching path
-                lines = search_result.split('\n')
-                if len(lines) > 1:
-                    # Get the first match (format: "  - path/to/file")
-                    first_match = lines[1].strip().replace('- ', '')
-                    
-                    # Update file_path and full_path with found location
-                    file_path = first_match
-                    full_path = os.path.join(working_directory, first_match)
-                    full_path = os.path.abspath(full_path)
-                    
-                    if not os.path.exists(full_path):
-                        return f'Error: File "{file_path}" not found.'
-                else:
-                    return f'Error: File "{file_path}" not found.'
-            else:
-                return f'Error: File "{file_path}" not found. Searched entire project but could not locate "{filename}".'
-        
+            return f'Error: File "{file_path}" not found. Searched entire project but could not locate "{filename}".'
+        if resolution.searched:
+            file_path = resolution.path
+        full_path = resolution.full_path
+
         # Check if file is a Python file
         if not file_path.endswith('.py'):
             return f'Error: "{file_path}" is not a Python file.'
         
-        # Run the Python file
-        cmd = ['python3', full_path] + args
-        completed_process = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=30,
-            cwd=working_directory
-        )
+        # Run the Python file, on a warm interpreter when that mode is enabled
+        # (live output needs pipes, so it always runs cold)
+        listener = get_output_listener()
+        completed_process = None
+        if listener is None:
+            completed_process = run_in_warm_worker(
+                full_path, args, working_directory, timeout, head_bytes, tail_bytes
+            )
+        if completed_process is None:
+            completed_process = _run_streaming(
+                ['python3', full_path] + list(args), working_directory, timeout,
+                head_bytes, tail_bytes, listener,
+            )
+        # The script may have created or removed files anywhere in the tree.
+        FileIndex.notify_changed(working_directory)
         
         # Format the output
-        output_parts = []
-        
-        if completed_process.stdout:
-            output_parts.append(f"STDOUT:\n{completed_process.stdout}")
-        
-        if completed_process.stderr:
-            output_parts.append(f"STDERR:\n{completed_process.stderr}")
+        output_parts = _format_streams(completed_process.stdout, completed_process.stderr)
         
         # Check if process exited with non-zero code
         if completed_process.returncode != 0:
@@ -74,8 +78,77 @@ def run_python_file(working_directory, file_path, args=[]):
         else:
             return "No output produced."
         
-    except subprocess.TimeoutExpired:
-        return "Error: executing Python file: Process timed out after 30 seconds"
+    except subprocess.TimeoutExpired as e:
+        FileIndex.notify_changed(working_directory)
+        message = f"Error: executing Python file: Process timed out after {timeout} seconds"
+        partial = _format_streams(e.output, e.stderr)
+        if partial:
+            message += "\nOutput before the timeout:\n" + "\n".join(partial)
+        return message
     except Exception as e:
         return f"Error: executing Python file: {e}"
 
+
+def _run_streaming(cmd, cwd, timeout, head_bytes, tail_bytes, listener):
+    """Run ``cmd`` reading its pipes as they fill, keeping only head and tail.
+
+    Returns a ``CompletedProcess`` with the rendered output, or raises
+    ``subprocess.TimeoutExpired`` (carrying the output so far) after killing
+    the process and anything it started.
+    """
+    env = None
+    if listener is not None:
+        env = dict(os.environ, PYTHONUNBUFFERED="1")  # so live output is not held back
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+        env=env,
+        start_new_session=os.name == "posix",
+    )
+    stdout = BoundedCapture(head_bytes, tail_bytes)
+    stderr = BoundedCapture(head_bytes, tail_bytes)
+    readers = [
+        drain(process.stdout, stdout, "stdout", listener),
+        drain(process.stderr, stderr, "stderr", listener),
+    ]
+    timed_out = False
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        _kill(process)
+    finally:
+        if process.poll() is None:
+            _kill(process)  # interrupted (e.g. KeyboardInterrupt): do not leave it running
+
+    # Whatever the script wrote is already in the pipes; background processes
+    # it started may keep them open, so only wait briefly for the readers.
+    grace = time.monotonic() + PIPE_DRAIN_GRACE
+    for reader in readers:
+        reader.join(max(0.0, grace - time.monotonic()))
+
+    if timed_out:
+        raise subprocess.TimeoutExpired(cmd, timeout, output=stdout.render(), stderr=stderr.render())
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout.render(), stderr.render())
+
+
+def _kill(process):
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except OSError:
+        pass
+    process.wait()
+
+
+def _format_streams(stdout, stderr):
+    output_parts = []
+    if stdout:
+        output_parts.append(f"STDOUT:\n{stdout}")
+    if stderr:
+        output_parts.append(f"STDERR:\n{stderr}")
+    return output_parts
@@ -0,0 +1,440 @@
+"""Discover and run the project's tests in parallel shards.
+
+Test files (``test*.py``, ``*_test.py``, ``tests.py``) are parsed with
+``ast`` to estimate how many tests each holds (TestCase classes, including
+ones derived from other classes in the same file, with their inherited
+``test*`` methods, and pytest-style ``test_*`` functions) without importing
+them. The files are split into shards of roughly equal size, at most one
+per CPU; a large file is split into parts. Each shard runs in its own
+interpreter with a timeout, imports its files and collects their tests
+the way ``python -m unittest`` does, with ``TestLoader.loadTestsFromModule``,
+so the estimate only affects the balance of the shards, never which tests
+run. The report aggregates pass/fail counts, failures with (trimmed)
+tracebacks and per-shard timings.
+
+pytest-style functions are called directly; ones that take arguments need
+pytest fixtures and are reported as skipped. ``async def`` tests, as
+functions or as methods of a plain ``TestCase``, run to completion with
+``asyncio.run``; ``IsolatedAsyncioTestCase`` runs its own.
+
+This file is also the shard runner itself when executed as a script.
+"""
+import ast
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+TEST_TIMEOUT = int(os.environ.get("AGENT_TEST_TIMEOUT", "300"))
+MIN_TESTS_PER_SHARD = 20
+MAX_REPORTED_FAILURES = 20
+MAX_TRACEBACK_LINES = 15
+
+
+def run_tests(working_directory, path=None, pattern=None, timeout=None, max_workers=None):
+    # Package imports stay local: the shard runner executes this file as a script.
+    from concurrent.futures import ThreadPoolExecutor
+
+    from functions.file_index import FileIndex
+
+    try:
+        working_directory = os.path.abspath(working_directory)
+        prefix = ""
+        if path and path not in (".", "./"):
+            full_path = os.path.abspath(os.path.join(working_directory, path))
+            if not full_path.startswith(working_directory):
+                return f'Error: Cannot run tests in "{path}" as it is outside the project root'
+            if not os.path.exists(full_path):
+                return f'Error: "{path}" does not exist'
+            prefix = os.path.relpath(full_path, working_directory)
+
+        files = [
+            p for p in FileIndex.for_root(working_directory).all_paths()
+            if _is_test_file(p) and (not prefix or p == prefix or p.startswith(prefix.rstrip(os.sep) + os.sep))
+        ]
+        units = [
+            unit for unit in (_discover(working_directory, rel_path, pattern) for rel_path in sorted(files))
+            if unit is not None
+        ]
+        file_count = len(units)
+        if not units:
+            where = f' in "{path}"' if prefix else ""
+            matching = f' matching "{pattern}"' if pattern else ""
+            return f"No tests found{where}{matching}"
+
+        timeout = TEST_TIMEOUT if timeout is None else max(1, int(timeout))
+        cpus = os.cpu_count() or 1
+        workers = max(1, min(int(max_workers or cpus), cpus))
+        shards = _make_shards(units, workers)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+            outcomes = list(pool.map(
+                lambda shard: _run_shard(working_directory, shard, pattern, timeout), shards
+            ))
+        wall_time = time.perf_counter() - start
+
+        FileIndex.notify_changed(working_directory)
+        return _format_report(shards, outcomes, file_count, wall_time)
+
+    except Exception as e:
+        return f"Error running tests: {str(e)}"
+
+
+def _is_test_file(rel_path):
+    name = os.path.basename(rel_path)
+    return name.endswith(".py") and (
+        name.startswith("test") or name.endswith("_test.py") or name == "tests.py"
+    )
+
+
+def _discover(working_directory, rel_path, pattern):
+    """Return the test unit of one file, with an estimated test count, or None.
+
+    The shard runner collects the actual tests, so every test file is kept
+    (an import error is reported like a failure). With a ``pattern``, files
+    with no matching test are dropped, unless their classes derive from
+    bases defined elsewhere.
+    """
+    try:
+        with open(os.path.join(working_directory, rel_path), "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=rel_path)
+    except (OSError, SyntaxError, ValueError):
+        # Let the shard report the import error instead of silently skipping
+        return {"file": rel_path, "count": 1}
+
+    pattern = pattern.lower() if pattern else None
+    classes = {node.name: node for node in tree.body if isinstance(node, ast.ClassDef)}
+
+    def base_names(node):
+        return [base.attr if isinstance(base, ast.Attribute) else getattr(base, "id", "") for base in node.bases]
+
+    def is_test_case(name, seen=()):
+        return any(
+            base.endswith("TestCase") or (base in classes and base not in seen and is_test_case(base, seen + (name,)))
+            for base in base_names(classes[name])
+        )
+
+    def test_methods(name, seen=()):
+        methods = {
+            item.name for item in classes[name].body
+            if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)) and item.name.startswith("test")
+        }
+        for base in base_names(classes[name]):
+            if base in classes and base not in seen:
+                methods |= test_methods(base, seen + (name,))
+        return methods
+
+    count = 0
+    unresolved = False
+    for name in classes:
+        if is_test_case(name):
+            count += sum(
+                1 for method in test_methods(name)
+                if pattern is None or pattern in f"{name}.{method}".lower()
+            )
+        elif any(base not in classes and base != "object" for base in base_names(classes[name])):
+            unresolved = True  # may derive from a TestCase in another module
+    count += sum(
+        1 for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test")
+        and (pattern is None or pattern in node.name.lower())
+    )
+    if not count and pattern is not None and not unresolved:
+        return None
+    return {"file": rel_path, "count": max(count, 1)}
+
+
+def _make_shards(units, workers):
+    """Split ``units`` into at most ``workers`` shards of similar test counts.
+
+    Small suites get fewer shards, since every shard pays for an interpreter
+    start; large files are split into parts so one file cannot dominate.
+    """
+    total = sum(unit["count"] for unit in units)
+    shard_count = max(1, min(workers, -(-total // MIN_TESTS_PER_SHARD)))
+    target = -(-total // shard_count)
+
+    pieces = []
+    for unit in units:
+        if unit["count"] > target:
+            parts = -(-unit["count"] // target)
+            for part in range(parts):
+                pieces.append(dict(unit, part=part, parts=parts, count=-(-unit["count"] // parts)))
+        else:
+            pieces.append(unit)
+
+    # Longest-first onto the least loaded shard
+    shards = [[] for _ in range(shard_count)]
+    loads = [0] * shard_count
+    for unit in sorted(pieces, key=lambda unit: -unit["count"]):
+        index = loads.index(min(loads))
+        shards[index].append(unit)
+        loads[index] += unit["count"]
+    return [shard for shard in shards if shard]
+
+
+def _run_shard(working_directory, units, pattern, timeout):
+    from functions.output_capture import BoundedCapture, drain
+
+    with tempfile.TemporaryDirectory() as scratch:
+        spec_path = os.path.join(scratch, "spec.json")
+        result_path = os.path.join(scratch, "results.jsonl")
+        with open(spec_path, "w", encoding="utf-8") as f:
+            json.dump({"root": working_directory, "pattern": pattern, "units": units}, f)
+
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            ["python3", os.path.abspath(__file__), spec_path, result_path],
+            cwd=working_directory,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            start_new_session=os.name == "posix",
+        )
+        output = BoundedCapture(2048, 2048)
+        reader = drain(process.stdout, output, "stdout")
+        timed_out = False
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+        finally:
+            if process.poll() is None:
+                _kill(process)
+        reader.join(1)
+        duration = time.perf_counter() - start
+
+        results = []
+        try:
+            with open(result_path, "r", encoding="utf-8") as f:
+                results = [json.loads(line) for line in f if line.strip()]
+        except OSError:
+            pass
+
+    crashed = None
+    if len(results) < len(units):
+        # Units run in order, so the first one without a result was running
+        current = _describe_shard(units[len(results):len(results) + 1])
+        not_run = len(units) - len(results) - 1
+        if timed_out:
+            crashed = f"timed out after {timeout} seconds in {current}"
+        else:
+            crashed = f"exited with code {process.returncode} in {current}"
+        if not_run:
+            crashed += f" ({not_run} later unit(s) not run)"
+    return {"results": results, "duration": duration, "crashed": crashed,
+            "output": output.render() if crashed else ""}
+
+
+def _kill(process):
+    import signal
+
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except OSError:
+        pass
+    process.wait()
+
+
+def _describe_shard(units):
+    labels = []
+    for unit in units:
+        if "parts" in unit:
+            labels.append(f"{unit['file']} (part {unit['part'] + 1}/{unit['parts']})")
+        else:
+            labels.append(unit["file"])
+    text = ", ".join(dict.fromkeys(labels))
+    return text if len(text) <= 100 else text[:97] + "..."
+
+
+def _format_report(shards, outcomes, file_count, wall_time):
+    ran = passed = skipped = 0
+    failures = []
+    shard_lines = []
+    for number, (units, outcome) in enumerate(zip(shards, outcomes), start=1):
+        shard_ran = 0
+        for result in outcome["results"]:
+            ran += result["tests"]
+            shard_ran += result["tests"]
+            skipped += result["skipped"]
+            passed += max(0, result["tests"] - result["skipped"] - len(result["failures"]))
+            failures.extend(result["failures"])
+        if outcome["crashed"]:
+            failures.append({
+                "kind": "ERROR",
+                "id": f"shard {number} ({_describe_shard(units)})",
+                "traceback": f"Shard {outcome['crashed']}.\n{outcome['output']}".strip(),
+            })
+        status = f", {outcome['crashed']}" if outcome["crashed"] else ""
+        shard_lines.append(
+            f"  #{number} {shard_ran} test(s) in {outcome['duration']:.2f}s{status}: {_describe_shard(units)}"
+        )
+    failed = sum(1 for failure in failures if failure["kind"] == "FAIL")
+    errors = len(failures) - failed
+
+    verdict = "OK" if not failures else "FAILED"
+    lines = [
+        f"{verdict}: ran {ran} test(s) from {file_count} file(s) in {len(shards)} shard(s), "
+        f"{wall_time:.2f}s wall: {passed} passed, {failed} failed, {errors} error(s), {skipped} skipped",
+        "Shards:",
+    ]
+    lines.extend(shard_lines)
+    for failure in failures[:MAX_REPORTED_FAILURES]:
+        lines.append("")
+        lines.append(f"{failure['kind']}: {failure['id']}")
+        lines.extend(_trim_traceback(failure["traceback"]))
+    if len(failures) > MAX_REPORTED_FAILURES:
+        lines.append(f"\n... {len(failures) - MAX_REPORTED_FAILURES} more failure(s) not shown")
+    return "\n".join(lines)
+
+
+def _trim_traceback(text):
+    lines = text.rstrip().splitlines()
+    if len(lines) > MAX_TRACEBACK_LINES:
+        lines = ["  ..."] + lines[-MAX_TRACEBACK_LINES:]
+    return ["  " + line for line in lines]
+
+
+# ---------------------------------------------------------------- shard runner
+
+
+def _run_units(spec_path, result_path):
+    import asyncio
+    import importlib.util
+    import inspect
+    import traceback
+    import unittest
+
+    with open(spec_path, "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    root = spec["root"]
+    pattern = spec["pattern"].lower() if spec.get("pattern") else None
+    # Resolve imports from the project root, as "python -m unittest" run there
+    # would, rather than from functions/, where this script lives
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:] = [entry for entry in sys.path if os.path.abspath(entry or ".") != script_dir]
+    sys.path.insert(0, root)
+    modules = {}
+    loader = unittest.TestLoader()
+
+    def load(rel_path):
+        if rel_path not in modules:
+            full_path = os.path.join(root, rel_path)
+            directory = os.path.dirname(full_path)
+            if directory not in sys.path:
+                sys.path.insert(0, directory)
+            name = "_shard_" + rel_path.replace(os.sep, "_").removesuffix(".py")
+            module_spec = importlib.util.spec_from_file_location(name, full_path)
+            module = importlib.util.module_from_spec(module_spec)
+            sys.modules[name] = module
+            module_spec.loader.exec_module(module)
+            modules[rel_path] = module
+        return modules[rel_path]
+
+    with open(result_path, "a", encoding="utf-8") as results:
+        for unit in spec["units"]:
+            record = {"file": unit["file"], "tests": 0, "skipped": 0, "failures": []}
+            prefix = f"{unit['file']}::"
+            try:
+                module = load(unit["file"])
+            except BaseException as e:
+                if unit.get("part", 0) == 0:
+                    # Start the traceback at the test file, hiding the import machinery
+                    full_path = os.path.join(root, unit["file"])
+                    tb = e.__traceback__
+                    while tb is not None and tb.tb_frame.f_code.co_filename != full_path:
+                        tb = tb.tb_next
+                    text = "".join(traceback.format_exception(type(e), e, tb or e.__traceback__))
+                    record["failures"].append({"kind": "ERROR", "id": prefix + "<import>", "traceback": text})
+                module = None
+
+            if module is not None:
+                # Every part collects the same ordered list and runs its slice of it
+                tests = [
+                    test for test in _flatten(loader.loadTestsFromModule(module))
+                    if pattern is None or pattern in _test_name(test).lower()
+                ]
+                functions = [
+                    name for name, value in vars(module).items()
+                    if name.startswith("test") and inspect.isfunction(value)
+                    and value.__module__ == module.__name__
+                    and (pattern is None or pattern in name.lower())
+                ]
+                items = tests + functions
+                if "parts" in unit:
+                    items = items[len(items) * unit["part"] // unit["parts"]:
+                                  len(items) * (unit["part"] + 1) // unit["parts"]]
+
+                for test in items:
+                    method = getattr(test, "_testMethodName", None)
+                    if (method and not isinstance(test, unittest.IsolatedAsyncioTestCase)
+                            and inspect.iscoroutinefunction(getattr(test, method))):
+                        # A plain TestCase would only create the coroutine and pass
+                        setattr(test, method, _awaited(getattr(test, method)))
+                # One suite, so setUpClass/setUpModule run once per class and module
+                suite = unittest.TestSuite(item for item in items if not isinstance(item, str))
+                result = unittest.TestResult()
+                suite.run(result)
+                record["tests"] = result.testsRun
+                record["skipped"] = len(result.skipped)
+                for kind, problems in (("FAIL", result.failures), ("ERROR", result.errors)):
+                    for test, text in problems:
+                        record["failures"].append({"kind": kind, "id": prefix + _test_name(test),
+                                                   "traceback": text})
+                for test in result.unexpectedSuccesses:
+                    record["failures"].append({"kind": "FAIL", "id": prefix + _test_name(test),
+                                               "traceback": "Unexpected success"})
+
+                for name in (item for item in items if isinstance(item, str)):
+                    function = getattr(module, name)
+                    record["tests"] += 1
+                    if inspect.signature(function).parameters:
+                        record["skipped"] += 1  # needs pytest fixtures
+                        continue
+                    try:
+                        if inspect.iscoroutinefunction(function):
+                            asyncio.run(function())
+                        else:
+                            function()
+                    except Exception as e:
+                        # Drop this runner's frame, as unittest does for its own
+                        text = "".join(traceback.format_exception(type(e), e, e.__traceback__.tb_next))
+                        record["failures"].append({"kind": "FAIL" if isinstance(e, AssertionError) else "ERROR",
+                                                   "id": prefix + name, "traceback": text})
+            results.write(json.dumps(record) + "\n")
+            results.flush()
+
+
+def _awaited(method):
+    import asyncio
+    import functools
+
+    @functools.wraps(method)
+    def run():
+        return asyncio.run(method())
+
+    return run
+
+
+def _flatten(suite):
+    for test in suite:
+        if hasattr(test, "_testMethodName") or not hasattr(test, "__iter__"):
+            yield test
+        else:
+            yield from _flatten(test)
+
+
+def _test_name(test):
+    method = getattr(test, "_testMethodName", None)
+    if method is None:  # setUpClass/setUpModule failures
+        return str(test)
+    return f"{type(test).__name__}.{method}"
+
+
+if __name__ == "__main__":
+    _run_units(sys.argv[1], sys.argv[2])
@@ -0,0 +1,234 @@
+"""Content search (grep) across the project.
+
+Files come from the project's FileIndex, so ignored directories are never
+visited. Each file is memory-mapped and scanned with a compiled bytes
+regex; binary files are skipped. Large searches are split into batches and
+run on a process pool so they use every core.
+"""
+import atexit
+import fnmatch
+import mmap
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from functions.file_index import FileIndex
+
+MAX_SEARCH_RESULTS = 100
+MAX_LINE_CHARS = 200
+MAX_SEARCH_FILE_BYTES = 256 * 1024 * 1024
+BINARY_SNIFF_BYTES = 8192
+PARALLEL_MIN_FILES = 200
+BATCH_FILES = 256
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def search_code(working_directory, query, regex=False, path=None, glob=None,
+                context_lines=0, case_sensitive=False, max_results=MAX_SEARCH_RESULTS):
+    """Search file contents and return compact ``path:line: text`` hits."""
+    try:
+        working_directory = os.path.abspath(working_directory)
+        if not query:
+            return "Error: query must not be empty"
+
+        prefix = ""
+        if path and path not in (".", "./"):
+            full_path = os.path.abspath(os.path.join(working_directory, path))
+            if not full_path.startswith(working_directory):
+                return f'Error: Cannot search "{path}" as it is outside the project root'
+            if not os.path.exists(full_path):
+                return f'Error: "{path}" does not exist'
+            prefix = os.path.relpath(full_path, working_directory)
+
+        pattern = query if regex else re.escape(query)
+        flags = re.MULTILINE | (0 if case_sensitive else re.IGNORECASE)
+        try:
+            re.compile(pattern.encode("utf-8"), flags)
+        except re.error as e:
+            return f"Error: invalid regular expression: {e}"
+
+        files = _candidate_files(working_directory, prefix, glob)
+        max_results = max(1, int(max_results))
+        context_lines = max(0, int(context_lines))
+        job = (working_directory, pattern.encode("utf-8"), flags, context_lines, max_results)
+
+        hits = []
+        if len(files) < PARALLEL_MIN_FILES or (os.cpu_count() or 1) < 2:
+            hits = _search_batch(job, files)
+        else:
+            try:
+                hits = _search_parallel(job, files, max_results)
+            except BrokenProcessPool:
+                _reset_pool()
+                hits = _search_batch(job, files)
+
+        return _format_hits(query, hits, max_results)
+
+    except Exception as e:
+        return f"Error searching code: {str(e)}"
+
+
+def _candidate_files(working_directory, prefix, glob):
+    paths = FileIndex.for_root(working_directory).all_paths()
+    if prefix:
+        if os.path.isfile(os.path.join(working_directory, prefix)):
+            paths = [prefix]
+        else:
+            dir_prefix = prefix.rstrip(os.sep) + os.sep
+            paths = [p for p in paths if p.startswith(dir_prefix)]
+    if glob:
+        match_path = os.sep in glob or "/" in glob
+        paths = [
+            p for p in paths
+            if fnmatch.fnmatch(p if match_path else os.path.basename(p), glob)
+        ]
+    paths.sort()
+    return paths
+
+
+def _search_parallel(job, files, max_results):
+    batches = [files[i:i + BATCH_FILES] for i in range(0, len(files), BATCH_FILES)]
+    futures = [_get_pool().submit(_search_batch, job, batch) for batch in batches]
+    hits = []
+    matched = 0
+    # Collect in submission order so results are deterministic.
+    for future in futures:
+        if matched >= max_results:
+            future.cancel()
+            continue
+        batch_hits = future.result()
+        hits.extend(batch_hits)
+        matched += sum(1 for hit in batch_hits if hit[2])
+    return hits
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Never fork: the agent runs tools on threads.
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context(method),
+            )
+            atexit.register(_pool.shutdown, cancel_futures=True)
+        return _pool
+
+
+def _search_batch(job, files):
+    """Search ``files``; returns a list of ``(path, line_no, is_match, text)``."""
+    root, pattern, flags, context_lines, max_results = job
+    regex = re.compile(pattern, flags)
+    hits = []
+    matched = 0
+    for rel_path in files:
+        if matched >= max_results:
+            break
+        try:
+            file_hits = _search_file(os.path.join(root, rel_path), regex, context_lines,
+                                     max_results - matched)
+        except (OSError, ValueError):
+            continue
+        for line_no, is_match, text in file_hits:
+            hits.append((rel_path, line_no, is_match, text))
+            matched += is_match
+    return hits
+
+
+def _search_file(full_path, regex, context_lines, limit):
+    size = os.path.getsize(full_path)
+    if size == 0 or size > MAX_SEARCH_FILE_BYTES:
+        return []
+    with open(full_path, "rb") as f:
+        if b"\0" in f.read(BINARY_SNIFF_BYTES):
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            hits = []
+            emitted_through = 0
+            line_no = 1
+            counted_to = 0
+            match = regex.search(mm)
+            found = 0
+            while match and found < limit:
+                pos = match.start()
+                line_no += mm[counted_to:pos].count(b"\n")
+                counted_to = pos
+                start = mm.rfind(b"\n", 0, pos) + 1
+                end = mm.find(b"\n", pos)
+                end = size if end == -1 else end
+
+                if context_lines:
+                    before = []
+                    cursor = start
+                    for _ in range(context_lines):
+                        if cursor == 0 or line_no - len(before) - 1 <= emitted_through:
+                            break
+                        prev_start = mm.rfind(b"\n", 0, cursor - 1) + 1
+                        before.append((line_no - len(before) - 1, False, mm[prev_start:cursor - 1]))
+                        cursor = prev_start
+                    hits.extend(reversed(before))
+                hits.append((line_no, True, mm[start:end]))
+                emitted_through = line_no
+                found += 1
+
+                cursor = end
+                for offset in range(1, context_lines + 1):
+                    if cursor >= size:
+                        break
+                    next_end = mm.find(b"\n", cursor + 1)
+                    next_end = size if next_end == -1 else next_end
+                    following = regex.search(mm, cursor + 1, next_end)
+                    if following:
+                        break  # the next match prints this line itself
+                    hits.append((line_no + offset, False, mm[cursor + 1:next_end]))
+                    emitted_through = line_no + offset
+                    cursor = next_end
+
+                # One hit per line: resume after the end of the matched line.
+                if end >= size:
+                    break
+                match = regex.search(mm, end + 1)
+    return [
+        (n, is_match, _clip(text.decode("utf-8", errors="replace")))
+        for n, is_match, text in hits
+    ]
+
+
+def _clip(text):
+    text = text.strip()
+    if len(text) > MAX_LINE_CHARS:
+        return text[:MAX_LINE_CHARS] + "..."
+    return text
+
+
+def _format_hits(query, hits, max_results):
+    matches = [hit for hit in hits if hit[2]]
+    if not matches:
+        return f'No matches found for "{query}"'
+    capped = len(matches) >= max_results
+    if capped:
+        # Drop trailing context/matches beyond the cap.
+        last = [i for i, hit in enumerate(hits) if hit[2]][max_results - 1]
+        hits = hits[:last + 1]
+        matches = matches[:max_results]
+    files = len({hit[0] for hit in matches})
+    lines = [f"Found {len(matches)} match(es) in {files} file(s)"
+             + (f" (capped at {max_results})" if capped else "") + ":"]
+    for path, line_no, is_match, text in hits:
+        separator = ":" if is_match else "-"
+        lines.append(f"{path}{separator}{line_no}{separator} {text}")
+    return "\n".join(lines)
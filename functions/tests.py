@@ -0,0 +1,730 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import textwrap
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from functions.edit_file import edit_file
+from functions.file_index import FileIndex
+from functions.find_files import find_files
+from functions.path_query import PathQuery
+from functions.python_workers import WarmPythonPool
+from functions.get_file_content import get_file_content
+from functions.get_files_info import get_files_info
+from functions.line_index import LineIndex
+from functions.output_capture import BoundedCapture
+from functions.run_python_file import run_python_file
+from functions.run_tests import run_tests
+from functions import search_code as search_module
+from functions.search_code import search_code
+
+
+def write_files(root, files):
+    for rel_path, content in files.items():
+        full_path = os.path.join(root, rel_path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "w", encoding="utf-8") as f:
+            f.write(textwrap.dedent(content))
+
+
+class TestRunTests(unittest.TestCase):
+    """Test suite for the run_tests tool."""
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.root = self.scratch.name
+
+    def tearDown(self):
+        self.scratch.cleanup()
+
+    def test_inherited_tests_run(self):
+        write_files(self.root, {"test_inherit.py": """
+            import unittest
+
+            class Base(unittest.TestCase):
+                def test_a(self):
+                    pass
+
+            class Derived(Base):
+                def test_b(self):
+                    self.fail("derived")
+        """})
+        result = run_tests(self.root)
+        self.assertTrue(result.startswith("FAILED: ran 3 test(s)"), result)
+        self.assertIn("2 passed, 1 failed", result)
+        self.assertIn("FAIL: test_inherit.py::Derived.test_b", result)
+
+    def test_base_from_another_module(self):
+        write_files(self.root, {
+            "helpers/base.py": """
+                import unittest
+
+                class Checks(unittest.TestCase):
+                    def test_shared(self):
+                        pass
+            """,
+            "tests/test_derived.py": """
+                from helpers.base import Checks
+
+                class MoreChecks(Checks):
+                    def test_more(self):
+                        pass
+            """,
+        })
+        result = run_tests(self.root)
+        # Checks is imported into the test module, so unittest runs it too
+        self.assertTrue(result.startswith("OK: ran 3 test(s)"), result)
+
+    def test_errors_and_import_errors(self):
+        write_files(self.root, {
+            "test_errors.py": """
+                def test_error():
+                    raise KeyError("missing")
+
+                def test_passes():
+                    assert True
+            """,
+            "test_broken.py": "import does_not_exist\n",
+        })
+        result = run_tests(self.root)
+        self.assertTrue(result.startswith("FAILED: ran 2 test(s)"), result)
+        self.assertIn("1 passed, 0 failed, 2 error(s)", result)
+        self.assertIn("ERROR: test_errors.py::test_error", result)
+        self.assertIn("ERROR: test_broken.py::<import>", result)
+
+    def test_pattern(self):
+        write_files(self.root, {"test_pattern.py": """
+            import unittest
+
+            class Arithmetic(unittest.TestCase):
+                def test_division(self):
+                    pass
+
+                def test_addition(self):
+                    pass
+        """})
+        self.assertTrue(run_tests(self.root, pattern="DIVISION").startswith("OK: ran 1 test(s)"))
+        self.assertTrue(run_tests(self.root, pattern="arithmetic").startswith("OK: ran 2 test(s)"))
+        self.assertTrue(run_tests(self.root, pattern="nothing").startswith("No tests found"))
+
+    def test_shards_split_large_files(self):
+        methods = "".join(f"\n    def test_{i}(self):\n        self.assertNotEqual({i}, 37)\n" for i in range(60))
+        write_files(self.root, {
+            "test_large.py": "import unittest\n\nclass Large(unittest.TestCase):" + methods,
+            "test_small.py": "def test_one():\n    pass\n",
+        })
+        with mock.patch("functions.run_tests.os.cpu_count", return_value=3):
+            result = run_tests(self.root)
+        self.assertTrue(result.startswith("FAILED: ran 61 test(s) from 2 file(s) in 3 shard(s)"), result)
+        self.assertIn("60 passed, 1 failed", result)
+        self.assertIn("FAIL: test_large.py::Large.test_37", result)
+        self.assertIn("test_large.py (part 1/3)", result)
+
+    def test_imports_resolve_from_project_root(self):
+        write_files(self.root, {
+            "app/settings.py": "NAME = 'app'\n",
+            "app/tests/test_settings.py": """
+                from app.settings import NAME
+
+                def test_name():
+                    assert NAME == "app"
+            """,
+        })
+        result = run_tests(self.root, path="app")
+        self.assertTrue(result.startswith("OK: ran 1 test(s)"), result)
+
+    def test_async_tests_are_awaited(self):
+        write_files(self.root, {"test_async.py": """
+            import asyncio
+            import unittest
+
+            async def test_function():
+                await asyncio.sleep(0)
+                assert False, "function"
+
+            class Plain(unittest.TestCase):
+                async def test_method(self):
+                    self.fail("method")
+
+            class Isolated(unittest.IsolatedAsyncioTestCase):
+                async def test_isolated(self):
+                    self.fail("isolated")
+
+                async def test_passes(self):
+                    await asyncio.sleep(0)
+        """})
+        result = run_tests(self.root)
+        self.assertTrue(result.startswith("FAILED: ran 4 test(s)"), result)
+        self.assertIn("1 passed, 3 failed", result)
+        for test_id in ("test_function", "Plain.test_method", "Isolated.test_isolated"):
+            self.assertIn(f"FAIL: test_async.py::{test_id}", result)
+
+    def test_path_outside_root(self):
+        self.assertTrue(run_tests(self.root, path="..").startswith("Error:"))
+
+
+class TestEditFile(unittest.TestCase):
+    """Test suite for the edit_file tool."""
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.root = self.scratch.name
+        write_files(self.root, {"pkg/module.py": "def add(a, b):\n    return a + b\n\n\ndef sub(a, b):\n    return a - b\n"})
+
+    def tearDown(self):
+        self.scratch.cleanup()
+
+    def read(self, rel_path="pkg/module.py"):
+        with open(os.path.join(self.root, rel_path), "r", encoding="utf-8", newline="") as f:
+            return f.read()
+
+    def test_search_replace(self):
+        result = edit_file(self.root, "pkg/module.py", [{"search": "return a - b", "replace": "return a - b - 0"}])
+        self.assertTrue(result.startswith('Successfully edited "pkg/module.py" (1 hunk(s), +1 -1 lines)'), result)
+        self.assertIn("@@ -6,1 +6,1 @@\n-    return a - b\n+    return a - b - 0", result)
+        self.assertIn("return a - b - 0\n", self.read())
+
+    def test_search_matches_crlf_file(self):
+        with open(os.path.join(self.root, "dos.txt"), "w", encoding="utf-8", newline="") as f:
+            f.write("one\r\ntwo\r\nthree\r\n")
+        result = edit_file(self.root, "dos.txt", [{"search": "one\ntwo", "replace": "1\n2"}])
+        self.assertTrue(result.startswith("Successfully edited"), result)
+        self.assertEqual(self.read("dos.txt"), "1\r\n2\r\nthree\r\n")
+
+    def test_line_ranges(self):
+        result = edit_file(self.root, "pkg/module.py", [
+            {"start_line": 1, "end_line": 0, "replace": "import math"},
+            {"start_line": 5, "end_line": 6, "replace": "def sub(a, b):\n    return math.fsum([a, -b])"},
+        ])
+        self.assertTrue(result.startswith("Successfully edited"), result)
+        self.assertEqual(self.read(), "import math\ndef add(a, b):\n    return a + b\n\n\n"
+                                      "def sub(a, b):\n    return math.fsum([a, -b])\n")
+
+    def test_append_after_last_line_without_newline(self):
+        write_files(self.root, {"notes.txt": "first"})
+        edit_file(self.root, "notes.txt", [{"start_line": 2, "end_line": 1, "replace": "second"}])
+        self.assertEqual(self.read("notes.txt"), "first\nsecond")
+
+    def test_replace_last_lines_keeps_final_newline(self):
+        edit_file(self.root, "pkg/module.py", [{"start_line": 6, "end_line": 6, "replace": "    return b - a"}])
+        self.assertTrue(self.read().endswith("\n    return b - a\n"))
+        edit_file(self.root, "pkg/module.py", [{"start_line": 7, "end_line": 6, "replace": "VERSION = 1"}])
+        self.assertTrue(self.read().endswith("\n    return b - a\nVERSION = 1\n"))
+
+    def test_errors_leave_file_unchanged(self):
+        original = self.read()
+        cases = [
+            ([{"search": "(a, b)", "replace": "(x, y)"}], "matches 2 times"),
+            ([{"search": "return a * b", "replace": ""}], "search text not found"),
+            ([{"start_line": 9, "replace": ""}], "outside the file"),
+            ([{"search": "return a + b", "replace": "pass"}, {"start_line": 2, "replace": "pass"}], "overlap"),
+            ([{"search": "return a + b", "replace": "pass"}, {"search": "missing", "replace": ""}], "hunk 2"),
+            ([{"start_line": 1}], "missing 'replace'"),
+            ([], "at least one hunk"),
+        ]
+        for edits, message in cases:
+            with self.subTest(message=message):
+                result = edit_file(self.root, "pkg/module.py", edits)
+                self.assertTrue(result.startswith("Error:"), result)
+                self.assertIn(message, result)
+                self.assertEqual(self.read(), original)
+
+    def test_bare_names(self):
+        result = edit_file(self.root, "module.py", [{"search": "a + b", "replace": "b + a"}])
+        self.assertTrue(result.startswith('Successfully edited "pkg/module.py"'), result)
+        write_files(self.root, {"other/module.py": "a + b\n"})
+        FileIndex.notify_changed(self.root)
+        result = edit_file(self.root, "module.py", [{"search": "a + b", "replace": "b + a"}])
+        self.assertTrue(result.startswith('Error: "module.py" is ambiguous'), result)
+        self.assertTrue(edit_file(self.root, "missing.py", [{"start_line": 1, "replace": ""}]).startswith("Error:"))
+        self.assertTrue(edit_file(self.root, "../module.py", [{"start_line": 1, "replace": ""}]).startswith("Error:"))
+
+    def test_write_is_atomic(self):
+        original = self.read()
+        path = os.path.join(self.root, "pkg", "module.py")
+        os.chmod(path, 0o750)
+        with mock.patch("functions.write_file.os.replace", side_effect=OSError("disk full")):
+            result = edit_file(self.root, "pkg/module.py", [{"search": "a + b", "replace": "b + a"}])
+        self.assertEqual(result, "Error: disk full")
+        self.assertEqual(self.read(), original)
+        self.assertEqual(sorted(os.listdir(os.path.dirname(path))), ["module.py"])
+
+        edit_file(self.root, "pkg/module.py", [{"search": "a + b", "replace": "b + a"}])
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o750)
+
+    def test_symlink_is_written_through(self):
+        os.symlink("module.py", os.path.join(self.root, "pkg", "alias.py"))
+        result = edit_file(self.root, "pkg/alias.py", [{"search": "a + b", "replace": "b + a"}])
+        self.assertTrue(result.startswith("Successfully edited"), result)
+        self.assertTrue(os.path.islink(os.path.join(self.root, "pkg", "alias.py")))
+        self.assertIn("return b + a", self.read())
+
+    def test_insertions_at_one_line_keep_their_order(self):
+        edit_file(self.root, "pkg/module.py", [
+            {"start_line": 1, "end_line": 0, "replace": "import sys"},
+            {"start_line": 1, "end_line": 0, "replace": "import math"},
+        ])
+        self.assertTrue(self.read().startswith("import sys\nimport math\ndef add"))
+
+
+class TestRunPythonFile(unittest.TestCase):
+    """Test suite for bounded output capture in run_python_file."""
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.root = self.scratch.name
+        write_files(self.root, {"noisy.py": """
+            import sys
+            print("start")
+            for i in range(5000):
+                print(f"line {i}")
+            print("bad", file=sys.stderr)
+            sys.exit(3)
+        """})
+
+    def tearDown(self):
+        self.scratch.cleanup()
+
+    def test_capture_keeps_head_and_tail(self):
+        capture = BoundedCapture(4, 3)
+        for chunk in (b"ab", b"cdefgh", b"ij", b"k"):
+            capture.feed(chunk)
+        self.assertEqual((bytes(capture.head), capture.tail, capture.total), (b"abcd", b"ijk", 11))
+        self.assertEqual(capture.render(), "abcd\n... [4 bytes omitted] ...\nijk")
+
+        small = BoundedCapture(8, 8)
+        small.feed(b"short")
+        self.assertEqual(small.render(), "short")
+
+    def test_output_is_bounded(self):
+        result = run_python_file(self.root, "noisy.py", head_kb=1, tail_kb=1)
+        self.assertIn("start\nline 0\n", result)
+        self.assertIn("bytes omitted", result)
+        self.assertIn("line 4999\n", result)
+        self.assertIn("bad", result)
+        self.assertIn("Process exited with code 3", result)
+        self.assertLess(len(result), 3000)
+
+    def test_bad_limits_are_tool_errors(self):
+        for limits in ({"timeout": "soon"}, {"head_kb": "lots"}, {"tail_kb": [1]}):
+            with self.subTest(limits=limits):
+                self.assertTrue(run_python_file(self.root, "noisy.py", **limits).startswith("Error:"))
+
+
+class TestFindFiles(unittest.TestCase):
+    """Test suite for ranked path queries in find_files."""
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.root = self.scratch.name
+        write_files(self.root, {path: "" for path in (
+            "README.md",
+            "calculator/main.py",
+            "calculator/pkg/calculator.py",
+            "calculator/pkg/render.py",
+            "calculator/tests/test_render.py",
+            "docs/render_notes.md",
+            "tools/renderer.py",
+            "deep/a/b/c/render.py",
+        )})
+
+    def tearDown(self):
+        self.scratch.cleanup()
+
+    def find(self, **args):
+        return find_files(self.root, **args)
+
+    def test_exact_name_ranks_shallow_paths_first(self):
+        matches = self.find(filename="render.py")
+        self.assertEqual(matches.paths, ["calculator/pkg/render.py", "deep/a/b/c/render.py"])
+        self.assertFalse(matches.similar)
+
+    def test_text_ranking(self):
+        paths = self.find(pattern="render").paths
+        # Stem match, then prefix, then substring
+        self.assertEqual(paths[:2], ["calculator/pkg/render.py", "deep/a/b/c/render.py"])
+        self.assertLess(paths.index("tools/renderer.py"), paths.index("calculator/tests/test_render.py"))
+
+    def test_path_segments(self):
+        self.assertEqual(self.find(pattern="calc/pkg/render").paths, ["calculator/pkg/render.py"])
+
+    def test_globs(self):
+        self.assertEqual(self.find(pattern="test_*.py").paths, ["calculator/tests/test_render.py"])
+        self.assertEqual(self.find(pattern="calculator/pkg/*.py").paths,
+                         ["calculator/pkg/calculator.py", "calculator/pkg/render.py"])
+        self.assertEqual(self.find(pattern="/deep/**/render.py").paths, ["deep/a/b/c/render.py"])
+        self.assertEqual(self.find(pattern="*.md").total, 2)
+
+    def test_misspelled_names(self):
+        matches = self.find(pattern="calcualtor.py")
+        self.assertTrue(matches.similar)
+        self.assertEqual(matches.paths[0], "calculator/pkg/calculator.py")
+        fallback = self.find(filename="rendr.py")
+        self.assertTrue(fallback.similar)
+        self.assertIn("calculator/pkg/render.py", fallback.paths)
+
+    def test_limit_and_total(self):
+        matches = self.find(pattern="render", limit=2)
+        self.assertEqual((len(matches.paths), matches.total), (2, 5))
+        self.assertIn("best 2 shown", str(matches))
+
+    def test_file_matching_name_and_pattern_counts_once(self):
+        matches = self.find(filename="README.md", pattern="readme")
+        self.assertEqual((matches.paths, matches.total), (["README.md"], 1))
+        self.assertTrue(str(matches).startswith("Found 1 file(s):"))
+        matches = self.find(filename="render.py", pattern="render", limit=1)
+        self.assertEqual(matches.total, 5)
+
+
+class TestSearchCode(unittest.TestCase):
+    """Test suite for content search in search_code."""
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.root = self.scratch.name
+        write_files(self.root, {
+            "pkg/alpha.py": "import os\n\n\ndef load(path):\n    return os.path.exists(path)\n",
+            "pkg/beta.py": "# TODO: load lazily\nVALUE = 1\n",
+            "notes.md": "load the docs\n",
+            "empty.py": "",
+        })
+        with open(os.path.join(self.root, "pkg", "blob.bin"), "wb") as f:
+            f.write(b"load\0\1\2")
+
+    def tearDown(self):
+        self.scratch.cleanup()
+
+    def search(self, query, **args):
+        return search_code(self.root, query, **args)
+
+    def test_matches_skip_binary_files(self):
+        result = self.search("LOAD")
+        self.assertEqual(result.splitlines(), [
+            "Found 3 match(es) in 3 file(s):",
+            "notes.md:1: load the docs",
+            "pkg/alpha.py:4: def load(path):",
+            "pkg/beta.py:1: # TODO: load lazily",
+        ])
+        self.assertEqual(self.search("LOAD", case_sensitive=True), 'No matches found for "LOAD"')
+
+    def test_context_and_filters(self):
+        result = self.search("def load", path="pkg", context_lines=1)
+        self.assertEqual(result.splitlines()[1:], [
+            "pkg/alpha.py-3- ",
+            "pkg/alpha.py:4: def load(path):",
+            "pkg/alpha.py-5- return os.path.exists(path)",
+        ])
+        self.assertIn("Found 1 match", self.search(r"VALUE\s*=\s*\d", regex=True, glob="*.py"))
+        self.assertEqual(self.search("load", glob="*.md").splitlines()[1:], ["notes.md:1: load the docs"])
+        self.assertIn("(capped at 1)", self.search("load", max_results=1))
+        self.assertTrue(self.search("(", regex=True).startswith("Error: invalid regular expression"))
+        self.assertTrue(self.search("load", path="..").startswith("Error:"))
+
+    def test_process_pool_matches_serial_search(self):
+        write_files(self.root, {f"gen/module_{i:02}.py": f"def handler_{i}():\n    return {i}\n" for i in range(12)})
+        FileIndex.notify_changed(self.root)
+        serial = self.search("return", max_results=10)
+        self.addCleanup(search_module._reset_pool)
+        with mock.patch.object(search_module, "PARALLEL_MIN_FILES", 4), \
+                mock.patch.object(search_module, "BATCH_FILES", 3), \
+                mock.patch("functions.search_code.os.cpu_count", return_value=2):
+            parallel = self.search("return", max_results=10)
+            self.assertIsNotNone(search_module._pool)  # not reset by a fallback
+            with mock.patch.object(search_module, "_search_parallel",
+                                   side_effect=search_module.BrokenProcessPool("worker died")):
+                fallback = self.search("return", max_results=10)
+        self.assertIn("(capped at 10)", serial)
+        self.assertEqual(parallel, serial)
+        self.assertEqual(fallback, serial)
+
+
+class TestBenchTools(unittest.TestCase):
+    """Test suite for the synthetic trees and the tool benchmark runner."""
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.root = self.scratch.name
+
+    def tearDown(self):
+        self.scratch.cleanup()
+
+    def test_synthetic_tree_is_deterministic_and_reused(self):
+        from benchmarks.synthetic import generate_tree
+
+        first = generate_tree(os.path.join(self.root, "a"), 120, seed=3)
+        self.assertEqual(len(set(first)), 120)
+        self.assertEqual(generate_tree(os.path.join(self.root, "b"), 120, seed=3), first)
+        self.assertTrue(all(os.path.isfile(os.path.join(self.root, "a", rel)) for rel in first))
+        with mock.patch("benchmarks.synthetic.random.Random", side_effect=AssertionError("regenerated")):
+            self.assertEqual(generate_tree(os.path.join(self.root, "a"), 120, seed=3), first)
+
+    def test_sizes_and_comparison(self):
+        from benchmarks.bench_tools import compare, parse_size, size_label
+
+        for text, size in (("1k", 1000), ("100K", 100000), ("1m", 1000000), ("1.5k", 1500), ("300", 300)):
+            self.assertEqual(parse_size(text), size)
+            self.assertEqual(parse_size(size_label(size)), size)
+        baseline = {"slow": {"median_ms": 10.0}, "noisy": {"median_ms": 0.01}, "same": {"median_ms": 5.0}}
+        results = {"slow": {"median_ms": 20.0}, "noisy": {"median_ms": 0.05}, "same": {"median_ms": 5.1},
+                   "added": {"median_ms": 1.0}}
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(compare(baseline, results, threshold=0.25), ["slow"])
+
+    def test_run_writes_a_baseline(self):
+        from benchmarks.bench_tools import main
+
+        output = os.path.join(self.root, "baseline.json")
+        argv = ["--sizes", "150", "--workdir", os.path.join(self.root, "work"), "--big-file-mb", "1",
+                "--flat-entries", "30", "--repeat", "1", "--startup-budget-ms", "100000", "--output", output]
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(main(argv), 0)
+        with open(output, "r", encoding="utf-8") as f:
+            results = json.load(f)["results"]
+        for name in ("find_files.exact_hit[150]", "get_files_info.flat[30]",
+                     "get_file_content.big_tail[1mb]", "startup.main_help"):
+            self.assertGreater(results[name]["median_ms"], 0, name)
+
+
+class TestGetFileContent(unittest.TestCase):
+    """Test suite for range, line and tail reads in get_file_content."""
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.root = self.scratch.name
+        write_files(self.root, {"lines.txt": "".join(f"line {i}\n" for i in range(1, 3001))})
+
+    def tearDown(self):
+        self.scratch.cleanup()
+
+    def read(self, file_path="lines.txt", **args):
+        return get_file_content(self.root, file_path, **args)
+
+    def test_line_ranges(self):
+        self.assertEqual(self.read(start_line=2, end_line=3), '[Lines 2-3 of "lines.txt"]\nline 2\nline 3\n')
+        self.assertEqual(self.read(start_line=2999), '[Lines 2999-3000 of "lines.txt"]\nline 2999\nline 3000\n')
+        self.assertIn("fewer than 3001 lines", self.read(start_line=3001))
+        self.assertTrue(self.read(start_line=5, end_line=4).startswith("Error:"))
+
+    def test_line_budget_counts_characters(self):
+        write_files(self.root, {"wide.txt": "ééééé\n" * 10})
+        with mock.patch("functions.get_file_content.MAX_FILE_CHARS", 20):
+            result = self.read("wide.txt", start_line=1)
+            self.assertEqual(result, '[Lines 1-3 of "wide.txt"]\n' + "ééééé\n" * 3
+                             + "\n[...Stopped at 20 characters; continue with start_line=4]")
+            write_files(self.root, {"long.txt": "é" * 50 + "\nnext\n"})
+            result = self.read("long.txt", start_line=1)
+            self.assertTrue(result.endswith("\n" + "é" * 20), result)
+            self.assertNotIn("\ufffd", result)
+
+    def test_tail_and_byte_ranges(self):
+        self.assertEqual(self.read(tail_lines=2), '[Last 2 lines of "lines.txt"]\nline 2999\nline 3000\n')
+        write_files(self.root, {"short.txt": "a\nb\nc"})
+        self.assertEqual(self.read("short.txt", tail_lines=2), '[Last 2 lines of "short.txt"]\nb\nc')
+        self.assertEqual(self.read("short.txt", tail_lines=10), '[Last 3 lines of "short.txt"]\na\nb\nc')
+        self.assertEqual(self.read(offset=7, length=6), '[Bytes 7-13 of 28893 in "lines.txt"]\nline 2')
+        self.assertTrue(self.read(tail_lines=0).startswith("Error:"))
+
+    def test_line_index_seeks_to_checkpoints(self):
+        path = os.path.join(self.root, "lines.txt")
+        with open(path, "rb") as f:
+            starts = [0]
+            for line in f:
+                starts.append(starts[-1] + len(line))
+        with mock.patch("functions.line_index.SCAN_CHUNK_BYTES", 100), open(path, "rb") as f:
+            index = LineIndex(path, None, stride=7)
+            for line in (2900, 1, 8, 15, 1234, 3000):
+                self.assertTrue(index.line_offset(f, line))
+                self.assertEqual(f.tell(), starts[line - 1], line)
+            self.assertFalse(index.line_offset(f, 3001))
+            self.assertEqual(index.count_lines(f), 3000)
+            self.assertEqual(list(index.checkpoints), starts[:3000:7])
+
+
+class TestGetFilesInfo(unittest.TestCase):
+    """Test suite for tree listings and pagination in get_files_info."""
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.root = self.scratch.name
+        write_files(self.root, {
+            "README.md": "x",
+            "pkg/a.py": "12345",
+            "pkg/b.txt": "",
+            "pkg/sub/c.py": "ab",
+            ".git/HEAD": "ref",
+            "__pycache__/m.pyc": "",
+        })
+        os.symlink(os.path.join("pkg", "a.py"), os.path.join(self.root, "link.py"))
+
+    def tearDown(self):
+        self.scratch.cleanup()
+
+    def listing(self, **args):
+        return get_files_info(self.root, **args)
+
+    def test_one_level(self):
+        self.assertEqual(self.listing().splitlines(), [
+            "./", ".git/", "README.md 1", "__pycache__/", "link.py@", "pkg/", "[5 entries]",
+        ])
+
+    def test_recursive_and_depth(self):
+        self.assertEqual(self.listing(recursive=True).splitlines(), [
+            "./", ".git/ (skipped)", "README.md 1", "__pycache__/ (skipped)", "link.py@", "pkg/",
+            "  a.py 5", "  b.txt 0", "  sub/", "    c.py 2", "[9 entries]",
+        ])
+        self.assertEqual(self.listing(directory="pkg", max_depth=1).splitlines(),
+                         ["pkg/", "a.py 5", "b.txt 0", "sub/", "[3 entries]"])
+
+    def test_pattern_keeps_parent_directories(self):
+        self.assertEqual(self.listing(recursive=True, pattern="*.py").splitlines(), [
+            "./", "link.py@", "pkg/", "  a.py 5", "  sub/", "    c.py 2", "[3 entries]",
+        ])
+        self.assertEqual(self.listing(recursive=True, pattern="pkg/sub/*").splitlines(),
+                         ["./", "pkg/", "  sub/", "    c.py 2", "[1 entries]"])
+        self.assertEqual(self.listing(pattern="*.rs"), 'No entries match "*.rs" in "."')
+
+    def test_pages_resume_after_the_cursor(self):
+        first = self.listing(recursive=True, limit=4).splitlines()
+        self.assertEqual(first[-1], '[4 entries shown; more remain: call again with cursor="link.py"]')
+        second = self.listing(recursive=True, limit=4, cursor="link.py").splitlines()
+        self.assertEqual(second, ["./", "pkg/", "  a.py 5", "  b.txt 0", "  sub/",
+                                  '[4 entries shown; more remain: call again with cursor="pkg/sub"]'])
+        third = self.listing(recursive=True, limit=4, cursor="pkg/sub").splitlines()
+        self.assertEqual(third, ["./", "pkg/", "  sub/", "    c.py 2", "[1 entries]"])
+        self.assertEqual(self.listing(recursive=True, cursor="pkg/sub/c.py"), 'No entries after cursor "pkg/sub/c.py"')
+
+    def test_errors(self):
+        for args, message in (({"directory": ".."}, "outside the project root"),
+                              ({"directory": "missing"}, "does not exist"),
+                              ({"directory": "README.md"}, "is not a directory"),
+                              ({"max_depth": 0}, "max_depth must be at least 1"),
+                              ({"limit": 0}, "limit must be at least 1")):
+            with self.subTest(args=args):
+                result = self.listing(**args)
+                self.assertTrue(result.startswith("Error:"), result)
+                self.assertIn(message, result)
+
+
+class TestFileIndex(unittest.TestCase):
+    """Test suite for the persistent, incrementally refreshed FileIndex."""
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.root = self.scratch.name
+        write_files(self.root, {"main.py": "", "pkg/util.py": "", "pkg/sub/deep.py": "", "build/out.py": ""})
+
+    def tearDown(self):
+        self.scratch.cleanup()
+
+    def index(self):
+        return FileIndex(self.root, use_watcher=False)
+
+    def test_initial_scan(self):
+        index = self.index()
+        self.assertEqual(sorted(index.all_paths()), ["main.py", "pkg/sub/deep.py", "pkg/util.py"])
+        self.assertEqual(index.find_by_name("UTIL.PY"), ["pkg/util.py"])
+        self.assertEqual(sorted(index.find_by_substring("I")), ["main.py", "pkg/util.py"])
+
+    def test_incremental_refresh(self):
+        index = self.index()
+        index.all_paths()
+        generation = index.generation
+        write_files(self.root, {"pkg/sub/new.py": ""})
+        os.remove(os.path.join(self.root, "pkg", "util.py"))
+        index.mark_dirty(os.path.join(self.root, "pkg", "sub", "new.py"))
+        index.mark_dirty(os.path.join(self.root, "pkg", "util.py"))
+        self.assertEqual(index.find_by_name("new.py"), ["pkg/sub/new.py"])
+        self.assertEqual(index.find_by_name("util.py"), [])
+        self.assertGreater(index.generation, generation)
+
+    def test_mtime_sweep(self):
+        index = self.index()
+        index.all_paths()
+        write_files(self.root, {"pkg/sub/added.py": ""})
+        # Within the refresh interval nothing is swept
+        self.assertEqual(index.find_by_name("added.py"), [])
+        with mock.patch("functions.file_index.REFRESH_INTERVAL", 0):
+            self.assertEqual(index.find_by_name("added.py"), ["pkg/sub/added.py"])
+            generation = index.generation
+            index.refresh()
+            self.assertEqual(index.generation, generation)
+
+    def test_cache_load(self):
+        self.index().all_paths()
+        self.assertTrue(os.path.isfile(os.path.join(self.root, ".kodex_cache", "file_index.json")))
+        write_files(self.root, {"later.py": ""})
+        warm = self.index()
+        with mock.patch.object(warm, "_scan_tree", side_effect=AssertionError("full scan")):
+            # Loaded from the cache, then swept once for changes made meanwhile
+            self.assertEqual(sorted(warm.all_paths()),
+                             ["later.py", "main.py", "pkg/sub/deep.py", "pkg/util.py"])
+
+    def test_symlinked_directory_is_not_a_file(self):
+        os.symlink(os.path.join(self.root, "pkg"), os.path.join(self.root, "linked"))
+        os.symlink(os.path.join(self.root, "main.py"), os.path.join(self.root, "alias.py"))
+        index = self.index()
+        self.assertEqual(index.find_by_name("linked"), [])
+        self.assertEqual(index.find_by_name("deep.py"), ["pkg/sub/deep.py"])
+        self.assertEqual(index.find_by_name("alias.py"), ["alias.py"])
+
+    def test_name_log_stays_bounded(self):
+        index = self.index()
+        engine = PathQuery(index)
+        engine.search("flaky*")
+        path = os.path.join(self.root, "flaky.py")
+        for _ in range(50):
+            write_files(self.root, {"flaky.py": ""})
+            index.mark_dirty(path)
+            self.assertEqual(engine.search("flak*")[0], ["flaky.py"])
+            os.remove(path)
+            index.mark_dirty(path)
+            index.refresh()
+        self.assertLessEqual(len(index._name_log), 2 * len(index._by_name) + 1)
+        self.assertEqual(engine.search("dee*")[0], ["pkg/sub/deep.py"])
+        self.assertLess(len(engine._names), 10)
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "warm interpreters need fork")
+class TestWarmPythonPool(unittest.TestCase):
+    """Test suite for the warm interpreter pool behind run_python_file."""
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.root = self.scratch.name
+        write_files(self.root, {"hello.py": "import sys\nprint('hello', sys.argv[1:])\n"})
+        self.script = os.path.join(self.root, "hello.py")
+        self.pool = WarmPythonPool(size=1, modules=[])
+
+    def tearDown(self):
+        self.pool.close()
+        self.scratch.cleanup()
+
+    def run_script(self, *args):
+        return self.pool.run(self.script, list(args), self.root, 10, 1024, 1024)
+
+    def test_runs_reuse_the_server(self):
+        self.assertEqual(self.run_script("a").stdout, "hello ['a']\n")
+        self.assertEqual(self.run_script("b").stdout, "hello ['b']\n")
+        self.assertEqual(len(self.pool._servers), 1)
+
+    def test_waiting_run_replaces_a_discarded_server(self):
+        server = self.pool._acquire()
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(self.run_script("c")), daemon=True)
+        waiter.start()
+        waiter.join(0.2)
+        self.assertTrue(waiter.is_alive())  # the only server is busy
+        self.pool._discard(server)
+        waiter.join(10)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(results[0].stdout, "hello ['c']\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,40 @@
 import os
+import shutil
+import tempfile
+
+from functions.file_index import FileIndex
+from functions.results import resolve_path
+
+# Read once at import: os.umask can only be queried by setting it, which is
+# not safe while tools run on several threads.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def atomic_write(full_path, content):
+    """Write ``content`` to ``full_path`` via a temp file and rename.
+
+    Readers (and a crash mid-write) see either the old file or the new one,
+    never a truncated mix. An existing file's permission bits are kept, and a
+    symlink is written through to its target rather than replaced.
+    """
+    full_path = os.path.realpath(full_path)
+    directory = os.path.dirname(full_path) or "."
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+        if os.path.exists(full_path):
+            shutil.copymode(full_path, temp_path)
+        else:
+            os.chmod(temp_path, 0o666 & ~_UMASK)
+        os.replace(temp_path, full_path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
 
 
 def write_file(working_directory, file_path, content):
@@ -12,33 +48,19 @@ def write_file(working_directory, file_path, content):
         
         # If the file path doesn't exist and looks like just a filename, try to find it
         if not os.path.exists(full_path) and os.sep not in file_path and file_path.count('.') <= 1:
-            from functions.find_files import find_files
-            
-            # Extract just the filename
-            filename = os.path.basename(file_path)
-            search_result = find_files(working_directory, filename=filename)
-            
-            # Check if we found the file
-            if search_result.startswith("Found"):
-                # Parse the result to get the first matching path
-                lines = search_result.split('\n')
-                if len(lines) > 1:
-                    # Get the first match (format: "  - path/to/file")
-                    first_match = lines[1].strip().replace('- ', '')
-                    
-                    # Update the file_path to the found location
-                    file_path = first_match
-                    full_path = os.path.join(working_directory, file_path)
-                    full_path = os.path.abspath(full_path)
-        
+            resolution = resolve_path(working_directory, file_path)
+            if resolution.found:
+                file_path = resolution.path
+                full_path = resolution.full_path
+
         # Create parent directories if they don't exist
         parent_dir = os.path.dirname(full_path)
         if parent_dir and not os.path.exists(parent_dir):
             os.makedirs(parent_dir, exist_ok=True)
         
         # Write content to file
-        with open(full_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        atomic_write(full_path, content)
+        FileIndex.notify_changed(working_directory, full_path)
         
         return f'Successfully wrote to "{file_path}" ({len(content)} characters written)'
         
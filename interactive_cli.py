@@ -1,73 +1,24 @@
 #!/usr/bin/env python3
 """Interactive CLI for the AI Coding Agent."""
 
+import asyncio
 import os
 import sys
 from datetime import datetime
 
-from dotenv import load_dotenv
-from google import genai
-from google.genai import types
 from rich.console import Console
 from rich.panel import Panel
 from rich.prompt import Prompt
-from rich.markdown import Markdown
-from rich.live import Live
-from rich.spinner import Spinner
 from rich.text import Text
 
 # Add project root to path
 sys.path.insert(0, os.path.dirname(__file__))
-from functions.get_files_info import available_functions
 
-# Initialize
-load_dotenv()
+# google.genai, the tools and rich's Markdown/Live are imported lazily: the
+# welcome screen shows immediately and core.agent.preload() warms the rest
+# up in the background while the first prompt is typed.
 console = Console()
 
-# Gemini client setup
-api_key = os.environ.get("GEMINI_API_KEY")
-if not api_key:
-    console.print("[bold red]Error:[/bold red] GEMINI_API_KEY not found in environment")
-    console.print("Please set your API key in the .env file")
-    sys.exit(1)
-
-client = genai.Client(api_key=api_key)
-
-# System prompt
-system_prompt = """
-You are a highly intelligent AI coding agent with access to a Python codebase.
-
-CORE PRINCIPLE: ALWAYS BE PROACTIVE. NEVER ask the user for file paths - YOU can find them!
-
-When a user mentions a file without providing the full path, you MUST:
-1. **AUTOMATICALLY** use find_files to locate the file (search by exact name first, then by pattern if needed)
-2. Use the discovered path in subsequent operations
-3. If multiple matches exist, use the most relevant one based on context
-4. Only ask for clarification if there are genuinely ambiguous cases
-
-Available operations:
-- get_files_info: List files and directories
-- find_files: Search for files by exact name or pattern (USE THIS PROACTIVELY!)
-- get_file_content: Read file contents
-- run_python_file: Execute Python files with optional arguments
-- write_file: Write or overwrite files
-
-SMART FILE HANDLING EXAMPLES:
-- User says "read readme.md" → IMMEDIATELY call find_files(filename="README.md") or find_files(pattern="readme"), then read the found file
-- User says "add docstrings to my config file" → find_files(pattern="config"), examine results, read the file, make changes
-- User says "run the tests" → find_files(pattern="test"), identify test files, run them
-- User says "modify calculator.py" → find_files(filename="calculator.py"), find it, read it, make changes
-
-CRITICAL RULES:
-1. NEVER say "I need the path" - YOU find it using find_files!
-2. File names are case-insensitive - search flexibly (readme.md, README.md, Readme.MD are all the same)
-3. Always search before claiming a file doesn't exist
-4. Be smart about common variations (.py, .txt, .md extensions, etc.)
-5. Think like a developer - understand project structure and conventions
-
-Your goal is to be so intelligent that users feel like they're working with a mind-reading assistant, not a rigid script.
-"""
-
 
 def get_greeting():
     """Get time-appropriate greeting."""
@@ -118,20 +69,9 @@ def show_welcome():
 
 def call_function(function_call_part, show_details=False):
     """Execute a function call from the agent."""
-    from functions.get_file_content import get_file_content
-    from functions.get_files_info import get_files_info
-    from functions.run_python_file import run_python_file
-    from functions.write_file import write_file
-    from functions.find_files import find_files
-    
-    function_map = {
-        "get_file_content": get_file_content,
-        "get_files_info": get_files_info,
-        "run_python_file": run_python_file,
-        "write_file": write_file,
-        "find_files": find_files,
-    }
-    
+    from core.agent import execute_tool
+    from core.cache import TOOL_CACHE
+
     function_name = function_call_part.name
     
     # Show function call
@@ -140,98 +80,108 @@ def call_function(function_call_part, show_details=False):
     else:
         console.print(f"[dim cyan]  • {function_name}[/dim cyan]")
     
-    if function_name not in function_map:
-        return types.Content(
-            role="tool",
-            parts=[
-                types.Part.from_function_response(
-                    name=function_name,
-                    response={"error": f"Unknown function: {function_name}"},
-                )
-            ],
-        )
-    
-    # Add working_directory to args
-    args_dict = dict(function_call_part.args)
-    project_root = os.path.dirname(os.path.abspath(__file__))
-    args_dict["working_directory"] = project_root
-    
-    # Call the function
-    function_result = function_map[function_name](**args_dict)
-    
-    return types.Content(
-        role="tool",
-        parts=[
-            types.Part.from_function_response(
-                name=function_name,
-                response={"result": function_result},
-            )
-        ],
-    )
+    function_response, cache_hit = execute_tool(function_call_part)
+    if show_details and cache_hit:
+        console.print(f"[dim]    (served from cache: {TOOL_CACHE.stats()})[/dim]")
+    return function_response
 
 
-def execute_query(user_prompt, messages, show_details=False):
-    """Execute a single query and return updated messages."""
-    # Add user prompt to messages
-    messages.append(types.Content(role="user", parts=[types.Part(text=user_prompt)]))
+def execute_query(user_prompt, messages, show_details=False, backend=None):
+    """Execute a single query and return updated messages.
+
+    If the query fails, ``messages`` is restored to its state before it, so
+    a model turn whose function calls never got responses is not sent again.
+    """
+    from core.agent import AgentError, run_loop, user_message
     
-    max_iterations = 20
+    checkpoint = len(messages)
+    messages.append(user_message(user_prompt))
     final_response = None
+    try:
+        final_response = run_loop(
+            messages,
+            "gemini-2.5-flash-lite",
+            lambda part: call_function(part, show_details),
+            backend=backend,
+            on_outcomes=lambda outcomes, wall_time: _show_timings(outcomes, wall_time, show_details),
+        )
+        if final_response is None:
+            final_response = "Maximum iterations reached. The task may be incomplete."
+    except AgentError as e:
+        del messages[checkpoint:]
+        _show_error(e, show_details)
     
-    for iteration in range(max_iterations):
-        try:
-            # Generate content
-            response = client.models.generate_content(
-                model="gemini-2.5-flash-lite",
-                contents=messages,
-                config=types.GenerateContentConfig(
-                    tools=[available_functions], 
-                    system_instruction=system_prompt
-                ),
-            )
-            
-            # Add response to messages
-            for candidate in response.candidates:
-                if candidate.content:
-                    messages.append(candidate.content)
-            
-            # Process response
-            has_function_call = False
-            has_text = False
-            
-            for candidate in response.candidates:
-                if not candidate.content or not candidate.content.parts:
-                    continue
-                    
-                for part in candidate.content.parts:
-                    if hasattr(part, 'function_call') and part.function_call:
-                        has_function_call = True
-                        function_call_result = call_function(part.function_call, show_details)
-                        messages.append(function_call_result)
-                    
-                    if hasattr(part, 'text') and part.text:
-                        has_text = True
-            
-            # If done, return the response
-            if not has_function_call and has_text:
-                final_response = response.text
-                break
-                
-        except Exception as e:
-            console.print(f"[bold red]Error:[/bold red] {e}")
-            if show_details:
-                import traceback
-                traceback.print_exc()
-            break
+    return final_response, messages
+
+
+async def execute_query_async(user_prompt, messages, show_details=False, on_text=None, backend=None):
+    """Streaming, asyncio version of ``execute_query``.
+
+    Text is passed to ``on_text(text_so_far)`` as it arrives, and each
+    function call is dispatched as soon as its part has streamed in. If the
+    query fails or the task is cancelled (Ctrl+C), ``messages`` is restored
+    to its state before the query so the conversation stays consistent.
+    """
+    from core.agent import AgentError, run_loop_async, user_message
     
-    if final_response is None and iteration == max_iterations - 1:
-        final_response = "Maximum iterations reached. The task may be incomplete."
+    checkpoint = len(messages)
+    messages.append(user_message(user_prompt))
+    final_response = None
+    try:
+        final_response = await run_loop_async(
+            messages,
+            "gemini-2.5-flash-lite",
+            lambda part: call_function(part, show_details),
+            backend=backend,
+            on_text=on_text,
+            on_outcomes=lambda outcomes, wall_time: _show_timings(outcomes, wall_time, show_details),
+        )
+        if final_response is None:
+            final_response = "Maximum iterations reached. The task may be incomplete."
+    except AgentError as e:
+        del messages[checkpoint:]
+        _show_error(e, show_details)
+    except asyncio.CancelledError:
+        del messages[checkpoint:]
+        raise
     
     return final_response, messages
 
 
+def _show_timings(outcomes, wall_time, show_details):
+    if show_details:
+        from core.executor import format_timings
+        console.print(f"[dim]{format_timings(outcomes, wall_time)}[/dim]")
+
+
+def _print_live_output(stream_name, text):
+    """Echo script output as it is produced (the ``stream`` command)."""
+    style = "dim red" if stream_name == "stderr" else "dim"
+    console.print(text, end="", style=style, markup=False, highlight=False)
+
+
+def _show_error(error, show_details):
+    console.print(f"[bold red]Error:[/bold red] {error}")
+    if show_details:
+        import traceback
+        traceback.print_exception(error.__cause__)
+
+
 def interactive_loop():
     """Main interactive loop."""
+    from dotenv import load_dotenv
+    
+    load_dotenv()
+    
+    # Gemini client setup (a replay recording needs no API key)
+    if not os.environ.get("GEMINI_API_KEY") and not os.environ.get("AGENT_REPLAY"):
+        console.print("[bold red]Error:[/bold red] GEMINI_API_KEY not found in environment")
+        console.print("Please set your API key in the .env file")
+        sys.exit(1)
+    
+    from core.agent import preload
+    
+    preload()
     show_welcome()
     
     # Initialize conversation context
@@ -242,6 +192,24 @@ def interactive_loop():
     if os.environ.get("AGENT_VERBOSE", "").lower() in ["1", "true", "yes"]:
         show_details = True
     
+    # One event loop for the whole session keeps the async client's
+    # connection pool usable across queries.
+    with asyncio.Runner() as runner:
+        _run_session(runner, messages, show_details)
+
+
+def _run_session(runner, messages, show_details):
+    """Read prompts and answer them until the user leaves."""
+    from core.cache import TOOL_CACHE
+    from core.history import HistoryManager
+    from core.prefetch import PREFETCHER
+    from core.tracing import TRACER, format_summary
+    
+    from functions.output_capture import set_output_listener
+    
+    history = HistoryManager()
+    stream_output = os.environ.get("AGENT_STREAM_OUTPUT", "").lower() in ["1", "true", "yes"]
+    set_output_listener(_print_live_output if stream_output else None)
     while True:
         try:
             # Get user input
@@ -271,16 +239,54 @@ def interactive_loop():
                 console.print("[yellow]Context cleared. Starting fresh![/yellow]")
                 continue
             
+            if user_input.lower() == "stream":
+                stream_output = not stream_output
+                set_output_listener(_print_live_output if stream_output else None)
+                status = "enabled" if stream_output else "disabled"
+                console.print(f"[yellow]Live script output {status}[/yellow]")
+                continue
+            
             if user_input.lower() == "verbose":
                 show_details = not show_details
                 status = "enabled" if show_details else "disabled"
                 console.print(f"[yellow]Verbose mode {status}[/yellow]")
                 continue
             
-            # Execute the query with a spinner
+            # Keep the re-sent history within the token budget
+            stats = history.compact(messages)
+            if show_details and stats.saved:
+                console.print(
+                    f"[dim]History compacted: ~{stats.saved} tokens saved "
+                    f"({stats.superseded_reads} superseded reads, {stats.summarized_results} results "
+                    f"summarized, {stats.dropped_turns} turns dropped)[/dim]"
+                )
+            
+            # Execute the query, streaming text into the panel as it arrives
+            from rich.live import Live
+            from rich.markdown import Markdown
+            from rich.spinner import Spinner
+            
             console.print()
-            with Live(Spinner("dots", text="[cyan]Thinking...[/cyan]"), console=console, transient=True):
-                response, messages = execute_query(user_input, messages, show_details)
+            TRACER.start_query(user_input)
+            with Live(Spinner("dots", text="[cyan]Thinking...[/cyan]"), console=console, transient=True) as live:
+                def show_partial(text):
+                    live.update(Panel(Markdown(text), border_style="cyan", padding=(1, 2)))
+                
+                try:
+                    response, messages = runner.run(
+                        execute_query_async(user_input, messages, show_details, on_text=show_partial)
+                    )
+                except KeyboardInterrupt:
+                    response = None
+                    console.print("[yellow]Request cancelled.[/yellow]")
+            
+            trace = TRACER.finish_query()
+            if show_details:
+                console.print(f"[dim]Tool cache: {TOOL_CACHE.stats()}[/dim]")
+                if PREFETCHER.enabled:
+                    console.print(f"[dim]Prefetch: {PREFETCHER.stats()}[/dim]")
+            if show_details or TRACER.export_path:
+                console.print(f"[dim]{format_summary(trace)}[/dim]", highlight=False)
             
             # Display response
             if response: